@@ -1,5 +1,6 @@
 import pyNN.nest as pynn
 import numpy as np
+from spikey_tools.synapse_recorder import SynapseStateRecorder, recordOnGrid
 
 # This example script uses the synapse model "stdp_facetshw_synapse_hom" of NEST that implements features of STDP synapses on the neuromorphic chip Spikey.
 # Please see the FAQ of the guidebook [1] for details.
@@ -75,22 +76,14 @@ prj = pynn.Projection(measure, neuron, connMeasure, synapse_dynamics=stdpModel,
 neuron.record()
 neuron.record_v()
 
-connSTDP = pynn.nest.FindConnections(measure)
-weightList = []
-aCausalList = []
-aAnticausalList = []
-timeGrid = np.arange(0, runtime + timeStep / 2.0, timeStep)
 #run simulation step-wise to record charge on "capacitors" and discrete synaptic weight
-for timeNow in timeGrid:
-    weightList.append(prj.getWeights()[0])
-
-    for i in range(len(connSTDP)): #read out "capacitors"
-        if pynn.nest.GetStatus([connSTDP[i]])[0]['synapse_model'].find(synapseModel) > -1:
-            aCausalList.append(pynn.nest.GetStatus([connSTDP[i]])[0]['a_causal'])
-            aAnticausalList.append(pynn.nest.GetStatus([connSTDP[i]])[0]['a_acausal'])
-
-    if not timeNow == timeGrid[-1]:
-        pynn.run(timeStep)
+#the state of all plastic synapses is read with a single call per time step
+recorder = SynapseStateRecorder(pynn.nest, pynn.nest.FindConnections(measure), synapseModel)
+timeGrid = np.arange(0, runtime + timeStep / 2.0, timeStep)
+recordOnGrid(pynn, recorder, timeGrid)
+weightList = recorder['weight'][:,0] / 1e3 #NEST uses different units than PyNN (nS instead of muS)
+aCausalList = recorder['a_causal'][:,0]
+aAnticausalList = recorder['a_acausal'][:,0]
 
 spikes = neuron.getSpikes()
 #membrane = neuron.get_v() #for debugging
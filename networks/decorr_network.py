@@ -16,6 +16,8 @@ mpl.use('Agg')
 
 import pyNN.hardware.spikey as pynn
 import numpy as np
+from spikey_tools.correlation import CorrelationAccumulator
+from spikey_tools.blocks import BlockConnectivity
 
 pynn.setup()
 
@@ -26,7 +28,9 @@ weight = 7.0 * pynn.minExcWeight()
 neuronParams = {'v_rest': -40.0}
 
 neurons = pynn.Population(popSize, pynn.IF_facets_hardware1, neuronParams)
-pynn.Projection(neurons, neurons, pynn.FixedNumberPreConnector(15, weights=weight), target='inhibitory')
+blocks = BlockConnectivity()
+blocks.connect(neurons, neurons, n=15, weight=weight, target='inhibitory')
+blocks.project(pynn)
 neurons.record()
 
 pynn.run(runtime)
@@ -35,15 +39,20 @@ spikes = neurons.getSpikes()
 
 pynn.end()
 
+# analysis
+binWidth = 10.0 #ms
+correlations = CorrelationAccumulator(popSize, [binWidth], firstId=neurons[0])
+correlations.add(spikes, 0.0, runtime)
+
 # visualize
 print 'mean firing rate:', round(len(spikes) / runtime / popSize * 1000.0, 1), '1/s'
+print 'mean pairwise correlation coefficient ({} ms bins):'.format(binWidth), round(correlations.meanCorrelation(binWidth), 3)
 
 import matplotlib.pyplot as plt
-
-color = 'k'
+from spikey_tools import plotting
 
 plt.figure()
-plt.plot(spikes[:,1], spikes[:,0], ls='', marker='o', ms=1, c=color, mec=color)
+plotting.raster(plt.gca(), spikes[:,1], spikes[:,0], timeRange=(0, runtime), idRange=(0, popSize - 1))
 plt.xlim(0, runtime)
 plt.xlabel('time (ms)')
 plt.ylabel('neuron ID')
@@ -3,10 +3,14 @@
 import pyNN.hardware.spikey as pynn
 import numpy as np
 import matplotlib.pyplot as plt
+from spikey_tools.placement import Placer
+from spikey_tools.trials import runTrials
 
 weight             = 7.0        # synaptic weight in digital values
 runtime            = 10 * 1000.0 # runtime in biological time domain in ms
 durationInterval   = 200.0       # interval between input spikes in ms
+guard              = 50.0        # part of the interval before each input spike in ms
+noTrials           = int(runtime / durationInterval) - 1 # number of EPSPs
 neuronIndex        = 42          # choose neuron on chip in range(384)
 synapseDriverIndex = 42          # choose synapse driver in range(256)
 
@@ -15,13 +19,8 @@ pynn.setup(mappingOffset=neuronIndex, calibSynDrivers=False) #turn off calibrati
 ##build network
 neurons = pynn.Population(1, pynn.IF_facets_hardware1)
 pynn.record_v(neurons[0], '')
-#allocate dummy synapse drivers sending no spikes
-if synapseDriverIndex > 0:
-    stimuliDummy = pynn.Population(synapseDriverIndex, pynn.SpikeSourceArray, {'spike_times': []})
-    prj = pynn.Projection(stimuliDummy, neurons, pynn.AllToAllConnector(weights=0), target='excitatory')
-#allocate synapse driver and configure spike times
-stimProp = {'spike_times': np.arange(durationInterval, runtime - durationInterval, durationInterval)}
-stimuli = pynn.Population(1, pynn.SpikeSourceArray, stimProp)
+#allocate synapse driver, spike times are set for each trial
+stimuli = Placer(pynn, padTarget=neurons).sources(1, pynn.SpikeSourceArray, row=synapseDriverIndex)
 prj = pynn.Projection(stimuli, neurons, pynn.AllToAllConnector(weights=weight * pynn.minExcWeight()), target='excitatory')
 
 #modify properties of synapse driver
@@ -30,30 +29,21 @@ prj.setDrvifallFactors([0.8])
 #prj.setDrvioutFactors([1.0])
 
 ##run network
-pynn.run(runtime)
-mem = pynn.membraneOutput
-time = pynn.timeMembraneOutput
+#one input spike per trial, all trials are emulated back to back in a single run
+trials = runTrials(pynn, [{stimuli: [0.0]}] * noTrials, durationInterval - guard, guard, recordV=True)
 pynn.end()
 
-##calculate spike-triggered average of membrane potential
-timeNorm = time - time[0]
-#number of data points per interval
-lenInterval = np.argmin(abs(time - durationInterval))
-#number of intervals
-numInterval = int(len(mem) / lenInterval)
-#trim membrane data
-memCut = mem[:numInterval * lenInterval]
-#split membrane data into intervals
-memInterval = memCut.reshape(numInterval, lenInterval)
-#average membrane data
-#note that first and last interval are omitted, because without stimulus
-memAverage = np.mean(memInterval[1:-1], axis=0)
+##average membrane potential across trials
+#each trial starts at its input spike, windows are aligned to it by interpolation between samples
+timeNorm = trials.average.time
+memSingle = trials.membrane[0]
+memAverage = trials.average.mean
 
 ##plot results
 plt.figure()
-plt.plot(timeNorm[:lenInterval], memInterval[1], 'b')
-plt.plot(timeNorm[:lenInterval], memAverage, 'r')
-plt.legend(['single EPSP', 'average across {} EPSPs'.format(numInterval)])
+plt.plot(timeNorm, memSingle, 'b')
+plt.plot(timeNorm, memAverage, 'r')
+plt.legend(['single EPSP', 'average across {} EPSPs'.format(trials.average.count)])
 plt.xlabel('time (ms)')
 plt.ylabel('membrane voltage (mV)')
 plt.savefig('epsp.png')
@@ -114,11 +114,11 @@ print 'average membrane potential:', np.mean(membrane), 'mV'
 print 'sampling step for membrane potential:', membraneTime[1] - membraneTime[0], 'ms'
 
 import matplotlib.pyplot as plt
+from spikey_tools import plotting
 
 # draw raster plot
 ax = plt.subplot(211) #row, col, nr
-for spike in spikes:
-    ax.axvline(x=spike)
+plotting.spikeLines(ax, spikes)
 ax.set_xlim(0, runtime)
 ax.set_ylabel('spikes')
 ax.set_xticklabels([])
@@ -127,7 +127,7 @@ ax.set_yticklabels([])
 
 # draw membrane potential
 axMem = plt.subplot(212)
-axMem.plot(membraneTime, membrane)
+plotting.trace(axMem, membraneTime, membrane)
 axMem.set_xlim(0, runtime)
 axMem.set_xlabel('time (ms)')
 axMem.set_ylabel('membrane potential (mV)')
@@ -3,6 +3,8 @@
 import pyNN.hardware.spikey as pynn
 import numpy as np
 import matplotlib.pyplot as plt
+from spikey_tools.sweep import runSweep
+from spikey_tools.results import ResultsStore
 
 noStims   = 64                 # number of stimuli generated on the host computer
 noNeurons = 32                 # number of hardware neurons
@@ -12,25 +14,43 @@ rateStim  = 10.0               # rate of each stimulus in 1/s
 runtime   = 10 * 1000.0        # runtime in biological time domain in ms
 gLeakList = np.arange(2,251,8) # hardware range with calibTauMem turned off: [2,250] micro siemens
 
-resultCollector = []
+processes = 4                  # number of parallel sweep points, only used by the software stand-in
+storeDir  = None               # e.g. 'rate_over_gleak.results' to store results and resume an interrupted sweep
 
-pynn.setup(calibTauMem=False) #turn off calibration of membrane time constant tau_mem
 
-#build network
-stimuli = pynn.Population(noStims, pynn.SpikeSourcePoisson, {'start': 0, 'duration': runtime, 'rate': rateStim})
-neurons = pynn.Population(noNeurons, pynn.IF_facets_hardware1)
-pynn.Projection(stimuli, neurons, pynn.FixedNumberPreConnector(noInputs, weights=weight * pynn.minExcWeight()), target='excitatory')
-neurons.record()
+def build(pynn):
+    stimuli = pynn.Population(noStims, pynn.SpikeSourcePoisson, {'start': 0, 'duration': runtime, 'rate': rateStim})
+    neurons = pynn.Population(noNeurons, pynn.IF_facets_hardware1)
+    pynn.Projection(stimuli, neurons, pynn.FixedNumberPreConnector(noInputs, weights=weight * pynn.minExcWeight()), target='excitatory')
+    neurons.record()
+    return {'neurons': neurons}
+
+
+def readSpikes(pynn, network):
+    return network['neurons'].getSpikes()
+
+
+def firingRate(spikes):
+    return {'rate': float(len(spikes)) / noNeurons / runtime * 1e3, 'spikes': spikes}
+
 
 #sweep over g_leak values, emulate network and record spikes
-for gLeakValue in gLeakList:
-    neurons.set({'g_leak': gLeakValue})
-    pynn.run(runtime)
-    resultCollector.append([gLeakValue, float(len(neurons.getSpikes())) / noNeurons / runtime * 1e3])
-pynn.end()
+#only the leak conductances are reprogrammed between sweep points
+#with storeDir set, results are stored with their spikes and the fixed network parameters,
+#an interrupted sweep resumes at the missing points of the same network
+#spikes of each point are analysed while the next point is emulated
+store = None
+if storeDir:
+    store = ResultsStore(storeDir, description={'noStims': noStims, 'noNeurons': noNeurons, 'noInputs': noInputs,
+                                                'weight': weight, 'rateStim': rateStim})
+results = runSweep(pynn, build, [{'neurons': {'g_leak': gLeakValue}} for gLeakValue in gLeakList], runtime, firingRate,
+                   #turn off calibration of membrane time constant tau_mem,
+                   #the same (frozen) Poisson stimulus for all sweep points, used by the software stand-in
+                   setupParams={'calibTauMem': False, 'stimulusSeed': 1234},
+                   processes=processes, store=store, readout=readSpikes)
+resultCollector = np.column_stack((gLeakList, [result['rate'] for result in results]))
 
 #plot results
-resultCollector = np.array(resultCollector)
 plt.figure()
 plt.plot(resultCollector[:,0], resultCollector[:,1])
 plt.xlim(0, np.max(gLeakList))
@@ -18,6 +18,8 @@ arXiv:1201.6255 [q-bio.NC]
 
 import pyNN.hardware.spikey as pynn
 import numpy as np
+from spikey_tools.placement import Placer
+from spikey_tools.weightlog import WeightLog
 
 column               = 4     # column of plastic synapse
 row                  = 4     # row of plastic synapse
@@ -42,22 +44,15 @@ pynn.setup(mappingOffset=column)
 # create postsynaptic neuron
 neuron = pynn.Population(1, pynn.IF_facets_hardware1)
 
-spikeSourceStim = None
-spikeSourcePlastic = None
-# place stimulating synapses above plastic synapse
-if row < noStim:
-    if row > 0:
-        dummy = pynn.Population(row, pynn.SpikeSourceArray)
-    spikeSourcePlastic = pynn.Population(1, pynn.SpikeSourceArray, {'spike_times': stimulusPlastic})
-# create stimulating inputs
-spikeSourceStim = pynn.Population(noStim, pynn.SpikeSourceArray, {'spike_times': stimulus})
-# place stimulating synapses below plastic synapse
+# place plastic synapse at given row and stimulating synapses below it, or in the rows right above it if there is not enough space
+# without placement support in the backend, sources are mapped in order of creation, so the lower ones are created first
+placer = Placer(pynn)
 if row >= noStim:
-    if row > noStim:
-        dummy = pynn.Population(row - noStim, pynn.SpikeSourceArray)
-    spikeSourcePlastic = pynn.Population(1, pynn.SpikeSourceArray, {'spike_times': stimulusPlastic})
-assert(spikeSourceStim!=None)
-assert(spikeSourcePlastic!=None)
+    spikeSourceStim = placer.sources(noStim, pynn.SpikeSourceArray, {'spike_times': stimulus})
+    spikeSourcePlastic = placer.sources(1, pynn.SpikeSourceArray, {'spike_times': stimulusPlastic}, row=row)
+else:
+    spikeSourcePlastic = placer.sources(1, pynn.SpikeSourceArray, {'spike_times': stimulusPlastic}, row=row)
+    spikeSourceStim = placer.sources(noStim, pynn.SpikeSourceArray, {'spike_times': stimulus}, row=row + 1)
 
 # configure STDP
 stdp_model = pynn.STDPMechanism(timing_dependence=pynn.SpikePairRule(),
@@ -85,6 +80,10 @@ lastInputSpike = np.max(np.concatenate((stimulus, stimulusPlastic)))
 runtime = lastInputSpike + stimulusOffset
 # configure frequency of STDP controller manually, otherwise maximum frequency is used
 pynn.hardware.hwa.autoSTDPFrequency = runtime
+# log changes of the whole synapse array after each STDP readout, if supported by the backend
+weightLog = WeightLog()
+if hasattr(pynn, 'recordWeights'):
+    pynn.recordWeights(weightLog)
 pynn.run(runtime)
 
 # get weight after emulation
@@ -109,4 +108,6 @@ print 'Time interval between pre- and postsynaptic spike (is / should / limit):'
 if abs(timingMeasured - timingPrePostPlastic) > spikePrecision:
     print 'Time interval between pre- and postsynaptic deviates from expectation. Adjust delay parameter.'
 print 'Synaptic weight before / after emulation (in digital hardware values):', weightPlastic, weightAfter
+if len(weightLog):
+    print 'Synaptic weight at start, after each STDP readout and at end:', weightLog.history(row, column)[:,0]
 
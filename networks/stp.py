@@ -13,6 +13,8 @@ mpl.use('Agg')
 
 import pyNN.hardware.spikey as pynn
 import numpy as np
+from spikey_tools.placement import Placer
+from spikey_tools.stp_fit import pspAmplitudes, fitTsodyksMarkram
 
 # row and column of synapse
 row = 42
@@ -26,8 +28,7 @@ runtime = 1000.0
 pynn.setup(mappingOffset=column)
 
 neuron = pynn.Population(1, pynn.IF_facets_hardware1)
-dummy = pynn.Population(row, pynn.SpikeSourceArray, stimParams)
-stimulus = pynn.Population(1, pynn.SpikeSourceArray, stimParams)
+stimulus = Placer(pynn).sources(1, pynn.SpikeSourceArray, stimParams, row=row)
 
 # enable and configure STP
 stp_model = pynn.TsodyksMarkramMechanism(**stpParams)
@@ -42,6 +43,13 @@ pynn.run(runtime)
 
 membrane = np.array(zip(pynn.timeMembraneOutput, pynn.membraneOutput))
 
+# fit STP parameters to the PSP amplitudes to check what was realized
+spikeTimes = stimParams['spike_times']
+amplitudes = pspAmplitudes(membrane[:,1], spikeTimes, membrane[1,0] - membrane[0,0], membrane[0,0])
+fit = fitTsodyksMarkram(spikeTimes, amplitudes)
+print 'configured U = %g, tau_rec = %g ms' % (stpParams['U'], stpParams['tau_rec'])
+print 'fitted     U = %.2f, tau_rec = %.1f ms (rms error %.3f mV)' % (fit.U, fit.tauRec, fit.rms)
+
 pynn.end()
 
 # plot
@@ -15,6 +15,9 @@ mpl.use('Agg')
 
 import pyNN.hardware.spikey as pynn
 import numpy as np
+from spikey_tools import spikefile
+from spikey_tools.spikestore import SpikeStore
+from spikey_tools.blocks import BlockConnectivity
 
 runtime = 500.0 # ms
 noPops = 9 # chain length
@@ -45,18 +48,21 @@ for synType in ['exc', 'inh']:
         pop.record()
         popCollector[synType].append(pop)
 
+# all connections are drawn at once and created as one projection per pair of populations
+blocks = BlockConnectivity()
 # connect stimulus
-pynn.Projection(stimExc, popCollector['exc'][0], pynn.FixedProbabilityConnector(p_connect=probExcExc, weights=weightStimExcExc), target='excitatory')
-pynn.Projection(stimExc, popCollector['inh'][0], pynn.FixedProbabilityConnector(p_connect=probExcInh, weights=weightStimExcInh), target='excitatory')
+blocks.connect(stimExc, popCollector['exc'][0], p=probExcExc, weight=weightStimExcExc, target='excitatory')
+blocks.connect(stimExc, popCollector['inh'][0], p=probExcInh, weight=weightStimExcInh, target='excitatory')
 # connect synfire chain populations
 for popIndex in range(noPops):
     #if popIndex < noPops - 1: # open chain
-        pynn.Projection(popCollector['exc'][popIndex], popCollector['exc'][(popIndex + 1) % noPops],
-                        pynn.FixedProbabilityConnector(p_connect=probExcExc, weights=weightExcExc), target='excitatory')
-        pynn.Projection(popCollector['exc'][popIndex], popCollector['inh'][(popIndex + 1) % noPops],
-                        pynn.FixedProbabilityConnector(p_connect=probExcInh, weights=weightExcInh), target='excitatory')
-        pynn.Projection(popCollector['inh'][popIndex], popCollector['exc'][popIndex],
-                        pynn.FixedProbabilityConnector(p_connect=probInhExc, weights=weightInhExc), target='inhibitory')
+        blocks.connect(popCollector['exc'][popIndex], popCollector['exc'][(popIndex + 1) % noPops],
+                       p=probExcExc, weight=weightExcExc, target='excitatory')
+        blocks.connect(popCollector['exc'][popIndex], popCollector['inh'][(popIndex + 1) % noPops],
+                       p=probExcInh, weight=weightExcInh, target='excitatory')
+        blocks.connect(popCollector['inh'][popIndex], popCollector['exc'][popIndex],
+                       p=probInhExc, weight=weightInhExc, target='inhibitory')
+blocks.project(pynn)
 
 # record from first neuron of first excitatory population of chain
 pynn.record_v(popCollector['exc'][0][0], '')
@@ -67,11 +73,12 @@ pynn.hardware.hwa.setIcb(0.02)
 
 pynn.run(runtime)
 
-# collect all spikes in one array
-spikeCollector = np.array([]).reshape(0,2)
-for synType in ['exc', 'inh']:
-    for popIndex in range(noPops):
-        spikeCollector = np.vstack((spikeCollector, popCollector[synType][popIndex].getSpikes()))
+# collect all spikes in one container
+spikeCollector = SpikeStore.fromPopulations(popCollector['exc'] + popCollector['inh'])
+# archive spikes in compact binary format, load with spikey_tools.spikefile.SpikeFile
+spikefile.write('synfire_chain.spk', spikeCollector.asArray(),
+                populations=spikefile.populationRanges(popCollector['exc'] + popCollector['inh']),
+                metadata={'runtime': runtime, 'noPops': noPops, 'popSize': popSize})
 
 # get membrane
 membrane = pynn.membraneOutput
@@ -83,11 +90,11 @@ pynn.end()
 print 'number of spikes:', len(spikeCollector)
 
 import matplotlib.pyplot as plt
-
-color = 'k'
+from spikey_tools import plotting
 
 ax = plt.subplot(211) #row, col, nr
-ax.plot(spikeCollector[:,1], spikeCollector[:,0], ls='', marker='o', ms=1, c=color, mec=color)
+plotting.raster(ax, spikeCollector.times, spikeCollector.ids, timeRange=(0, runtime),
+                idRange=(0, (popSize['exc'] + popSize['inh']) * noPops - 1))
 ax.set_xlim(0, runtime)
 ax.set_xticklabels([])
 ax.set_ylim(-0.5, (popSize['exc'] + popSize['inh']) * noPops - 0.5)
@@ -97,7 +104,7 @@ ax.axhspan(-0.5, popSize['exc'] * noPops - 0.5, color='r', alpha=0.2)
 ax.axhspan(popSize['exc'] * noPops - 0.5, (popSize['exc'] + popSize['inh']) * noPops - 0.5, color='b', alpha=0.2)
 
 axMem = plt.subplot(212)
-axMem.plot(membraneTime, membrane)
+plotting.trace(axMem, membraneTime, membrane)
 axMem.set_xlim(0, runtime)
 axMem.set_xlabel('time (ms)')
 axMem.set_ylabel('membrane potential (mV)')
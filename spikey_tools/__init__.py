@@ -0,0 +1,8 @@
+'''
+Host-side tools for the Spikey neuromorphic system.
+
+The modules in this package complement the PyNN interface of the hardware
+(pyNN.hardware.spikey) and can be used with the demo scripts in networks/.
+Module software provides a software stand-in for the hardware backend,
+see README.md for how to run the demos without a chip attached.
+'''
@@ -0,0 +1,193 @@
+'''
+Block-structured connectivity generated in one vectorized pass.
+
+Networks like the synfire chain consist of many projections between
+populations that follow a few rules. BlockConnectivity collects these rules
+as blocks of (presynaptic population, postsynaptic population), each with a
+connection probability or a fixed number of presynaptic partners per neuron,
+a weight and a target. generate() draws all synapses at once on the dense
+matrix of all presynaptic cells by all postsynaptic neurons, at most 256
+synapse drivers (sources and feedback of neurons) by 384 neurons on chip:
+one random number per matrix element decides probabilistic blocks, and the
+same numbers ranked within each block column select the partners of blocks
+with fixed in-degree. project() then creates one Projection per block from
+its precomputed connections (FromListConnector), so the backend gets the
+finished synapse lists instead of drawing each projection itself. Without
+an explicit generator, project() draws from the generator of the backend
+that is seeded by setup(rng_seeds=...), like the connectors of the backend.
+
+Example:
+
+    blocks = BlockConnectivity()
+    for i in range(noPops):
+        blocks.connect(exc[i], exc[(i + 1) % noPops], p=1.0, weight=5 * pynn.minExcWeight())
+        blocks.connect(inh[i], exc[i], p=1.0, weight=7 * pynn.minInhWeight(), target='inhibitory')
+    projections = blocks.project(pynn)
+'''
+
+import numpy as np
+
+_targets = {'excitatory': 0, 'inhibitory': 1}
+
+
+class Block(object):
+    '''
+    Connection rule between two populations, exactly one of p and n is given.
+
+    p -- connection probability of each pair of cells
+    n -- number of presynaptic partners of each postsynaptic neuron
+    '''
+    def __init__(self, pre, post, p=None, n=None, weight=0.0, target='excitatory', allowSelfConnections=True):
+        if (p is None) == (n is None):
+            raise ValueError('either connection probability p or number of partners n has to be given')
+        if target not in _targets:
+            raise ValueError('target must be one of %s' % sorted(_targets))
+        self.pre = pre
+        self.post = post
+        self.p = p
+        self.n = n
+        self.weight = weight
+        self.target = target
+        self.allowSelfConnections = allowSelfConnections
+
+
+class Connectivity(object):
+    '''
+    Generated synapses.
+
+    weights -- dense matrix of weights (muS) of all presynaptic cells by all
+               postsynaptic neurons, rows and columns in the order of
+               preRanges and postRanges, 0 where not connected
+    targets -- matrix of the same shape, 0 excitatory, 1 inhibitory, -1 not connected
+    '''
+    def __init__(self, blocks, weights, targets, preRanges, postRanges, connections):
+        self.blocks = blocks
+        self.weights = weights
+        self.targets = targets
+        self.preRanges = preRanges
+        self.postRanges = postRanges
+        self.connections = connections
+
+    def __len__(self):
+        return int(np.count_nonzero(self.targets >= 0))
+
+    def connectionList(self, index):
+        '''Array of (pre index, post index, weight, delay) rows of block index, for FromListConnector.'''
+        pre, post = self.connections[index]
+        block = self.blocks[index]
+        return np.column_stack((pre, post, np.repeat(float(block.weight), len(pre)), np.zeros(len(pre))))
+
+
+class BlockConnectivity(object):
+    def __init__(self):
+        self.blocks = []
+
+    def connect(self, pre, post, p=None, n=None, weight=0.0, target='excitatory', allowSelfConnections=True):
+        '''Add a block, see Block. Each pair of populations can be connected by one block only.'''
+        for block in self.blocks:
+            if block.pre is pre and block.post is post:
+                raise ValueError('populations are already connected by block %d' % self.blocks.index(block))
+        self.blocks.append(Block(pre, post, p, n, weight, target, allowSelfConnections))
+        return len(self.blocks) - 1
+
+    def generate(self, rng):
+        '''Draw the synapses of all blocks with rng (a numpy.random.RandomState) and return them as Connectivity.'''
+        pres = _unique([block.pre for block in self.blocks])
+        posts = _unique([block.post for block in self.blocks])
+        preSizes = np.array([len(pop) for pop in pres], dtype=int)
+        postSizes = np.array([len(pop) for pop in posts], dtype=int)
+        preStart = np.concatenate(([0], np.cumsum(preSizes)))
+        postStart = np.concatenate(([0], np.cumsum(postSizes)))
+
+        # per block properties, indexed by the block index of each matrix element,
+        # the additional last entry belongs to elements without block (index -1)
+        noBlocks = len(self.blocks)
+        blockOf = -np.ones((len(pres), len(posts)), dtype=int)
+        prob = np.full(noBlocks + 1, -1.0)
+        number = np.zeros(noBlocks + 1, dtype=int)
+        fixed = np.zeros(noBlocks + 1, dtype=bool)
+        noSelf = np.zeros(noBlocks + 1, dtype=bool)
+        for index, block in enumerate(self.blocks):
+            blockOf[_position(pres, block.pre), _position(posts, block.post)] = index
+            fixed[index] = block.n is not None
+            prob[index] = -1.0 if fixed[index] else block.p
+            number[index] = block.n or 0
+            noSelf[index] = block.pre is block.post and not block.allowSelfConnections
+        preGroup = np.repeat(np.arange(len(pres)), preSizes)
+        postGroup = np.repeat(np.arange(len(posts)), postSizes)
+        preLocal = np.arange(preStart[-1]) - preStart[preGroup]
+        postLocal = np.arange(postStart[-1]) - postStart[postGroup]
+        block = blockOf[preGroup[:, np.newaxis], postGroup]
+        excluded = (block < 0) | (noSelf[block] & (preLocal[:, np.newaxis] == postLocal))
+
+        draw = rng.uniform(size=block.shape)
+        connected = ~excluded & ~fixed[block] & (draw < prob[block])
+        if np.any(fixed):
+            # rank the draws of each column within each presynaptic population, excluded cells last
+            key = 2 * preGroup[:, np.newaxis] + np.where(excluded, 1.5, draw)
+            order = np.argsort(key, axis=0, kind='mergesort')
+            rank = np.empty(block.shape, dtype=int)
+            columns = np.arange(block.shape[1])
+            rank[order, columns] = np.arange(block.shape[0])[:, np.newaxis] - preStart[preGroup[order]]
+            connected |= ~excluded & fixed[block] & (rank < number[block])
+
+        weights = np.zeros(block.shape)
+        targets = -np.ones(block.shape, dtype=np.int8)
+        blockWeight = np.array([float(b.weight) for b in self.blocks] + [0.0])
+        blockTarget = np.array([_targets[b.target] for b in self.blocks] + [-1], dtype=np.int8)
+        weights[connected] = blockWeight[block[connected]]
+        targets[connected] = blockTarget[block[connected]]
+        # each presynaptic cell has one synapse driver, which is either excitatory or inhibitory
+        mixed = np.nonzero(np.any(targets == 0, axis=1) & np.any(targets == 1, axis=1))[0]
+        if len(mixed):
+            pop = pres[preGroup[mixed[0]]]
+            raise ValueError('cell %d of population %s has both excitatory and inhibitory synapses'
+                             % (preLocal[mixed[0]], getattr(pop, 'label', None) or preGroup[mixed[0]]))
+
+        # split the synapses by block, relative to the block populations
+        rows, cols = np.nonzero(connected)
+        owner = block[rows, cols]
+        order = np.argsort(owner, kind='mergesort')
+        rows, cols, owner = rows[order], cols[order], owner[order]
+        bounds = np.searchsorted(owner, np.arange(noBlocks + 1))
+        connections = [(rows[first:last] - preStart[preGroup[rows[first:last]]],
+                        cols[first:last] - postStart[postGroup[cols[first:last]]])
+                       for first, last in zip(bounds[:-1], bounds[1:])]
+        return Connectivity(self.blocks, weights, targets, [(pop, start) for pop, start in zip(pres, preStart)],
+                            [(pop, start) for pop, start in zip(posts, postStart)], connections)
+
+    def project(self, pynn, rng=None, connectivity=None):
+        '''
+        Create one Projection per block and return them in the order of the blocks.
+
+        rng          -- generator to draw the synapses with, default backendRNG(pynn)
+        connectivity -- synapses drawn before with generate()
+        '''
+        connectivity = connectivity or self.generate(rng or backendRNG(pynn))
+        return [pynn.Projection(block.pre, block.post, pynn.FromListConnector(connectivity.connectionList(index)),
+                                target=block.target)
+                for index, block in enumerate(self.blocks)]
+
+
+def backendRNG(pynn):
+    '''
+    Generator that the connectors of backend pynn draw from, seeded by
+    setup(rng_seeds=...). Backends that do not provide it (getRNG()) draw
+    from the global NumPy generator.
+    '''
+    if hasattr(pynn, 'getRNG'):
+        return pynn.getRNG()
+    return np.random
+
+
+def _unique(populations):
+    '''Populations in order of first appearance, compared by identity.'''
+    result = []
+    for pop in populations:
+        if not any(pop is other for other in result):
+            result.append(pop)
+    return result
+
+
+def _position(populations, pop):
+    return [i for i, other in enumerate(populations) if other is pop][0]
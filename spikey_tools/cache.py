@@ -0,0 +1,153 @@
+'''
+Content-addressed on-disk cache of experiment results.
+
+Results (spikes, membrane traces, ...) are stored as compressed .npz files
+named by a canonical hash of the experiment description, i.e. everything that
+determines the outcome: populations and their parameters, connectivity and
+weights (or connector seeds), runtime and setup flags. If the total size of
+the cache exceeds its limit, the least recently used results are evicted.
+
+With the software stand-in the cache is used transparently if setup() gets
+resultCache=... or the environment variable SPIKEY_RESULT_CACHE is set to a
+directory. With hardware, cachedRun() wraps pynn.run() and readout.
+'''
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+defaultMaxBytes = 1 << 30
+
+try:
+    _stringTypes = (str, unicode)
+except NameError:
+    _stringTypes = (str,)
+
+
+def _update(digest, obj):
+    '''Feed canonical representation of nested containers into digest.'''
+    if isinstance(obj, dict):
+        digest.update(b'd%d' % len(obj))
+        for key in sorted(obj, key=repr):
+            _update(digest, key)
+            _update(digest, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b'l%d' % len(obj))
+        for item in obj:
+            _update(digest, item)
+    elif isinstance(obj, np.ndarray):
+        obj = np.ascontiguousarray(obj)
+        digest.update(('a%s%s' % (obj.dtype.str, obj.shape)).encode())
+        digest.update(obj.tobytes())
+    elif isinstance(obj, (float, np.floating)):
+        digest.update(('f%r' % float(obj)).encode())
+    elif isinstance(obj, (bool, np.bool_)):
+        digest.update(('b%d' % bool(obj)).encode())
+    elif isinstance(obj, (int, np.integer)):
+        digest.update(('i%d' % int(obj)).encode())
+    elif obj is None:
+        digest.update(b'n')
+    elif isinstance(obj, _stringTypes):
+        digest.update(b's' + obj.encode('utf-8'))
+    else:
+        raise TypeError('can not hash object of type %s' % type(obj).__name__)
+
+
+def canonicalHash(description):
+    '''Return hex digest of nested dicts, lists, arrays, numbers and strings.'''
+    digest = hashlib.sha256()
+    _update(digest, description)
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    '''
+    directory -- where results are stored, created if necessary
+    maxBytes  -- limit of the total size of all stored results
+    '''
+    def __init__(self, directory, maxBytes=defaultMaxBytes):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        '''Return dict of stored arrays or None; marks result as recently used.'''
+        path = self._path(key)
+        try:
+            with np.load(path) as f:
+                result = dict((name, f[name]) for name in f.files)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        os.utime(path, None)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        '''Store dict of arrays and evict least recently used results if necessary.'''
+        handle, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                np.savez_compressed(f, **result)
+            os.rename(tmp, self._path(key))
+        except Exception:
+            os.remove(tmp)
+            raise
+        self.evict()
+
+    def entries(self):
+        '''Return list of (last access, size, path) of all results, oldest first.'''
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+
+
+def cachedRun(pynn, cache, runtime, description, populations=(), recordV=False):
+    '''
+    Run network or fetch its results from cache.
+
+    description must contain everything that determines the results apart from
+    runtime, e.g. neuron and stimulus parameters, connector seeds, weights and
+    setup flags. Returns dict with 'spikes<i>' for each of the populations and,
+    if recordV, 'membrane' and 'timeMembrane'.
+    '''
+    key = canonicalHash({'description': description, 'runtime': runtime,
+                         'populations': len(populations), 'recordV': recordV})
+    result = cache.get(key)
+    if result is not None:
+        return result
+    pynn.run(runtime)
+    result = dict(('spikes%d' % i, np.asarray(pop.getSpikes())) for i, pop in enumerate(populations))
+    if recordV:
+        result['membrane'] = np.asarray(pynn.membraneOutput)
+        result['timeMembrane'] = np.asarray(pynn.timeMembraneOutput)
+    cache.put(key, result)
+    return result
@@ -0,0 +1,199 @@
+'''
+Persistent store of calibration data per board.
+
+Calibration data (e.g. factors of neuron parameters or of synapse drivers like
+those set by Projection.setDrvifallFactors) is stored per board serial and
+calibration version, so that it is derived once and reused by later setups.
+The software stand-in (spikey_tools.software) keeps the mismatch of its
+emulated board in such a store if setup() is given calibrationStore.
+Each entry is a directory of .npy files, which are opened as memory maps,
+and a manifest with the SHA-256 checksum, dtype and shape of each array.
+Checksums are verified when an entry is opened for the first time in a
+process and whenever its files change. Entries are written to a temporary
+directory and renamed, so readers never see a partially written entry.
+
+After a recalibration of a board, its entries are invalidated explicitly:
+
+    $ python -m spikey_tools.calibration --store ~/.spikey_calibration invalidate station500
+
+Example:
+
+    store = CalibrationStore('~/.spikey_calibration')
+    calib = store.getOrCreate(stationSerial(), 'v1', deriveCalibration)
+    prj.setDrvifallFactors(calib['drvifall'][rows])
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from spikey_tools.scheduler import readStations
+
+manifestName = 'manifest.json'
+
+
+class CalibrationError(Exception):
+    '''Calibration data is missing or corrupt.'''
+    pass
+
+
+def _checksum(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stationSerial(station=None, configDir=None):
+    '''Serial of the board of station, default the station given by MY_STAGE1_STATION.'''
+    station = station or os.environ.get('MY_STAGE1_STATION')
+    if not station:
+        raise CalibrationError('no station given and MY_STAGE1_STATION is not set')
+    for config in readStations(configDir):
+        if config.name == station:
+            return config.serial
+    raise CalibrationError('no config for station %s' % station)
+
+
+class CalibrationStore(object):
+    '''Calibration data in directory root, one entry per (serial, version).'''
+    def __init__(self, root):
+        self.root = os.path.expanduser(root)
+        self._verified = {}
+
+    def path(self, serial, version=None):
+        '''Directory of a calibration version of board serial, or of all its versions.'''
+        names = [serial] if version is None else [serial, version]
+        for name in names:
+            if not name or os.sep in name or name.startswith('.'):
+                raise ValueError('invalid serial or version: %r' % name)
+        return os.path.join(self.root, *names)
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self.path(*key), manifestName))
+
+    def versions(self, serial):
+        '''Calibration versions stored for serial.'''
+        directory = self.path(serial)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(version for version in os.listdir(directory)
+                      if os.path.exists(os.path.join(directory, version, manifestName)))
+
+    def save(self, serial, version, arrays, metadata=None):
+        '''Store dict of arrays as calibration version of board serial, replacing an existing one.'''
+        target = self.path(serial, version)
+        parent = os.path.dirname(target)
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=parent)
+        try:
+            manifest = {'serial': serial, 'version': version, 'created': time.time(),
+                        'metadata': metadata or {}, 'arrays': {}}
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                filename = os.path.join(tmp, name + '.npy')
+                np.save(filename, array)
+                manifest['arrays'][name] = {'sha256': _checksum(filename), 'dtype': array.dtype.str,
+                                            'shape': list(array.shape)}
+            with open(os.path.join(tmp, manifestName), 'w') as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+            self.invalidate(serial, version)
+            os.rename(tmp, target)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return target
+
+    def load(self, serial, version):
+        '''
+        Return dict of read-only memory-mapped arrays of the calibration, raise
+        CalibrationError if it is missing or its checksums do not match.
+        '''
+        directory = self.path(serial, version)
+        manifestFile = os.path.join(directory, manifestName)
+        if not os.path.exists(manifestFile):
+            raise CalibrationError('no calibration %s for board %s' % (version, serial))
+        with open(manifestFile) as f:
+            manifest = json.load(f)
+        arrays = {}
+        for name, info in manifest['arrays'].items():
+            filename = os.path.join(directory, name + '.npy')
+            if not os.path.exists(filename):
+                raise CalibrationError('calibration %s of board %s lacks %s' % (version, serial, name))
+            stat = os.stat(filename)
+            stamp = (stat.st_mtime, stat.st_size, info['sha256'])
+            if self._verified.get(filename) != stamp:
+                if _checksum(filename) != info['sha256']:
+                    raise CalibrationError('checksum of %s in calibration %s of board %s does not match'
+                                           % (name, version, serial))
+                self._verified[filename] = stamp
+            array = np.load(filename, mmap_mode='r')
+            if array.dtype.str != info['dtype'] or list(array.shape) != info['shape']:
+                raise CalibrationError('%s in calibration %s of board %s has unexpected type or shape'
+                                       % (name, version, serial))
+            arrays[name] = array
+        return arrays
+
+    def getOrCreate(self, serial, version, derive):
+        '''Load calibration or, if missing or corrupt, store and return the arrays returned by derive().'''
+        try:
+            return self.load(serial, version)
+        except CalibrationError:
+            self.save(serial, version, derive())
+            return self.load(serial, version)
+
+    def invalidate(self, serial, version=None):
+        '''Remove one calibration version of board serial, or all of them.'''
+        target = self.path(serial, version)
+        if not os.path.exists(target):
+            return
+        # rename first, so that no reader sees a partially removed entry
+        trash = tempfile.mkdtemp(prefix='.trash-', dir=os.path.dirname(target))
+        os.rename(target, os.path.join(trash, 'entry'))
+        shutil.rmtree(trash)
+        self._verified = dict((filename, stamp) for filename, stamp in self._verified.items()
+                              if not filename.startswith(target + os.sep))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the calibration store.')
+    parser.add_argument('--store', default=os.environ.get('SPIKEY_CALIBRATION_STORE', '~/.spikey_calibration'),
+                        help='directory of the store, default $SPIKEY_CALIBRATION_STORE or ~/.spikey_calibration')
+    parser.add_argument('--config', default=None, help='directory of station configs, default $SPIKEYHALPATH/config')
+    parser.add_argument('command', choices=['list', 'verify', 'invalidate'])
+    parser.add_argument('station', help='name of the station')
+    parser.add_argument('version', nargs='?', default=None, help='calibration version, default all')
+    args = parser.parse_args()
+
+    store = CalibrationStore(args.store)
+    serial = stationSerial(args.station, args.config)
+    versions = [args.version] if args.version else store.versions(serial)
+    if args.command == 'invalidate':
+        store.invalidate(serial, args.version)
+        print('invalidated %s of board %s' % (args.version or 'all calibrations', serial))
+        return 0
+    failed = 0
+    for version in versions:
+        if args.command == 'verify':
+            try:
+                store.load(serial, version)
+                print('%s: ok' % version)
+            except CalibrationError as e:
+                print('%s: %s' % (version, e))
+                failed += 1
+        else:
+            print(version)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
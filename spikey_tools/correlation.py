@@ -0,0 +1,116 @@
+'''
+Pairwise correlation of spike trains.
+
+Spikes as returned by Population.getSpikes() (rows of neuron ID and spike
+time) are binned into a neuron x time bin count matrix X. The correlation
+coefficients of all pairs follow from the sums over bins of X and of X X^T,
+which are computed by a single matrix product instead of a loop over pairs.
+The count matrix is sparse if scipy is available.
+
+CorrelationAccumulator keeps these sums for several bin widths and adds
+trials incrementally, so that correlations can be averaged over many runs
+without keeping the spikes of all runs in memory.
+
+Example:
+
+    acc = CorrelationAccumulator(len(neurons), [2.0, 10.0], firstId=neurons[0])
+    for trial in range(noTrials):
+        pynn.run(runtime)
+        acc.add(neurons.getSpikes(), 0.0, runtime)
+    meanCorr = acc.meanCorrelation(10.0)
+'''
+
+import numpy as np
+
+try:
+    import scipy.sparse as sparse
+except ImportError:
+    sparse = None
+
+
+def countMatrix(spikes, noNeurons, tStart, tStop, binWidth, firstId=0):
+    '''
+    Return spike counts of shape (noNeurons, number of bins) for spikes in
+    [tStart, tStop), a scipy sparse matrix if scipy is available, else an
+    array. Spikes of neuron ID firstId + i go to row i.
+    '''
+    spikes = np.asarray(spikes, dtype=float).reshape(-1, 2)
+    noBins = int(np.ceil((tStop - tStart) / binWidth - 1e-9))
+    rows = spikes[:, 0].astype(int) - int(firstId)
+    bins = np.floor((spikes[:, 1] - tStart) / binWidth).astype(int)
+    valid = (rows >= 0) & (rows < noNeurons) & (bins >= 0) & (bins < noBins) & (spikes[:, 1] < tStop)
+    rows = rows[valid]
+    bins = bins[valid]
+    if sparse is not None:
+        # duplicate entries are summed on conversion
+        return sparse.coo_matrix((np.ones(len(rows)), (rows, bins)), shape=(noNeurons, noBins)).tocsr()
+    counts = np.bincount(rows * noBins + bins, minlength=noNeurons * noBins)
+    return counts.reshape(noNeurons, noBins).astype(float)
+
+
+class _Sums(object):
+    def __init__(self, noNeurons):
+        self.noBins = 0
+        self.sum = np.zeros(noNeurons)
+        self.outer = np.zeros((noNeurons, noNeurons))
+
+    def add(self, counts):
+        self.noBins += counts.shape[1]
+        self.sum += np.asarray(counts.sum(axis=1)).ravel()
+        product = counts.dot(counts.T)
+        self.outer += product.toarray() if hasattr(product, 'toarray') else product
+
+
+class CorrelationAccumulator(object):
+    '''
+    Sums over time bins of spike counts and their pairwise products for each
+    bin width, accumulated over trials.
+
+    noNeurons -- number of neurons
+    binWidths -- bin widths in ms
+    firstId   -- neuron ID of the first neuron
+    '''
+    def __init__(self, noNeurons, binWidths, firstId=0):
+        self.noNeurons = noNeurons
+        self.firstId = int(firstId)
+        self.noTrials = 0
+        self.sums = dict((float(width), _Sums(noNeurons)) for width in binWidths)
+
+    @property
+    def binWidths(self):
+        return sorted(self.sums)
+
+    def add(self, spikes, tStart, tStop):
+        '''Add spikes of one trial between tStart and tStop.'''
+        for width, sums in self.sums.items():
+            sums.add(countMatrix(spikes, self.noNeurons, tStart, tStop, width, self.firstId))
+        self.noTrials += 1
+
+    def covariance(self, binWidth):
+        '''Covariance matrix of spike counts.'''
+        sums = self.sums[float(binWidth)]
+        if sums.noBins == 0:
+            raise ValueError('no trials added')
+        mean = sums.sum / sums.noBins
+        return sums.outer / sums.noBins - np.outer(mean, mean)
+
+    def correlation(self, binWidth):
+        '''Matrix of correlation coefficients, NaN for neurons without spikes.'''
+        covariance = self.covariance(binWidth)
+        std = np.sqrt(np.maximum(np.diag(covariance), 0.0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return covariance / np.outer(std, std)
+
+    def meanCorrelation(self, binWidth):
+        '''Mean of the correlation coefficients of all pairs of distinct active neurons.'''
+        corr = self.correlation(binWidth)
+        pairs = corr[np.triu_indices(self.noNeurons, 1)]
+        pairs = pairs[np.isfinite(pairs)]
+        return pairs.mean() if len(pairs) else np.nan
+
+
+def correlationMatrix(spikes, noNeurons, tStart, tStop, binWidth, firstId=0):
+    '''Correlation coefficients of spike counts of a single trial, see CorrelationAccumulator.'''
+    acc = CorrelationAccumulator(noNeurons, [binWidth], firstId)
+    acc.add(spikes, tStart, tStop)
+    return acc.correlation(binWidth)
@@ -0,0 +1,178 @@
+'''
+Opt-in instrumentation of the hot paths of a PyNN backend.
+
+instrument(pynn) wraps setup, run, end, the construction of populations and
+projections, record_v, getSpikes and getWeightsHW of the given backend module.
+Each call is recorded with its wall time, the number of bytes it returned
+(e.g. spikes and weights read from the chip, the membrane trace after a run)
+and the increase of the peak memory usage of the process during the call.
+The time from end() to the exit of the process is recorded as
+postprocessing, which usually is dominated by matplotlib.
+
+The events are written as Chrome trace (open with chrome://tracing or
+https://ui.perfetto.dev) when the process exits. Instrumentation is enabled
+by the environment variable SPIKEY_TRACE, which gives the output file or an
+existing directory to write <script>-<pid>.json to. If SPIKEY_TRACE_MALLOC is
+set and the tracemalloc module is available, peak allocations are measured
+with tracemalloc instead of the peak resident set size.
+
+The software stand-in instruments itself when SPIKEY_TRACE is set, scripts
+using the hardware backend can be run with
+
+    $ SPIKEY_TRACE=trace.json python -m spikey_tools.instrument networks/example.py
+'''
+
+import atexit
+import functools
+import json
+import os
+import resource
+import runpy
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def _nbytes(obj):
+    '''Approximate size of arrays or (nested) lists of numbers returned by the backend.'''
+    if hasattr(obj, 'nbytes'):
+        return int(obj.nbytes)
+    if isinstance(obj, (list, tuple)):
+        return sum(_nbytes(item) for item in obj)
+    if isinstance(obj, (int, float)):
+        return 8
+    return 0
+
+
+class Tracer(object):
+    def __init__(self, useTracemalloc=False):
+        self.events = []
+        self.t0 = time.time()
+        self.endTime = None
+        self.useTracemalloc = useTracemalloc and tracemalloc is not None
+        if self.useTracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _memory(self):
+        if self.useTracemalloc:
+            return tracemalloc.get_traced_memory()[1]
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def call(self, name, function, args, kwargs, size=None):
+        '''Call function and record it as event name.'''
+        if self.useTracemalloc and hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        memory = self._memory()
+        start = time.time()
+        result = function(*args, **kwargs)
+        stop = time.time()
+        event = {'name': name, 'start': start, 'duration': stop - start,
+                 'peakIncrease': self._memory() - memory}
+        if size is not None:
+            event['bytes'] = size(result)
+        self.events.append(event)
+        return result
+
+    def add(self, name, start, stop, **extra):
+        event = {'name': name, 'start': start, 'duration': stop - start}
+        event.update(extra)
+        self.events.append(event)
+
+    def chromeTrace(self):
+        pid = os.getpid()
+        trace = []
+        for event in self.events:
+            args = dict((key, value) for key, value in event.items()
+                        if key not in ('name', 'start', 'duration'))
+            trace.append({'name': event['name'], 'ph': 'X', 'pid': pid, 'tid': 0,
+                          'ts': (event['start'] - self.t0) * 1e6, 'dur': event['duration'] * 1e6,
+                          'args': args})
+        return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+    def write(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.chromeTrace(), f)
+
+
+def _wrap(tracer, owner, attribute, name, size=None):
+    original = getattr(owner, attribute, None)
+    if original is None or getattr(original, 'instrumented', False):
+        return
+    if isinstance(owner, type):
+        original = owner.__dict__.get(attribute, original)
+
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        return tracer.call(name, original, args, kwargs, size)
+    wrapper.instrumented = True
+    setattr(owner, attribute, wrapper)
+
+
+def instrument(pynn, tracer=None):
+    '''Wrap the entry points of backend module pynn, return the Tracer.'''
+    if tracer is None:
+        tracer = Tracer(bool(os.environ.get('SPIKEY_TRACE_MALLOC')))
+    _wrap(tracer, pynn, 'setup', 'setup')
+    _wrap(tracer, pynn, 'run', 'run', lambda result: _nbytes(getattr(pynn, 'membraneOutput', None)))
+    _wrap(tracer, pynn, 'record_v', 'record_v')
+    _wrap(tracer, pynn.Population, '__init__', 'Population')
+    _wrap(tracer, pynn.Projection, '__init__', 'Projection')
+    _wrap(tracer, pynn.Population, 'getSpikes', 'getSpikes', _nbytes)
+    _wrap(tracer, pynn.Projection, 'getWeightsHW', 'getWeightsHW', _nbytes)
+
+    end = pynn.end
+    if not getattr(end, 'instrumented', False):
+        @functools.wraps(end)
+        def endWrapper(*args, **kwargs):
+            result = tracer.call('end', end, args, kwargs)
+            tracer.endTime = time.time()
+            return result
+        endWrapper.instrumented = True
+        pynn.end = endWrapper
+    return tracer
+
+
+def _outputFile(target):
+    if os.path.isdir(target):
+        script = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+        return os.path.join(target, '%s-%d.json' % (script, os.getpid()))
+    return target
+
+
+def _writeAtExit(tracer, target):
+    def write():
+        if tracer.endTime is not None:
+            tracer.add('postprocessing', tracer.endTime, time.time())
+        tracer.write(_outputFile(target))
+    atexit.register(write)
+
+
+def instrumentFromEnvironment(pynn):
+    '''Instrument pynn if SPIKEY_TRACE is set, return the Tracer or None.'''
+    target = os.environ.get('SPIKEY_TRACE')
+    if not target:
+        return None
+    if getattr(pynn, 'spikeyTracer', None) is None:
+        pynn.spikeyTracer = instrument(pynn)
+        _writeAtExit(pynn.spikeyTracer, target)
+    return pynn.spikeyTracer
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.stderr.write('usage: python -m spikey_tools.instrument script.py [args]\n')
+        return 1
+    import pyNN.hardware.spikey as pynn
+    instrumentFromEnvironment(pynn)
+    sys.argv = sys.argv[1:]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(sys.argv[0])))
+    runpy.run_path(sys.argv[0], run_name='__main__')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
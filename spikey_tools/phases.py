@@ -0,0 +1,53 @@
+'''
+Wall-clock time per phase of an experiment script.
+
+An experiment is split into the phases import, setup, construction, mapping,
+run, readout and analysis. The backend marks the beginning of each phase,
+time is accounted to the current phase until the next mark, so that
+repeated runs accumulate. Marking is a no-op unless the environment variable
+SPIKEY_PHASE_FILE is set, then the phase times are written to that file as
+JSON when the process exits. SPIKEY_PHASE_T0 may hold the time.time() at
+which the process was started, otherwise the import phase starts when this
+module is imported.
+'''
+
+import atexit
+import json
+import os
+import time
+
+phaseNames = ['import', 'setup', 'construction', 'mapping', 'run', 'readout', 'analysis']
+
+
+class PhaseTimer(object):
+    def __init__(self, t0=None):
+        self.current = 'import'
+        self.last = time.time() if t0 is None else t0
+        self.phases = dict((name, 0.0) for name in phaseNames)
+
+    def mark(self, name):
+        '''Account time since last mark to the current phase and switch to phase name.'''
+        now = time.time()
+        self.phases[self.current] += now - self.last
+        self.current = name
+        self.last = now
+
+    def result(self):
+        self.mark(self.current)
+        return dict(self.phases)
+
+    def write(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.result(), f)
+
+
+_timer = None
+if os.environ.get('SPIKEY_PHASE_FILE'):
+    _t0 = os.environ.get('SPIKEY_PHASE_T0')
+    _timer = PhaseTimer(float(_t0) if _t0 else None)
+    atexit.register(_timer.write, os.environ['SPIKEY_PHASE_FILE'])
+
+
+def mark(name):
+    if _timer is not None:
+        _timer.mark(name)
@@ -0,0 +1,147 @@
+'''
+Pipelined runs that overlap host-side analysis with the next emulation.
+
+pynn.run() blocks, and a sweep alternates between the chip waiting for the
+host to analyse the last run and the host waiting for the chip. Pipeline
+splits each step into a backend stage and an analysis stage:
+
+    backend thread:  configure -> pynn.run() -> readout  (one run at a time)
+    analysis thread: analyse(readout data)
+
+Readout has to copy everything needed from the backend (e.g. getSpikes()),
+because the next run overwrites the results of the backend. While the
+results of one run are analysed, the next one is already configured and
+emulated. At most depth runs are in flight: submit() blocks if depth steps
+wait for the backend and the backend blocks if depth readouts wait for
+analysis, so memory of pending results stays bounded.
+
+With the hardware backend the overlap comes from the transfer and emulation
+on the chip, which do not need the interpreter. The software stand-in only
+gains as far as NumPy releases the interpreter lock and cores are available.
+
+Example:
+
+    with Pipeline(pynn, depth=2) as pipeline:
+        futures = [pipeline.submit(runtime, readout=lambda pynn: neurons.getSpikes(),
+                                   configure=lambda value=value: neurons.set({'g_leak': value}),
+                                   analyse=len)
+                   for value in gLeakList]
+    counts = [future.result() for future in futures]
+'''
+
+import sys
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+if sys.version_info[0] < 3:
+    # the three-argument raise is a syntax error in Python 3
+    exec('def _reraise(excInfo):\n    raise excInfo[0], excInfo[1], excInfo[2]\n')
+else:
+    def _reraise(excInfo):
+        raise excInfo[1].with_traceback(excInfo[2])
+
+
+class Future(object):
+    '''Result of a submitted step, available when the step is analysed.'''
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._excInfo = None
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        '''Wait for the result, re-raise the exception with its traceback if the step failed.'''
+        if not self._done.wait(timeout):
+            raise RuntimeError('result not available within %s s' % timeout)
+        if self._excInfo is not None:
+            _reraise(self._excInfo)
+        return self._result
+
+    def _set(self, result=None, excInfo=None):
+        self._result = result
+        self._excInfo = excInfo
+        self._done.set()
+
+
+class Pipeline(object):
+    '''
+    pynn  -- backend module, only used from the backend thread once steps are submitted
+    depth -- maximum number of steps waiting for the backend, and of readouts
+             waiting for analysis
+    '''
+    def __init__(self, pynn, depth=2):
+        self.pynn = pynn
+        self.depth = depth
+        self._steps = queue.Queue(depth)
+        self._readouts = queue.Queue(depth)
+        self._closed = False
+        self._backend = threading.Thread(target=self._runBackend, name='pipeline-backend')
+        self._analysis = threading.Thread(target=self._runAnalysis, name='pipeline-analysis')
+        for thread in (self._backend, self._analysis):
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, runtime, readout, configure=None, analyse=None):
+        '''
+        Queue a run and return its Future.
+
+        runtime   -- runtime in ms
+        readout   -- function(pynn) called right after the run, returns the data to analyse
+        configure -- function() called before the run to change parameters, optional
+        analyse   -- function(data) run in the analysis thread, the future holds
+                     its result, or the data if not given
+        '''
+        if self._closed:
+            raise RuntimeError('pipeline is closed')
+        future = Future()
+        self._steps.put((runtime, readout, configure, analyse, future))
+        return future
+
+    def _runBackend(self):
+        while True:
+            step = self._steps.get()
+            if step is None:
+                self._readouts.put(None)
+                return
+            runtime, readout, configure, analyse, future = step
+            try:
+                if configure is not None:
+                    configure()
+                self.pynn.run(runtime)
+                data = readout(self.pynn)
+            except Exception:
+                future._set(excInfo=sys.exc_info())
+                continue
+            self._readouts.put((data, analyse, future))
+
+    def _runAnalysis(self):
+        while True:
+            item = self._readouts.get()
+            if item is None:
+                return
+            data, analyse, future = item
+            try:
+                future._set(analyse(data) if analyse is not None else data)
+            except Exception:
+                future._set(excInfo=sys.exc_info())
+
+    def close(self):
+        '''Wait until all submitted steps are analysed.'''
+        if self._closed:
+            return
+        self._closed = True
+        self._steps.put(None)
+        self._backend.join()
+        self._analysis.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,112 @@
+'''
+Explicit placement of spike sources on synapse drivers and of neurons on the chip.
+
+To characterize a single synapse at a given row and column, the demo scripts
+used to allocate dummy spike sources until the synapse driver of interest was
+reached. These dummy populations are mapped, configured and uploaded for
+nothing. The software stand-in instead keeps an occupancy index of all
+synapse driver rows and neuron columns, and populations can be pinned to a
+position with pynn.place(population, first).
+
+Placer hides the difference between backends: with the software stand-in it
+pins populations directly, with the hardware backend it falls back to
+padding with dummy spike sources. In the fallback, sources are placed in
+order of creation, i.e. sources created after a pinned one occupy the
+following rows.
+
+Example:
+
+    placer = Placer(pynn, padTarget=neurons)
+    stimulus = placer.sources(1, pynn.SpikeSourceArray, {'spike_times': spikeTimes}, row=42)
+'''
+
+import numpy as np
+
+_slotNames = {'drivers': 'synapse driver', 'neurons': 'neuron'}
+
+
+class Occupancy(object):
+    '''
+    Owner of each synapse driver row and neuron column, -1 if free.
+
+    Owners are arbitrary non-negative integers, e.g. indices of populations.
+    '''
+    def __init__(self, noDrivers=256, noNeurons=384):
+        self.slots = {'drivers': -np.ones(noDrivers, dtype=int),
+                      'neurons': -np.ones(noNeurons, dtype=int)}
+
+    def reserve(self, kind, owner, first, size):
+        '''Assign the size slots of kind ('drivers' or 'neurons') starting at first to owner.'''
+        slots = self.slots[kind]
+        if first < 0 or first + size > len(slots):
+            raise ValueError('%s %d to %d out of range(%d)' % (_slotNames[kind], first, first + size - 1, len(slots)))
+        taken = np.nonzero((slots[first:first + size] >= 0) & (slots[first:first + size] != owner))[0]
+        if len(taken):
+            raise ValueError('%s %d is already occupied' % (_slotNames[kind], first + taken[0]))
+        slots[first:first + size] = owner
+        return np.arange(first, first + size)
+
+    def allocate(self, kind, owner, size, start=0):
+        '''Assign the first size free slots of kind at or after start to owner.'''
+        slots = self.slots[kind]
+        free = np.nonzero(slots[start:] < 0)[0][:size] + start
+        if len(free) < size:
+            raise ValueError('not enough free %ss, %d requested' % (_slotNames[kind], size))
+        slots[free] = owner
+        return free
+
+    def release(self, kind, owner):
+        self.slots[kind][self.slots[kind] == owner] = -1
+
+    def free(self, kind):
+        '''Indices of all free slots of kind.'''
+        return np.nonzero(self.slots[kind] < 0)[0]
+
+
+class Placer(object):
+    '''
+    Create populations at given synapse driver rows or neuron columns.
+
+    pynn      -- backend module
+    padTarget -- neuron population that dummy sources are connected to with
+                 zero weight in the fallback, required if the backend maps
+                 only sources with projections
+    '''
+    def __init__(self, pynn, padTarget=None):
+        self.pynn = pynn
+        self.padTarget = padTarget
+        self.direct = hasattr(pynn, 'place')
+        self.noSources = 0
+        self.padding = []
+
+    def sources(self, size, cellclass, cellparams=None, row=None, label=None):
+        '''Create spike sources, pinned to consecutive rows starting at row if given.'''
+        pynn = self.pynn
+        if row is not None and not self.direct:
+            if row < self.noSources:
+                raise ValueError('row %d is already occupied, create pinned sources first' % row)
+            if row > self.noSources:
+                self._pad(row - self.noSources)
+        population = pynn.Population(size, cellclass, cellparams, label=label)
+        if row is not None and self.direct:
+            pynn.place(population, row)
+        self.noSources += size
+        return population
+
+    def neurons(self, size, cellparams=None, column=None, label=None):
+        '''Create neurons, pinned to consecutive columns starting at column if given.'''
+        pynn = self.pynn
+        population = pynn.Population(size, pynn.IF_facets_hardware1, cellparams, label=label)
+        if column is not None:
+            if not self.direct:
+                raise ValueError('neurons can only be placed with setup(mappingOffset=...) on this backend')
+            pynn.place(population, column)
+        return population
+
+    def _pad(self, size):
+        pynn = self.pynn
+        dummy = pynn.Population(size, pynn.SpikeSourceArray, {'spike_times': []})
+        if self.padTarget is not None:
+            pynn.Projection(dummy, self.padTarget, pynn.AllToAllConnector(weights=0), target='excitatory')
+        self.padding.append(dummy)
+        self.noSources += size
@@ -0,0 +1,121 @@
+'''
+Plotting of large spike and membrane recordings.
+
+Drawing one marker per spike or one line segment per membrane sample gets
+slower than the emulation itself for long runs. Here, spikes are rasterized
+into an image with one pixel per (neuron, time) bin and membrane traces are
+drawn as the envelope of minimum and maximum within each pixel column, so
+that the cost of rendering depends on the size of the figure, not on the
+amount of data.
+
+matplotlib is imported only when something is drawn, batch runs that never
+plot do not pay for its import. Without a display, the Agg backend is used.
+
+Example:
+
+    ax = plotting.pyplot().subplot(211)
+    plotting.raster(ax, spikes[:, 1], spikes[:, 0], timeRange=(0, runtime))
+    plotting.trace(plotting.pyplot().subplot(212), pynn.timeMembraneOutput, pynn.membraneOutput)
+'''
+
+import os
+import sys
+
+import numpy as np
+
+
+def pyplot():
+    '''Import and return matplotlib.pyplot, select Agg backend if there is no display.'''
+    if 'matplotlib.pyplot' not in sys.modules and not os.environ.get('DISPLAY'):
+        import matplotlib
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _pixels(ax):
+    '''Size of the axes in pixels.'''
+    extent = ax.get_window_extent()
+    return max(int(extent.width), 1), max(int(extent.height), 1)
+
+
+def rasterize(times, ids, timeRange, idRange, width, height=None):
+    '''
+    Return spike counts of shape (height, width), row i holds neuron IDs
+    idRange[0] + i if height is None (one row per neuron).
+
+    times     -- spike times
+    ids       -- neuron IDs of the spikes
+    timeRange -- (start, stop) of the time axis
+    idRange   -- (first, last) neuron ID, inclusive
+    '''
+    times = np.asarray(times, dtype=float)
+    ids = np.asarray(ids, dtype=float)
+    noIds = int(idRange[1] - idRange[0]) + 1
+    height = height or noIds
+    column = np.floor((times - timeRange[0]) / (timeRange[1] - timeRange[0]) * width).astype(int)
+    row = np.floor((ids - idRange[0]) * height / float(noIds)).astype(int)
+    valid = (column >= 0) & (column < width) & (row >= 0) & (row < height)
+    counts = np.bincount(row[valid] * width + column[valid], minlength=width * height)
+    return counts.reshape(height, width)
+
+
+def raster(ax, times, ids, timeRange=None, idRange=None, color='k', width=None):
+    '''
+    Draw spikes into ax as an image with one pixel per bin, return the image.
+    A pixel row holds one neuron as long as there are more pixels than neurons.
+    '''
+    from matplotlib.colors import ListedColormap
+    times = np.asarray(times, dtype=float)
+    ids = np.asarray(ids, dtype=float)
+    if timeRange is None:
+        timeRange = (times.min(), times.max()) if len(times) else (0.0, 1.0)
+    if idRange is None:
+        idRange = (ids.min(), ids.max()) if len(ids) else (0, 0)
+    pixelWidth, pixelHeight = _pixels(ax)
+    width = width or pixelWidth
+    noIds = int(idRange[1] - idRange[0]) + 1
+    counts = rasterize(times, ids, timeRange, idRange, width, min(noIds, pixelHeight))
+    image = np.ma.masked_equal(np.minimum(counts, 1), 0)
+    return ax.imshow(image, cmap=ListedColormap([color]), vmin=0, vmax=1, aspect='auto',
+                     interpolation='nearest', origin='lower',
+                     extent=(timeRange[0], timeRange[1], idRange[0] - 0.5, idRange[1] + 0.5))
+
+
+def envelope(values, noColumns):
+    '''
+    Return (first sample index, minimum, maximum) of values in each of
+    noColumns columns of equal numbers of samples.
+    '''
+    values = np.asarray(values)
+    noColumns = max(min(noColumns, len(values)), 1)
+    starts = (np.arange(noColumns) * len(values)) // noColumns
+    return starts, np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)
+
+
+def trace(ax, times, values, width=None, color=None, **kwargs):
+    '''
+    Draw equidistantly sampled trace, as min/max envelope per pixel column
+    if there are more samples than pixels. times may be a TimeAxis.
+    '''
+    values = np.asarray(values)
+    width = width or _pixels(ax)[0]
+    if len(values) <= 2 * width:
+        return ax.plot(np.asarray(times), values, color=color, **kwargs)
+    t0 = times[0]
+    dt = times[1] - times[0]
+    starts, lower, upper = envelope(values, width)
+    columnTimes = t0 + starts * dt
+    # repeat last column at the end of the trace to cover the whole time axis
+    columnTimes = np.append(columnTimes, t0 + (len(values) - 1) * dt)
+    lower = np.append(lower, lower[-1])
+    upper = np.append(upper, upper[-1])
+    color = color or 'C0'
+    return ax.fill_between(columnTimes, lower, upper, step='post', color=color, linewidth=0.5,
+                           edgecolor=color, **kwargs)
+
+
+def spikeLines(ax, times, color='C0', **kwargs):
+    '''Draw a vertical line over the whole height of ax for each spike time, in a single collection.'''
+    return ax.vlines(np.asarray(times, dtype=float), 0, 1, transform=ax.get_xaxis_transform(),
+                     colors=color, **kwargs)
@@ -0,0 +1,136 @@
+'''
+Membrane recordings with implicit time axis.
+
+A recording stores only the ADC samples, sample i was taken at t0 + i * dt.
+Samples can live in memory or in a memory-mapped .npy file with the sampling
+parameters in a small JSON file next to it, and can be processed as a
+sequence of fixed-size chunks.
+
+Example:
+
+    recording = MembraneRecording.fromArrays(pynn.membraneOutput, pynn.timeMembraneOutput)
+    recording.save('membrane.npy')
+    ...
+    recording = MembraneRecording.open('membrane.npy')
+    for t0, chunk in recording.chunks(1 << 16):
+        ...
+'''
+
+import json
+
+import numpy as np
+
+
+class TimeAxis(object):
+    '''
+    Read-only array-like time axis t0 + i * dt that is never stored.
+
+    Integer indexing returns a float, slices are computed without creating
+    the whole axis. Any other index (boolean masks, index arrays), arithmetic
+    and comparison operators and NumPy functions work on the regular array
+    returned by __array__, e.g. time > 0.5 is a boolean array.
+    '''
+    # let NumPy defer binary operators with arrays to the reflected operators below
+    __array_priority__ = 1.0
+
+    def __init__(self, length, dt, t0=0.0):
+        self.length = int(length)
+        self.dt = float(dt)
+        self.t0 = float(t0)
+
+    ndim = 1
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(self[:])
+
+    @property
+    def shape(self):
+        return (self.length,)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.t0 + np.arange(*index.indices(self.length)) * self.dt
+        if isinstance(index, (int, np.integer)) and not isinstance(index, (bool, np.bool_)):
+            if index >= self.length or index < -self.length:
+                raise IndexError('index out of range')
+            return self.t0 + (index + self.length if index < 0 else index) * self.dt
+        return np.asarray(self)[index]
+
+    def __array__(self, dtype=None):
+        return self[:].astype(dtype or float)
+
+    def index(self, t):
+        '''Index of the sample closest to time t.'''
+        return int(round((t - self.t0) / self.dt))
+
+
+def _delegate(name):
+    def operator(self, *args):
+        return getattr(np.asarray(self), name)(*[np.asarray(a) if isinstance(a, TimeAxis) else a for a in args])
+    operator.__name__ = name
+    return operator
+
+
+for _name in ('add', 'sub', 'mul', 'div', 'truediv', 'floordiv', 'mod', 'pow'):
+    setattr(TimeAxis, '__%s__' % _name, _delegate('__%s__' % _name))
+    setattr(TimeAxis, '__r%s__' % _name, _delegate('__r%s__' % _name))
+for _name in ('lt', 'le', 'eq', 'ne', 'gt', 'ge', 'neg', 'pos', 'abs'):
+    setattr(TimeAxis, '__%s__' % _name, _delegate('__%s__' % _name))
+
+
+class MembraneRecording(object):
+    '''Samples of the membrane potential in mV, sample i taken at t0 + i * dt ms.'''
+    def __init__(self, data, dt, t0=0.0):
+        self.data = data
+        self.dt = float(dt)
+        self.t0 = float(t0)
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def time(self):
+        return TimeAxis(len(self.data), self.dt, self.t0)
+
+    @classmethod
+    def fromArrays(cls, membrane, time):
+        '''Create recording from membraneOutput and timeMembraneOutput.'''
+        if len(time) > 1:
+            dt = (time[len(time) - 1] - time[0]) / (len(time) - 1)
+        else:
+            dt = 1.0
+        return cls(np.asarray(membrane), dt, time[0] if len(time) else 0.0)
+
+    @classmethod
+    def create(cls, filename, length, dt, t0=0.0, dtype=np.float32):
+        '''Create an empty memory-mapped recording to be filled, e.g. during a run.'''
+        data = np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=(int(length),))
+        recording = cls(data, dt, t0)
+        recording._writeMeta(filename)
+        return recording
+
+    @classmethod
+    def open(cls, filename, mode='r'):
+        '''Open a recording saved with save() or create() without reading it.'''
+        with open(filename + '.json') as f:
+            meta = json.load(f)
+        return cls(np.load(filename, mmap_mode=mode), meta['dt'], meta['t0'])
+
+    def _writeMeta(self, filename):
+        with open(filename + '.json', 'w') as f:
+            json.dump({'dt': self.dt, 't0': self.t0}, f)
+
+    def save(self, filename, dtype=np.float32):
+        '''Write samples to an .npy file that can be memory-mapped by open().'''
+        out = np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=(len(self.data),))
+        out[:] = self.data
+        out.flush()
+        self._writeMeta(filename)
+
+    def chunks(self, size):
+        '''Yield (t0, samples) of consecutive chunks with size samples each (except the last).'''
+        for start in range(0, len(self.data), size):
+            yield self.t0 + start * self.dt, self.data[start:start + size]
@@ -0,0 +1,219 @@
+'''
+Append-only store of sweep results, indexed by parameters.
+
+Each sweep point is stored with its parameters, summary statistics (numbers)
+and arrays (e.g. spikes). Arrays of several points are collected in chunks
+of compressed .npz files, parameters and summaries go to an index file with
+one JSON line per point. The index is loaded once and kept as one NumPy
+column per numeric parameter, so that queries like
+
+    store.query({'neurons.g_leak': (50, 100), 'weight': 7})
+
+are answered from the index without opening any chunk. The description of
+the store holds the parameters that are fixed during a sweep (network
+parameters, runtime, ...). It is stored with each point and is part of its
+key, so a point is only found again with the same description, and queries
+can select on it as on the swept parameters. A chunk is written before its
+index lines, and index lines are only appended, so a sweep that was
+interrupted can be resumed: points found in the store are skipped (see
+spikey_tools.sweep.runSweep), at most the points of the last incomplete
+chunk are run again.
+
+Example:
+
+    store = ResultsStore('rate_over_gleak.results', description={'weight': 7.0, 'runtime': 1000.0})
+    store.append({'g_leak': 20.0}, {'rate': 12.5, 'spikes': spikes})
+    store.flush()
+    for record in store.query({'g_leak': (10, 30), 'weight': 7}):
+        record.summary['rate'], record.arrays()['spikes']
+'''
+
+import json
+import numbers
+import os
+
+import numpy as np
+
+from spikey_tools.cache import canonicalHash
+
+indexName = 'index.jsonl'
+
+
+def flatten(point, prefix=''):
+    '''Turn nested dict {'neurons': {'g_leak': 2}} into {'neurons.g_leak': 2}.'''
+    flat = {}
+    for name, value in point.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + name + '.'))
+        else:
+            flat[prefix + name] = value
+    return flat
+
+
+def _plain(value):
+    '''Convert NumPy scalars and arrays to JSON-serializable values.'''
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+class Record(object):
+    '''One stored sweep point.'''
+    def __init__(self, store, entry):
+        self.store = store
+        self.key = entry['key']
+        self.parameters = entry['parameters']
+        self.summary = entry['summary']
+        self.chunk = entry['chunk']
+        self.arrayNames = entry['arrays']
+        self.scalar = entry.get('scalar', False)
+
+    def arrays(self):
+        '''Load the arrays of this point from its chunk.'''
+        if not self.arrayNames:
+            return {}
+        with np.load(os.path.join(self.store.directory, self.chunk)) as data:
+            return dict((name, data['%s/%s' % (self.key, name)]) for name in self.arrayNames)
+
+    def result(self):
+        '''Result as passed to ResultsStore.append().'''
+        if self.scalar:
+            return self.summary['value']
+        result = dict(self.summary)
+        result.update(self.arrays())
+        return result
+
+
+class ResultsStore(object):
+    '''
+    directory   -- directory of the store, created if missing
+    chunkSize   -- number of points whose arrays are written to one chunk
+    description -- (nested) dict of fixed parameters added to the parameters of each point
+    '''
+    def __init__(self, directory, chunkSize=16, description=None):
+        self.directory = directory
+        self.chunkSize = chunkSize
+        self.description = flatten(description or {})
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.records = []
+        self.byKey = {}
+        self.pending = []
+        self._columns = None
+        self._load()
+
+    def _load(self):
+        path = os.path.join(self.directory, indexName)
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb+') as f:
+            complete = 0
+            for line in f:
+                try:
+                    entry = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                self._add(Record(self, entry))
+                complete += len(line)
+            # drop incomplete last line of an interrupted write, new lines are appended after it
+            f.truncate(complete)
+
+    def _add(self, record):
+        self.records.append(record)
+        self.byKey[record.key] = record
+        self._columns = None
+
+    def __len__(self):
+        return len(self.records)
+
+    @staticmethod
+    def key(parameters):
+        return canonicalHash(_plain(parameters))
+
+    def _complete(self, parameters):
+        '''Parameters of a point together with the description of the store.'''
+        complete = dict(self.description)
+        complete.update(parameters)
+        return complete
+
+    def __contains__(self, parameters):
+        return self.key(self._complete(parameters)) in self.byKey
+
+    def get(self, parameters):
+        '''Record of the point with exactly these parameters, None if not stored (or not flushed).'''
+        return self.byKey.get(self.key(self._complete(parameters)))
+
+    def append(self, parameters, result):
+        '''
+        Add a sweep point. result is a dict of numbers (summary statistics)
+        and arrays, or a single number. Written with the next full chunk or flush().
+        '''
+        scalar = not isinstance(result, dict)
+        if scalar:
+            result = {'value': result}
+        summary = dict((name, _plain(value)) for name, value in result.items() if not isinstance(value, np.ndarray))
+        arrays = dict((name, value) for name, value in result.items() if isinstance(value, np.ndarray))
+        parameters = self._complete(parameters)
+        self.pending.append(({'key': self.key(parameters), 'parameters': _plain(parameters), 'summary': summary,
+                              'arrays': sorted(arrays), 'scalar': scalar}, arrays))
+        if len(self.pending) >= self.chunkSize:
+            self.flush()
+
+    def flush(self):
+        '''Write pending points: first their chunk, then their index lines.'''
+        if not self.pending:
+            return
+        chunk = 'chunk-%06d.npz' % len([name for name in os.listdir(self.directory) if name.startswith('chunk-')])
+        data = {}
+        for entry, arrays in self.pending:
+            entry['chunk'] = chunk
+            for name, array in arrays.items():
+                data['%s/%s' % (entry['key'], name)] = array
+        if data:
+            tmp = os.path.join(self.directory, '.tmp-' + chunk)
+            with open(tmp, 'wb') as f:
+                np.savez_compressed(f, **data)
+            os.rename(tmp, os.path.join(self.directory, chunk))
+        with open(os.path.join(self.directory, indexName), 'a') as f:
+            for entry, _ in self.pending:
+                f.write(json.dumps(entry, sort_keys=True) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        for entry, _ in self.pending:
+            self._add(Record(self, entry))
+        self.pending = []
+
+    def column(self, name):
+        '''Values of numeric parameter name of all records, NaN where missing or not numeric.'''
+        if self._columns is None:
+            self._columns = {}
+        if name not in self._columns:
+            self._columns[name] = np.array([record.parameters.get(name) if isinstance(
+                record.parameters.get(name), numbers.Number) else np.nan for record in self.records], dtype=float)
+        return self._columns[name]
+
+    def query(self, conditions):
+        '''
+        Return records whose parameters meet all conditions, a dict of
+        parameter name to value (equality) or (low, high) (inclusive range).
+        Numbers are compared up to rounding errors, other values like strings
+        exactly.
+        '''
+        mask = np.ones(len(self.records), dtype=bool)
+        with np.errstate(invalid='ignore'):
+            for name, condition in conditions.items():
+                if isinstance(condition, (tuple, list)):
+                    column = self.column(name)
+                    mask &= (column >= condition[0]) & (column <= condition[1])
+                elif isinstance(condition, numbers.Number):
+                    mask &= np.isclose(self.column(name), condition)
+                else:
+                    mask &= np.array([record.parameters.get(name) == condition for record in self.records],
+                                     dtype=bool)
+        return [self.records[i] for i in np.nonzero(mask)[0]]
@@ -0,0 +1,266 @@
+'''
+Run experiment scripts concurrently on several Spikey stations.
+
+test/run_spikey_tests.sh runs everything serially on a single station, found
+either from MY_STAGE1_STATION or by matching the serials of connected USB
+devices against $SPIKEYHALPATH/config/*.cfg. Scheduler keeps a queue of
+jobs, i.e. scripts like those in networks/ with their command line arguments
+(e.g. one job per sweep point), and dispatches them with one worker per
+station, so that throughput scales with the number of boards.
+
+Station configs (first line serial, second line board) are parsed once and
+cached until the config file changes. A hardware station is selected for a
+job by setting MY_STAGE1_STATION in its environment. Stand-in stations run
+jobs against the software stand-in (spikey_tools/software.py) and make the
+scheduler usable without hardware.
+
+Usage:
+
+    $ python -m spikey_tools.scheduler [--local 2] networks/example.py networks/stp.py ...
+
+or in Python:
+
+    scheduler = Scheduler(hardwareStations() or [standinStation()])
+    for value in gLeakList:
+        scheduler.submit(Job('sweep_point.py', ['--gleak', str(value)]))
+    results = scheduler.run()
+'''
+
+import argparse
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+repoPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+usbDevice = '04b4:1003'
+
+_configCache = {}
+
+
+def standinEnvironment(env=None):
+    '''Environment that runs scripts against the software stand-in.'''
+    env = dict(os.environ if env is None else env)
+    paths = [repoPath, os.path.join(repoPath, 'spikey_tools', 'standin')]
+    if env.get('PYTHONPATH'):
+        paths.append(env['PYTHONPATH'])
+    env['PYTHONPATH'] = os.pathsep.join(paths)
+    env['MPLBACKEND'] = 'Agg'
+    return env
+
+
+class Station(object):
+    '''
+    A setup that runs one job at a time.
+
+    name   -- name of the station, i.e. of its config file
+    serial -- serial of the USB device, None for stand-in stations
+    board  -- board number
+    standin -- run jobs against the software stand-in instead of hardware
+    '''
+    def __init__(self, name, serial=None, board=None, standin=False):
+        self.name = name
+        self.serial = serial
+        self.board = board
+        self.standin = standin
+
+    def __repr__(self):
+        return 'Station(%r, serial=%r, board=%r, standin=%r)' % (self.name, self.serial, self.board, self.standin)
+
+    def environment(self):
+        if self.standin:
+            return standinEnvironment()
+        env = dict(os.environ)
+        env['MY_STAGE1_STATION'] = self.name
+        return env
+
+
+def standinStation(name='standin'):
+    return Station(name, standin=True)
+
+
+def readStationConfig(filename):
+    '''Parse a station config, cached until the file is modified.'''
+    mtime = os.path.getmtime(filename)
+    cached = _configCache.get(filename)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(filename) as f:
+        lines = [line.strip() for line in f]
+    if len(lines) < 2:
+        raise ValueError('station config %s needs serial and board in its first two lines' % filename)
+    name = os.path.splitext(os.path.basename(filename))[0]
+    station = Station(name, lines[0], lines[1])
+    _configCache[filename] = (mtime, station)
+    return station
+
+
+def readStations(configDir=None):
+    '''Return all stations configured in configDir, default $SPIKEYHALPATH/config.'''
+    if configDir is None:
+        if not os.environ.get('SPIKEYHALPATH'):
+            return []
+        configDir = os.path.join(os.environ['SPIKEYHALPATH'], 'config')
+    return [readStationConfig(filename) for filename in sorted(glob.glob(os.path.join(configDir, '*.cfg')))]
+
+
+def connectedSerials():
+    '''Serials of the Spikey boards connected via USB, empty if lsusb is not available.'''
+    try:
+        with open(os.devnull, 'w') as devnull:
+            output = subprocess.check_output(['lsusb', '-v', '-d', usbDevice], stderr=devnull)
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    return [line.split()[2] for line in output.decode().splitlines()
+            if line.strip().startswith('iSerial') and len(line.split()) > 2]
+
+
+def hardwareStations(configDir=None):
+    '''
+    Stations available for jobs: the one given by MY_STAGE1_STATION if set,
+    otherwise all configured stations with a connected board.
+    '''
+    stations = readStations(configDir)
+    selected = os.environ.get('MY_STAGE1_STATION')
+    if selected:
+        return [station for station in stations if station.name == selected]
+    serials = connectedSerials()
+    return [station for station in stations if station.serial in serials]
+
+
+class Job(object):
+    '''
+    A script with its command line arguments.
+
+    script -- path of the Python script
+    args   -- list of command line arguments
+    label  -- name of the job, default the name of the script
+    '''
+    def __init__(self, script, args=(), label=None):
+        self.script = os.path.abspath(script)
+        self.args = [str(arg) for arg in args]
+        self.label = label or os.path.splitext(os.path.basename(script))[0]
+
+
+class JobResult(object):
+    def __init__(self, job, station, returncode, output, start, stop, workDir):
+        self.job = job
+        self.station = station
+        self.returncode = returncode
+        self.output = output
+        self.start = start
+        self.stop = stop
+        self.workDir = workDir
+
+    @property
+    def duration(self):
+        return self.stop - self.start
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+
+class Scheduler(object):
+    '''
+    Dispatch jobs to stations, one job at a time per station.
+
+    stations -- list of Station
+    workDir  -- each job runs in its own subdirectory of workDir, so that
+                output files of jobs do not collide; default a temporary directory
+    '''
+    def __init__(self, stations, workDir=None, python=sys.executable):
+        if not stations:
+            raise ValueError('no stations available')
+        self.stations = list(stations)
+        self.workDir = workDir or tempfile.mkdtemp(prefix='spikey_jobs_')
+        self.python = python
+        self.jobs = []
+
+    def submit(self, job):
+        self.jobs.append(job)
+        return len(self.jobs) - 1
+
+    def _execute(self, index, job, station):
+        workDir = os.path.join(self.workDir, '%04d-%s' % (index, job.label))
+        if not os.path.isdir(workDir):
+            os.makedirs(workDir)
+        start = time.time()
+        process = subprocess.Popen([self.python, job.script] + job.args, cwd=workDir,
+                                   env=station.environment(), stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT)
+        output = process.communicate()[0].decode(errors='replace')
+        return JobResult(job, station, process.returncode, output, start, time.time(), workDir)
+
+    def _worker(self, station, pending, results, callback):
+        while True:
+            try:
+                index, job = pending.get_nowait()
+            except queue.Empty:
+                return
+            result = self._execute(index, job, station)
+            results[index] = result
+            if callback is not None:
+                callback(result)
+
+    def run(self, callback=None):
+        '''
+        Run all submitted jobs and return their JobResults in order of submission.
+        callback(result) is called from the worker thread as soon as a job finished.
+        '''
+        pending = queue.Queue()
+        for index, job in enumerate(self.jobs):
+            pending.put((index, job))
+        results = [None] * len(self.jobs)
+        workers = [threading.Thread(target=self._worker, args=(station, pending, results, callback))
+                   for station in self.stations]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.jobs = []
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run scripts concurrently on all available Spikey stations.')
+    parser.add_argument('scripts', nargs='+', help='scripts to run')
+    parser.add_argument('--local', type=int, default=0, help='number of stand-in stations instead of hardware')
+    parser.add_argument('--config', default=None, help='directory of station configs, default $SPIKEYHALPATH/config')
+    parser.add_argument('--workdir', default=None, help='directory for the output of jobs')
+    args = parser.parse_args()
+
+    if args.local:
+        stations = [standinStation('standin%d' % i) for i in range(args.local)]
+    else:
+        stations = hardwareStations(args.config)
+    if not stations:
+        sys.stderr.write('no station found, use --local N to run against the software stand-in\n')
+        return 1
+    scheduler = Scheduler(stations, args.workdir)
+    for script in args.scripts:
+        scheduler.submit(Job(script))
+
+    lock = threading.Lock()
+
+    def report(result):
+        with lock:
+            print('%-20s %-12s %6.2f s  %s' % (result.job.label, result.station.name, result.duration,
+                                              'ok' if result.ok else 'FAILED (%d)' % result.returncode))
+    start = time.time()
+    results = scheduler.run(report)
+    print('%d jobs on %d stations in %.2f s, output in %s' % (len(results), len(stations),
+                                                              time.time() - start, scheduler.workDir))
+    return 0 if all(result.ok for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
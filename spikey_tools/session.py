@@ -0,0 +1,371 @@
+'''
+Long-lived session server that keeps the backend initialized between experiments.
+
+Each script pays for starting Python, importing PyNN, connecting to the board
+and loading calibration in setup(), which dominates the wall time of short
+experiments. The session server holds an initialized backend and accepts
+network descriptions over a Unix socket. If the structure of the network
+(populations, connectivity, setup flags, chip-wide hwa settings, recorded
+quantities) equals that of the previous experiment, the network is kept and
+only changed neuron and source parameters and weights are reprogrammed, like
+in a parameter sweep; otherwise end() and setup() are called and the network
+is rebuilt. Parameters missing in the description are reset to the defaults
+of the cell type and weights of plastic projections are reset to the weights
+of the description, so that the result of an experiment does not depend on
+the experiments before. With rng_seeds, the random number generator of the
+backend is reset to its state right after the network was built, so that
+Poisson sources emit the same trains as in a fresh session; backends that do
+not expose the generator (getRNG()) rebuild such networks instead.
+
+A network description is a dict of JSON-serializable values:
+
+    {'setup': {'mappingOffset': 42, 'calibSynDrivers': False},
+     'populations': [{'label': 'neurons', 'cellclass': 'IF_facets_hardware1', 'size': 1,
+                      'parameters': {'v_rest': -60.0}, 'record': True},
+                     {'label': 'stimulus', 'cellclass': 'SpikeSourceArray', 'size': 1,
+                      'parameters': {'spike_times': [100.0, 200.0]}, 'place': 42}],
+     'projections': [{'label': 'input', 'pre': 'stimulus', 'post': 'neurons',
+                      'connector': {'type': 'AllToAllConnector'}, 'weights': 0.003,
+                      'target': 'excitatory', 'stp': {'U': 0.4, 'tau_rec': 100.0},
+                      'stdp': None, 'readWeights': False}],
+     'recordV': ['neurons', 0],
+     'hwa': {'icb': 0.2},
+     'runtime': 1000.0}
+
+Messages are a length prefix followed by JSON (requests) or .npz data
+(responses), no pickle is involved. The server handles one client at a time,
+as there is only one board.
+
+Usage:
+
+    $ python -m spikey_tools.session [--socket /tmp/spikey.sock]
+    $ python -m spikey_tools.session --check  # reused network gives the same result as a fresh one
+
+    with SessionClient() as session:
+        result = session.run(description)
+        result['spikes']['neurons'], result['membrane']
+'''
+
+import argparse
+import io
+import json
+import os
+import socket
+import struct
+import sys
+import time
+
+import numpy as np
+
+from spikey_tools.cache import canonicalHash
+from spikey_tools.recording import TimeAxis
+
+_header = struct.Struct('!Q')
+
+
+def defaultSocket():
+    return os.environ.get('SPIKEY_SESSION_SOCKET') or '/tmp/spikey-session-%d.sock' % os.getuid()
+
+
+def _send(connection, payload):
+    connection.sendall(_header.pack(len(payload)) + payload)
+
+
+def _receive(connection):
+    '''Return next message or None if the connection was closed.'''
+    header = _receiveExactly(connection, _header.size)
+    if header is None:
+        return None
+    payload = _receiveExactly(connection, _header.unpack(header)[0])
+    if payload is None:
+        raise IOError('connection closed during message')
+    return payload
+
+
+def _receiveExactly(connection, size):
+    chunks = []
+    while size > 0:
+        chunk = connection.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _packArrays(arrays):
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    return buf.getvalue()
+
+
+def _unpackArrays(payload):
+    with np.load(io.BytesIO(payload)) as data:
+        return dict((key, data[key]) for key in data.files)
+
+
+def structureOf(description):
+    '''Part of the description that requires to rebuild the network if changed.'''
+    populations = [dict((key, value) for key, value in pop.items() if key != 'parameters')
+                   for pop in description.get('populations', [])]
+    projections = [dict((key, value) for key, value in prj.items() if key not in ('weights', 'readWeights'))
+                   for prj in description.get('projections', [])]
+    return canonicalHash({'setup': description.get('setup', {}), 'populations': populations,
+                          'projections': projections, 'recordV': description.get('recordV'),
+                          'hwa': description.get('hwa') or {}})
+
+
+class Session(object):
+    '''Backend with the network of the last experiment.'''
+    def __init__(self, pynn):
+        self.pynn = pynn
+        self.structure = None
+        self.network = {}
+        self.applied = {}
+        self.rngState = None
+
+    def close(self):
+        if self.structure is not None:
+            self.pynn.end()
+            self.structure = None
+
+    def _build(self, description):
+        pynn = self.pynn
+        self.close()
+        pynn.setup(**description.get('setup', {}))
+        self.network = {}
+        self.applied = {}
+        for pop in description.get('populations', []):
+            population = pynn.Population(pop['size'], getattr(pynn, pop['cellclass']),
+                                         pop.get('parameters'), label=pop['label'])
+            if pop.get('place') is not None:
+                pynn.place(population, pop['place'])
+            if pop.get('record'):
+                population.record()
+            self.network[pop['label']] = population
+            self.applied[pop['label']] = self._parameters(pop)
+        for prj in description.get('projections', []):
+            connector = dict(prj['connector'])
+            method = getattr(pynn, connector.pop('type'))(weights=prj.get('weights', 0.0), **connector)
+            dynamics = None
+            if prj.get('stp') or prj.get('stdp') is not None:
+                fast = pynn.TsodyksMarkramMechanism(**prj['stp']) if prj.get('stp') else None
+                slow = None
+                if prj.get('stdp') is not None:
+                    slow = pynn.STDPMechanism(timing_dependence=pynn.SpikePairRule(**prj['stdp']),
+                                              weight_dependence=pynn.AdditiveWeightDependence())
+                dynamics = pynn.SynapseDynamics(fast=fast, slow=slow)
+            self.network[prj['label']] = pynn.Projection(self.network[prj['pre']], self.network[prj['post']],
+                                                         method, target=prj.get('target', 'excitatory'),
+                                                         synapse_dynamics=dynamics, label=prj['label'])
+            self.applied[prj['label']] = prj.get('weights', 0.0)
+        if description.get('recordV') is not None:
+            label, index = description['recordV']
+            pynn.record_v(self.network[label][index], '')
+        self.rngState = pynn.getRNG().get_state() if hasattr(pynn, 'getRNG') else None
+
+    def _reusable(self, description):
+        '''Whether a reused network gives the same result as a fresh one.'''
+        if not description.get('setup', {}).get('rng_seeds') or self.rngState is not None:
+            return True
+        return not any(pop['cellclass'] == 'SpikeSourcePoisson' for pop in description.get('populations', []))
+
+    def _parameters(self, pop):
+        '''Parameters of population pop of a description, defaults of its cell type where not given.'''
+        parameters = dict(getattr(self.pynn, pop['cellclass']).default_parameters)
+        parameters.update(pop.get('parameters') or {})
+        return parameters
+
+    def _update(self, description):
+        for pop in description.get('populations', []):
+            applied = self.applied[pop['label']]
+            changed = dict((name, value) for name, value in self._parameters(pop).items()
+                           if applied.get(name) != value)
+            if changed:
+                self.network[pop['label']].set(changed)
+                applied.update(changed)
+        for prj in description.get('projections', []):
+            weights = prj.get('weights', 0.0)
+            # STDP changed the weights during the last experiment
+            if self.applied[prj['label']] != weights or prj.get('stdp') is not None:
+                self.network[prj['label']].setWeights(weights)
+                self.applied[prj['label']] = weights
+
+    def run(self, description):
+        '''Run the experiment and return its results as dict of arrays.'''
+        pynn = self.pynn
+        start = time.time()
+        structure = structureOf(description)
+        reused = structure == self.structure and self._reusable(description)
+        if reused:
+            self._update(description)
+            if self.rngState is not None and description.get('setup', {}).get('rng_seeds'):
+                pynn.getRNG().set_state(self.rngState)
+        else:
+            self._build(description)
+            self.structure = structure
+        hwa = description.get('hwa') or {}
+        if 'icb' in hwa:
+            pynn.hardware.hwa.setIcb(hwa['icb'])
+        if 'autoSTDPFrequency' in hwa:
+            pynn.hardware.hwa.autoSTDPFrequency = hwa['autoSTDPFrequency']
+        if 'lutCausal' in hwa:
+            pynn.hardware.hwa.setLUT(hwa['lutCausal'], hwa['lutAnticausal'])
+        pynn.run(description['runtime'])
+
+        result = {}
+        for pop in description.get('populations', []):
+            if pop.get('record'):
+                result['spikes:' + pop['label']] = np.asarray(self.network[pop['label']].getSpikes())
+        for prj in description.get('projections', []):
+            if prj.get('readWeights'):
+                result['weights:' + prj['label']] = np.asarray(
+                    self.network[prj['label']].getWeightsHW(readHW=True, format='list'))
+        if description.get('recordV') is not None:
+            timeMembrane = pynn.timeMembraneOutput
+            result['membrane'] = np.asarray(pynn.membraneOutput)
+            result['timeMembrane'] = np.array([timeMembrane[0], timeMembrane[1] - timeMembrane[0]]
+                                              if len(timeMembrane) > 1 else [0.0, 0.0])
+        result['reused'] = np.array(reused)
+        result['wallclock'] = np.array(time.time() - start)
+        return result
+
+
+checkDescription = {
+    'setup': {'rng_seeds': [3]},
+    'populations': [{'label': 'neurons', 'cellclass': 'IF_facets_hardware1', 'size': 32, 'record': True,
+                     'parameters': {'v_rest': -60.0}},
+                    {'label': 'stimulus', 'cellclass': 'SpikeSourcePoisson', 'size': 32,
+                     'parameters': {'rate': 20.0, 'duration': 1000.0}}],
+    'projections': [{'label': 'input', 'pre': 'stimulus', 'post': 'neurons',
+                     'connector': {'type': 'FixedProbabilityConnector', 'p_connect': 0.5},
+                     'weights': 0.0008, 'target': 'excitatory'}],
+    'runtime': 1000.0}
+
+
+def checkReuse(pynn, description=checkDescription):
+    '''
+    Run description in a fresh session and twice in another one, return True
+    if the run on the reused network gives the same spikes as the fresh run.
+    '''
+    fresh = Session(pynn)
+    try:
+        expected = fresh.run(description)
+    finally:
+        fresh.close()
+    session = Session(pynn)
+    try:
+        session.run(description)
+        reused = session.run(description)
+    finally:
+        session.close()
+    if not reused['reused']:
+        raise RuntimeError('network was not reused')
+    return all(np.array_equal(expected[key], reused[key]) for key in expected
+               if key.startswith('spikes:') or key == 'membrane')
+
+
+def serve(pynn, path=None):
+    '''Accept connections on Unix socket path and run experiments until a shutdown request.'''
+    path = path or defaultSocket()
+    if os.path.exists(path):
+        os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    session = Session(pynn)
+    running = True
+    try:
+        while running:
+            connection = server.accept()[0]
+            try:
+                while True:
+                    payload = _receive(connection)
+                    if payload is None:
+                        break
+                    request = json.loads(payload.decode('utf-8'))
+                    if request.get('command') == 'shutdown':
+                        _send(connection, _packArrays({}))
+                        running = False
+                        break
+                    try:
+                        result = session.run(request)
+                    except Exception as e:
+                        # start from scratch for the next experiment
+                        try:
+                            session.close()
+                        except Exception:
+                            session.structure = None
+                        result = {'error': np.array('%s: %s' % (type(e).__name__, e))}
+                    _send(connection, _packArrays(result))
+            finally:
+                connection.close()
+    finally:
+        session.close()
+        server.close()
+        os.remove(path)
+
+
+class SessionClient(object):
+    '''Connection to a session server.'''
+    def __init__(self, path=None):
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(path or defaultSocket())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _request(self, request):
+        _send(self.connection, json.dumps(request).encode('utf-8'))
+        payload = _receive(self.connection)
+        if payload is None:
+            raise IOError('session server closed the connection')
+        return _unpackArrays(payload)
+
+    def run(self, description):
+        '''
+        Run experiment, return dict with 'spikes' and 'weights' (dicts by label),
+        'membrane' and 'timeMembrane' (if recorded), 'reused' and 'wallclock'.
+        '''
+        data = self._request(description)
+        if 'error' in data:
+            raise RuntimeError('experiment failed in session server: %s' % data['error'])
+        result = {'spikes': {}, 'weights': {}, 'reused': bool(data['reused']),
+                  'wallclock': float(data['wallclock'])}
+        for key, value in data.items():
+            if key.startswith('spikes:'):
+                result['spikes'][key[len('spikes:'):]] = value
+            elif key.startswith('weights:'):
+                result['weights'][key[len('weights:'):]] = value
+        if 'membrane' in data:
+            result['membrane'] = data['membrane']
+            result['timeMembrane'] = TimeAxis(len(data['membrane']), data['timeMembrane'][1],
+                                              data['timeMembrane'][0])
+        return result
+
+    def shutdown(self):
+        self._request({'command': 'shutdown'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve experiments on an initialized backend.')
+    parser.add_argument('--socket', default=None, help='path of the Unix socket, default %s' % defaultSocket())
+    parser.add_argument('--check', action='store_true', help='check that a reused network gives the same result')
+    args = parser.parse_args()
+    import pyNN.hardware.spikey as pynn
+    if args.check:
+        same = checkReuse(pynn)
+        print('reused network gives %s result as a fresh one' % ('the same' if same else 'a different'))
+        return 0 if same else 1
+    serve(pynn, args.socket)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
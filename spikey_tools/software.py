@@ -0,0 +1,1069 @@
+'''
+Software stand-in for the PyNN backend of the Spikey neuromorphic system.
+
+This module provides the subset of pyNN.hardware.spikey used by the scripts in
+networks/ (setup/run/end, Population, Projection, connectors, record/record_v,
+membraneOutput/timeMembraneOutput, minExcWeight, getWeightsHW, hardware.hwa).
+All 384 neurons of type IF_facets_hardware1 and all 256 synapse drivers are
+emulated as batched NumPy arrays; each time step costs a fixed number of array
+operations, independent of the number of neurons and synapses.
+
+Usage:
+
+    import spikey_tools.software as pynn
+
+or, to run an unchanged demo script:
+
+    $ PYTHONPATH=$PWD:$PWD/spikey_tools/standin python networks/example.py
+
+The mapping follows the hardware backend: neurons are placed in order of
+creation starting at mappingOffset, spike sources occupy synapse drivers in
+order of creation, followed by the feedback drivers of neurons that have
+outgoing projections. place() pins a population to a given position instead
+(see spikey_tools.placement). Each run is an independent emulation starting
+at t = 0.
+Weights of synapses with STDP are updated after each run with the model in
+spikey_tools.stdp, using the look-up tables set by hardware.hwa.setLUT().
+getSynapseArray() reads all digital weights at once, recordWeights() logs
+them after each readout cycle of the STDP controller (see
+spikey_tools.weightlog), with times counted across consecutive runs.
+Weights are discretized to 4-bit digital values like on the chip; digital
+weights, leak conductances and time constants are modeled after the chip, but
+are not calibrated against a particular board. Like the transistor mismatch
+of a chip, leak conductances and thresholds of the neurons vary with a fixed
+pattern drawn from mismatchSeed, which is the same in every run and
+independent of rng_seeds. This pattern is the calibration data of the
+emulated board (serial standinSerial): with calibrationStore (a directory or
+spikey_tools.calibration.CalibrationStore) or the environment variable
+SPIKEY_CALIBRATION_STORE, setup() loads it from the store instead of deriving
+it, and stores it there if it is missing.
+'''
+
+import os
+import sys
+import time as _time
+
+import numpy as np
+
+from spikey_tools import phases
+from spikey_tools.cache import ResultCache, canonicalHash
+from spikey_tools.calibration import CalibrationStore
+from spikey_tools.instrument import instrumentFromEnvironment
+from spikey_tools.placement import Occupancy
+from spikey_tools.recording import MembraneRecording, TimeAxis
+from spikey_tools.stdp import STDPRule, evolve
+from spikey_tools.stimulus import defaultCache as stimulusCache
+
+noNeurons = 384          # number of neurons on chip
+noNeuronsPerBlock = 192  # number of neurons per block
+noDrivers = 256          # number of synapse drivers
+maxDigitalWeight = 15    # 4-bit synaptic weights
+timestep = 0.1           # integration step and ADC sampling interval in ms
+speedup = 1e4            # hardware runs 10^4 times faster than biology
+modelVersion = 4         # increment if the emulation changes, invalidates cached results
+mismatchSeed = 1         # seed of the fixed-pattern variation of the neurons, 0 for homogeneous neurons
+standinSerial = 'standin' # board serial of the emulated chip in a calibration store
+
+_minExcWeight = 0.0002   # muS per digital weight step (excitatory)
+_minInhWeight = 0.001    # muS per digital weight step (inhibitory)
+_gDigital = 2.0          # emulated peak conductance in nS per digital weight step
+_icbDefault = 0.2        # default refractory bias current
+_gLeakMismatch = 0.1     # relative standard deviation of leak conductances
+_vThreshMismatch = 1.0   # standard deviation of thresholds in mV
+stdpReadoutPeriod = 10.0 # period of STDP controller in ms if hwa.autoSTDPFrequency is not set
+_delay = 1.5             # delay from spike source or neuron to the synapse driver in ms
+_tauSyn = 3.0            # fall time of synaptic conductances in ms, a property of synapse drivers
+
+_targets = {'excitatory': 0, 'inhibitory': 1}
+
+####################################################################
+# cell types and synapse dynamics
+####################################################################
+
+
+class IF_facets_hardware1(object):
+    '''Leaky conductance-based integrate-and-fire neuron of the Spikey chip.'''
+    default_parameters = {
+        'g_leak'    :  20.0, # nS
+        'tau_refrac':   1.0, # ms
+        'v_reset'   : -80.0, # mV
+        'v_rest'    : -75.0, # mV
+        'v_thresh'  : -55.0, # mV
+        'e_rev_I'   : -80.0, # mV
+    }
+    cm = 0.2      # nF
+    e_rev_E = 0.0 # mV
+
+
+class SpikeSourceArray(object):
+    '''Spike source emitting a given list of spike times.'''
+    default_parameters = {'spike_times': []}
+
+
+class SpikeSourcePoisson(object):
+    '''Spike source emitting Poisson spike trains.'''
+    default_parameters = {'rate': 0.0, 'start': 0.0, 'duration': 1e10}
+
+
+class TsodyksMarkramMechanism(object):
+    '''Short-term plasticity of a synapse driver.'''
+    def __init__(self, U=0.5, tau_rec=100.0, tau_facil=0.0, u0=0.0, x0=1.0, y0=0.0):
+        self.parameters = {'U': U, 'tau_rec': tau_rec, 'tau_facil': tau_facil,
+                           'u0': u0, 'x0': x0, 'y0': y0}
+
+
+class SpikePairRule(object):
+    def __init__(self, tau_plus=20.0, tau_minus=20.0):
+        self.parameters = {'tau_plus': tau_plus, 'tau_minus': tau_minus}
+
+
+class AdditiveWeightDependence(object):
+    def __init__(self, w_min=0.0, w_max=1.0, A_plus=0.01, A_minus=0.01):
+        self.parameters = {'w_min': w_min, 'w_max': w_max, 'A_plus': A_plus, 'A_minus': A_minus}
+
+
+class STDPMechanism(object):
+    def __init__(self, timing_dependence=None, weight_dependence=None,
+                 voltage_dependence=None, dendritic_delay_fraction=1.0):
+        self.timing_dependence = timing_dependence
+        self.weight_dependence = weight_dependence
+
+
+class SynapseDynamics(object):
+    def __init__(self, fast=None, slow=None):
+        self.fast = fast
+        self.slow = slow
+
+####################################################################
+# connectors
+####################################################################
+
+
+class Connector(object):
+    '''Base class of connectors, which return all connections at once.'''
+    def __init__(self, weights=0.0, allow_self_connections=True, rng=None):
+        self.weights = weights
+        self.allow_self_connections = allow_self_connections
+        self.rng = rng
+
+    def connect(self, sizePre, sizePost, rng, selfConnections):
+        '''
+        Return indices of pre- and postsynaptic cells of all connections.
+        '''
+        raise NotImplementedError
+
+    def _mask(self, sizePre, sizePost, selfConnections):
+        mask = np.ones((sizePre, sizePost), dtype=bool)
+        if selfConnections and not self.allow_self_connections:
+            np.fill_diagonal(mask, False)
+        return mask
+
+
+class AllToAllConnector(Connector):
+    def connect(self, sizePre, sizePost, rng, selfConnections):
+        return np.nonzero(self._mask(sizePre, sizePost, selfConnections))
+
+
+class OneToOneConnector(Connector):
+    def connect(self, sizePre, sizePost, rng, selfConnections):
+        if sizePre != sizePost:
+            raise ValueError('OneToOneConnector requires populations of equal size')
+        index = np.arange(sizePre)
+        return index, index
+
+
+class FixedProbabilityConnector(Connector):
+    def __init__(self, p_connect, weights=0.0, allow_self_connections=True, rng=None):
+        Connector.__init__(self, weights, allow_self_connections, rng)
+        self.p_connect = p_connect
+
+    def connect(self, sizePre, sizePost, rng, selfConnections):
+        mask = self._mask(sizePre, sizePost, selfConnections)
+        mask &= rng.uniform(size=(sizePre, sizePost)) < self.p_connect
+        return np.nonzero(mask)
+
+
+class FixedNumberPreConnector(Connector):
+    def __init__(self, n, weights=0.0, allow_self_connections=True, rng=None):
+        Connector.__init__(self, weights, allow_self_connections, rng)
+        self.n = n
+
+    def connect(self, sizePre, sizePost, rng, selfConnections):
+        # rank random numbers to draw n presynaptic partners per neuron without replacement
+        draw = rng.uniform(size=(sizePost, sizePre))
+        draw[~self._mask(sizePre, sizePost, selfConnections).T] = np.inf
+        n = min(self.n, sizePre - int(selfConnections and not self.allow_self_connections))
+        pre = np.argsort(draw, axis=1)[:, :n]
+        post = np.repeat(np.arange(sizePost), n)
+        return pre.ravel(), post
+
+
+class FromListConnector(Connector):
+    '''Connections given as list of (pre index, post index, weight, delay), delays are ignored.'''
+    def __init__(self, conn_list, safe=True, verbose=False):
+        self.conn = np.asarray(conn_list, dtype=float).reshape(-1, 4)
+        Connector.__init__(self, self.conn[:, 2])
+
+    def connect(self, sizePre, sizePost, rng, selfConnections):
+        pre = self.conn[:, 0].astype(int)
+        post = self.conn[:, 1].astype(int)
+        if len(pre) and (pre.min() < 0 or pre.max() >= sizePre or post.min() < 0 or post.max() >= sizePost):
+            raise ValueError('connection list refers to cells outside of the populations')
+        return pre, post
+
+####################################################################
+# populations and projections
+####################################################################
+
+
+class ID(int):
+    '''Cell ID that knows its parent population.'''
+    def __new__(cls, value, parent):
+        obj = int.__new__(cls, value)
+        obj.parent = parent
+        return obj
+
+
+class Population(object):
+    def __init__(self, size, cellclass, cellparams=None, label=None):
+        _checkSetup()
+        self.size = int(size)
+        self.cellclass = cellclass
+        self.label = label
+        self.isSource = cellclass is not IF_facets_hardware1
+        self.parameters = dict(cellclass.default_parameters)
+        if cellparams:
+            self._checkParameters(cellparams)
+            self.parameters.update(cellparams)
+        self.recorded = False
+        self.index = len(_state.populations)
+        # allocate first, so that a population that does not fit leaves the counters unchanged
+        if self.isSource:
+            self.slots = _state.occupancy.allocate('drivers', self.index, self.size)
+            self.firstId = _state.noSources
+            _state.noSources += self.size
+        else:
+            if np.sum(_state.occupancy.free('neurons') >= _state.mappingOffset) < self.size:
+                raise ValueError('network exceeds the %d neurons of the chip' % noNeurons)
+            self.slots = _state.occupancy.allocate('neurons', self.index, self.size, _state.mappingOffset)
+            self.firstId = _state.noCells
+            _state.noCells += self.size
+        _state.populations.append(self)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if index < 0 or index >= self.size:
+            raise IndexError('population has only %d cells' % self.size)
+        return ID(self.firstId + index, self)
+
+    def _checkParameters(self, parameters):
+        for name in parameters:
+            if name not in self.cellclass.default_parameters:
+                raise KeyError("'%s' is not a parameter of %s" % (name, self.cellclass.__name__))
+
+    @property
+    def hwIndices(self):
+        '''Hardware indices of neurons, only for neuron populations.'''
+        return self.slots
+
+    def set(self, param, val=None):
+        '''Set parameters of all cells, either as set(name, value) or set({name: value}).'''
+        if not isinstance(param, dict):
+            param = {param: val}
+        self._checkParameters(param)
+        self.parameters.update(param)
+
+    def record(self, to_file=False):
+        if self.isSource:
+            raise ValueError('recording of spike sources is not supported')
+        self.recorded = True
+
+    def getSpikes(self, gather=True):
+        '''Return array of (neuron ID, spike time) of the last run, sorted by time.'''
+        spikes = _state.spikes
+        if not self.recorded or len(spikes) == 0:
+            return np.zeros((0, 2))
+        mask = (spikes[:, 0] >= self.firstId) & (spikes[:, 0] < self.firstId + self.size)
+        return spikes[mask]
+
+    def meanSpikeCount(self):
+        return float(len(self.getSpikes())) / self.size
+
+
+class Projection(object):
+    def __init__(self, presynaptic_population, postsynaptic_population, method,
+                 source=None, target='excitatory', synapse_dynamics=None, label=None, rng=None):
+        _checkSetup()
+        if postsynaptic_population.isSource:
+            raise ValueError('postsynaptic population must consist of neurons')
+        if target not in _targets:
+            raise ValueError("target must be one of %s" % sorted(_targets))
+        self.pre = presynaptic_population
+        self.post = postsynaptic_population
+        self.target = target
+        self.synapse_dynamics = synapse_dynamics
+        self.label = label
+        rng = rng or method.rng or _state.rng
+        self._pre, self._post = method.connect(self.pre.size, self.post.size, rng, self.pre is self.post)
+        self._digital = _digitalWeights(method.weights, target, len(self._pre))
+        self._weightWrites = 0
+        self.drvifallFactors = np.ones(self.pre.size)
+        self.drvioutFactors = np.ones(self.pre.size)
+        _state.projections.append(self)
+
+    def __len__(self):
+        return len(self._pre)
+
+    def _weights(self, digital, format):
+        weights = digital * minWeight(self.target)
+        if format == 'list':
+            return list(weights)
+        matrix = np.zeros((self.pre.size, self.post.size))
+        matrix[self._pre, self._post] = weights
+        return matrix
+
+    def setWeights(self, w):
+        '''Set weights in muS, either a single value or one value per connection.'''
+        self._digital = _digitalWeights(w, self.target, len(self._pre))
+        # written to the chip with the next run even if equal, to overwrite weights learned with STDP
+        self._weightWrites += 1
+
+    def getWeights(self, format='list', gather=True):
+        '''Return configured weights in muS.'''
+        return self._weights(self._digital, format)
+
+    def getWeightsHW(self, readHW=False, format='list'):
+        '''Return weights in muS as stored in the synapse array after the last run.'''
+        if not readHW or _state.chip is None:
+            return self.getWeights(format)
+        rows = _state.chip.driverRows(self.pre)[self._pre]
+        columns = self.post.hwIndices[self._post]
+        return self._weights(_state.chip.weights[rows, columns], format)
+
+    def getDrvifallFactorsRange(self, synType):
+        '''Return range of valid calibration factors for the fall time of synaptic conductances.'''
+        return (0.1, 2.0)
+
+    def setDrvifallFactors(self, factors):
+        self.drvifallFactors = _perDriver(factors, self.pre.size)
+
+    def setDrvioutFactors(self, factors):
+        self.drvioutFactors = _perDriver(factors, self.pre.size)
+
+
+def place(population, first):
+    '''
+    Pin population to consecutive synapse driver rows (spike sources) or
+    neuron columns (neurons) starting at first, instead of the position
+    given by the order of creation. Takes effect at the next run.
+    '''
+    _checkSetup()
+    kind = 'drivers' if population.isSource else 'neurons'
+    occupancy = _state.occupancy
+    previous = population.slots
+    occupancy.release(kind, population.index)
+    try:
+        population.slots = occupancy.reserve(kind, population.index, first, population.size)
+    except ValueError:
+        occupancy.slots[kind][previous] = population.index
+        raise
+    _state.placements += 1
+
+
+def _perDriver(factors, size):
+    factors = np.asarray(factors, dtype=float)
+    if factors.size == 1:
+        return np.repeat(factors.ravel(), size)
+    if factors.size != size:
+        raise ValueError('expected %d factors, got %d' % (size, factors.size))
+    return factors
+
+
+def _digitalWeights(weights, target, size):
+    digital = np.round(np.asarray(weights, dtype=float) / minWeight(target))
+    return np.broadcast_to(np.clip(digital, 0, maxDigitalWeight).astype(np.uint8), (size,)).copy()
+
+####################################################################
+# hardware access
+####################################################################
+
+
+class _HardwareAccess(object):
+    '''Chip-wide settings that have no counterpart in PyNN.'''
+    def __init__(self):
+        self.icb = _icbDefault
+        self.autoSTDPFrequency = None
+        self.lutCausal = list(range(1, 16)) + [15]
+        self.lutAnticausal = [0] + list(range(0, 15))
+
+    def setIcb(self, icb):
+        '''Set bias current of refractory period, smaller values elongate it.'''
+        if icb <= 0:
+            raise ValueError('icb has to be positive')
+        self.icb = icb
+
+    def setLUT(self, causal, anticausal):
+        if len(causal) != 16 or len(anticausal) != 16:
+            raise ValueError('look-up tables need 16 entries')
+        self.lutCausal = list(causal)
+        self.lutAnticausal = list(anticausal)
+
+
+class _Hardware(object):
+    def __init__(self):
+        self.hwa = _HardwareAccess()
+
+
+hardware = _Hardware()
+
+####################################################################
+# chip configuration and emulation
+####################################################################
+
+
+class Chip(object):
+    '''
+    Configuration of the emulated chip as uploaded for a run.
+
+    Synapse driver rows span both blocks, i.e. the synapse array is modeled as
+    one matrix of shape (noDrivers, noNeurons) with digital weights.
+    The chip keeps a copy of what was uploaded for each population and
+    projection, so that update() reprograms only what changed since.
+    '''
+    def __init__(self, state):
+        self.layout = Chip.layoutOf(state)
+        self.uploaded = {}
+        self.sourceRows = np.zeros(state.noSources, dtype=int)
+        for pop in state.populations:
+            if pop.isSource:
+                self.sourceRows[pop.firstId:pop.firstId + pop.size] = pop.slots
+        cells = np.unique(np.concatenate([prj.pre.hwIndices[prj._pre] for prj in state.projections
+                                          if not prj.pre.isSource] + [np.zeros(0, dtype=int)]))
+        # feedback of neurons takes the lowest rows not occupied by sources
+        freeRows = state.occupancy.free('drivers')
+        if len(cells) > len(freeRows):
+            raise ValueError('network needs %d synapse drivers, but only %d are available'
+                             % (state.noSources + len(cells), noDrivers))
+        self.feedbackRows = -np.ones(noNeurons, dtype=int)
+        self.feedbackRows[cells] = freeRows[:len(cells)]
+
+        self.weights = np.zeros((noDrivers, noNeurons), dtype=np.uint8)
+        self.driverTarget = -np.ones(noDrivers, dtype=np.int8)
+        self.driverTauScale = np.ones(noDrivers)
+        self.driverGainScale = np.ones(noDrivers)
+        self.stpU = np.zeros(noDrivers)
+        self.stpTauRec = np.zeros(noDrivers)
+        self.stpTauFacil = np.zeros(noDrivers)
+        for index, prj in enumerate(state.projections):
+            self.uploadProjection(index, prj)
+
+        self.cells = -np.ones(noNeurons, dtype=int)
+        self.parameters = dict((name, np.repeat(value, noNeurons))
+                               for name, value in IF_facets_hardware1.default_parameters.items())
+        for index, pop in enumerate(state.populations):
+            if not pop.isSource:
+                self.uploadPopulation(index, pop)
+        self.refracScale = _icbDefault / hardware.hwa.icb
+        # fixed-pattern variation, the same for each run
+        self.gLeakScale = state.mismatch['gLeakScale']
+        self.vThreshOffset = state.mismatch['vThreshOffset']
+
+    @staticmethod
+    def layoutOf(state):
+        '''Everything that requires a new mapping of the network if changed.'''
+        return (state.mappingOffset, len(state.populations), len(state.projections), state.placements)
+
+    def update(self, state):
+        '''
+        Reprogram only parameters and synapses that changed since the last upload.
+
+        Returns a list of the reprogrammed items, e.g. ['population1.g_leak'].
+        '''
+        changed = []
+        for index, pop in enumerate(state.populations):
+            if pop.isSource:
+                continue
+            uploaded = self.uploaded[('population', index)]
+            # parameters may be scalars or arrays with one value per neuron
+            diff = [name for name, value in pop.parameters.items() if not np.array_equal(uploaded[name], value)]
+            if diff:
+                hw = pop.hwIndices
+                for name in diff:
+                    self.parameters[name][hw] = pop.parameters[name]
+                    uploaded[name] = np.copy(pop.parameters[name])
+                changed.extend('%s.%s' % (pop.label or 'population%d' % index, name) for name in sorted(diff))
+        for index, prj in enumerate(state.projections):
+            if not _equalSnapshots(self.uploaded[('projection', index)], _projectionSnapshot(prj)):
+                self.uploadProjection(index, prj)
+                changed.append(prj.label or 'projection%d' % index)
+        refracScale = _icbDefault / hardware.hwa.icb
+        if refracScale != self.refracScale:
+            self.refracScale = refracScale
+            changed.append('icb')
+        return changed
+
+    def driverRows(self, pop):
+        if pop.isSource:
+            return self.sourceRows[pop.firstId:pop.firstId + pop.size]
+        return self.feedbackRows[pop.hwIndices]
+
+    def uploadPopulation(self, index, pop):
+        hw = pop.hwIndices
+        self.cells[hw] = pop.firstId + np.arange(pop.size)
+        for name, value in pop.parameters.items():
+            self.parameters[name][hw] = value
+        self.uploaded[('population', index)] = dict((name, np.copy(value)) for name, value in pop.parameters.items())
+
+    def uploadProjection(self, index, prj):
+        rows = self.driverRows(prj.pre)
+        used = np.unique(prj._pre)
+        target = _targets[prj.target]
+        conflict = (self.driverTarget[rows[used]] >= 0) & (self.driverTarget[rows[used]] != target)
+        if np.any(conflict):
+            raise ValueError('synapse driver %d is used for both excitatory and inhibitory connections'
+                             % rows[used][conflict][0])
+        self.driverTarget[rows[used]] = target
+        self.weights[rows[prj._pre], prj.post.hwIndices[prj._post]] = prj._digital
+        self.driverTauScale[rows] = 1.0 / prj.drvifallFactors
+        self.driverGainScale[rows] = prj.drvioutFactors
+        fast = prj.synapse_dynamics.fast if prj.synapse_dynamics else None
+        if fast is not None:
+            self.stpU[rows] = fast.parameters['U']
+            self.stpTauRec[rows] = fast.parameters['tau_rec']
+            self.stpTauFacil[rows] = fast.parameters['tau_facil']
+        self.uploaded[('projection', index)] = _projectionSnapshot(prj)
+
+
+def _projectionSnapshot(prj):
+    fast = prj.synapse_dynamics.fast if prj.synapse_dynamics else None
+    return (prj._digital.copy(), prj.drvifallFactors.copy(), prj.drvioutFactors.copy(),
+            dict(fast.parameters) if fast is not None else None, prj._weightWrites)
+
+
+def _equalSnapshots(a, b):
+    return all(np.array_equal(x, y) for x, y in zip(a[:3], b[:3])) and a[3:] == b[3:]
+
+
+def _eventsPerConnection(eventIds, eventTimes, connIds):
+    '''Return (times, connection index) of all events of the presynaptic (or postsynaptic) cell of each connection.'''
+    order = np.argsort(eventIds, kind='mergesort')
+    ids = eventIds[order]
+    times = eventTimes[order]
+    start = np.searchsorted(ids, connIds, side='left')
+    counts = np.searchsorted(ids, connIds, side='right') - start
+    conn = np.repeat(np.arange(len(connIds)), counts)
+    position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(start, counts)
+    return times[position], conn
+
+
+def _plasticSynapses(state, chip):
+    '''Rows and columns in the synapse array of the synapses of all projections with STDP.'''
+    plastic = [prj for prj in state.projections if prj.synapse_dynamics and prj.synapse_dynamics.slow]
+    empty = [np.zeros(0, dtype=int)]
+    return (np.concatenate([chip.driverRows(prj.pre)[prj._pre] for prj in plastic] + empty),
+            np.concatenate([prj.post.hwIndices[prj._post] for prj in plastic] + empty))
+
+
+def _applySTDP(state, chip, runtime, sourceTimes, sourceIds, cells, times):
+    '''
+    Update weights of synapses with STDP according to the spikes of the run.
+
+    The weight changes are applied after the run, i.e. do not influence the
+    network dynamics during the run. Rows of the synapse array are evaluated
+    by the STDP controller one after the other within each readout period.
+    Returns the new digital weights of all plastic synapses and their weights
+    after each readout cycle, shape (cycles, synapses), both in the order of
+    _plasticSynapses().
+    '''
+    hwa = hardware.hwa
+    period = hwa.autoSTDPFrequency or stdpReadoutPeriod
+    learned = []
+    histories = []
+    for prj in state.projections:
+        dynamics = prj.synapse_dynamics
+        if dynamics is None or dynamics.slow is None:
+            continue
+        timing = dynamics.slow.timing_dependence
+        timingParameters = timing.parameters if timing is not None else SpikePairRule().parameters
+        rule = STDPRule(timingParameters['tau_plus'], timingParameters['tau_minus'],
+                        lutCausal=hwa.lutCausal, lutAnticausal=hwa.lutAnticausal, readoutPeriod=period)
+        rows = chip.driverRows(prj.pre)[prj._pre]
+        columns = prj.post.hwIndices[prj._post]
+        if prj.pre.isSource:
+            preTimes, preSyn = _eventsPerConnection(sourceIds, sourceTimes, prj.pre.firstId + prj._pre)
+        else:
+            preTimes, preSyn = _eventsPerConnection(cells, times, prj.pre.hwIndices[prj._pre])
+        postTimes, postSyn = _eventsPerConnection(cells, times, columns)
+        result = evolve(rule, chip.weights[rows, columns], preTimes, preSyn, postTimes, postSyn, runtime,
+                        readoutOffsets=-rows / float(noDrivers) * period)
+        chip.weights[rows, columns] = result.weights
+        learned.append(result.weights)
+        histories.append((result.weightHistory, result.weights))
+    # projections with fewer readout cycles keep their final weights in the remaining ones
+    cycles = max([len(history) for history, _ in histories] + [0])
+    history = np.hstack([np.vstack((history, np.tile(final, (cycles - len(history), 1))))
+                         for history, final in histories] + [np.zeros((cycles, 0), dtype=np.uint8)])
+    return np.concatenate(learned + [np.zeros(0, dtype=np.uint8)]), history
+
+
+def _logReadouts(state, chip, before, history):
+    '''Log the synapse array after each readout cycle, starting from the weights before the run.'''
+    period = hardware.hwa.autoSTDPFrequency or stdpReadoutPeriod
+    rows, columns = _plasticSynapses(state, chip)
+    for k, weights in enumerate(history):
+        before[rows, columns] = weights
+        state.weightLog.snapshot(state.elapsed + (k + 1) * period, before)
+
+
+def _sourceSpikes(state, rng, runtime):
+    '''Return (time, source ID) of all spikes emitted by spike sources within runtime.'''
+    times = []
+    ids = []
+    for pop in state.populations:
+        if pop.cellclass is SpikeSourceArray:
+            spikeTimes = np.asarray(pop.parameters['spike_times'], dtype=float)
+            times.append(np.tile(spikeTimes, pop.size))
+            ids.append(np.repeat(pop.firstId + np.arange(pop.size), len(spikeTimes)))
+        elif pop.cellclass is SpikeSourcePoisson:
+            start = pop.parameters['start']
+            duration = min(pop.parameters['duration'], runtime - start)
+            if duration <= 0:
+                continue
+            if state.stimulusSeed is not None:
+                # frozen stimulus, independent of other populations and of the run
+                seed = int(canonicalHash((state.stimulusSeed, pop.index))[:8], 16)
+                trains = stimulusCache.poisson(pop.size, pop.parameters['rate'], start, duration, seed)
+                times.append(trains.times())
+                ids.append(pop.firstId + trains.ids())
+                continue
+            counts = rng.poisson(pop.parameters['rate'] * duration / 1e3, size=pop.size)
+            times.append(rng.uniform(start, start + duration, size=counts.sum()))
+            ids.append(np.repeat(pop.firstId + np.arange(pop.size), counts))
+    if not times:
+        return np.zeros(0), np.zeros(0, dtype=int)
+    times = np.concatenate(times)
+    ids = np.concatenate(ids)
+    valid = (times >= 0) & (times < runtime)
+    return times[valid], ids[valid]
+
+
+def emulate(chip, runtime, sourceTimes, sourceIds, recordV=-1, membrane=None):
+    '''
+    Integrate the chip for runtime ms with the given input spikes.
+
+    Returns the hardware indices and times of all neuron spikes and the
+    membrane trace of the neuron with hardware index recordV (empty if < 0).
+    '''
+    result = {}
+    for _ in integrate(chip, runtime, sourceTimes, sourceIds, result, recordV, membrane):
+        pass
+    return result['cells'], result['times'], result['membrane']
+
+
+def integrate(chip, runtime, sourceTimes, sourceIds, result, recordV=-1, membrane=None, chunkSize=None):
+    '''
+    Generator version of emulate() that yields (start, stop) after each
+    chunkSize samples of the membrane have been written to membrane (an array
+    or memory map of the length of the run). Results are stored in result.
+    '''
+    steps = int(round(runtime / timestep))
+    p = chip.parameters
+    cm = IF_facets_hardware1.cm
+    used = np.nonzero(chip.driverTarget >= 0)[0]
+    isExc = chip.driverTarget[used] == 0
+    # conductance in nS per unit of driver output, excitatory and inhibitory part side by side
+    scale = (_gDigital * chip.driverGainScale[used])[:, np.newaxis]
+    weights = chip.weights[used] * scale
+    matrix = np.hstack((weights * isExc[:, np.newaxis], weights * ~isExc[:, np.newaxis]))
+    decay = np.exp(-timestep / (_tauSyn * chip.driverTauScale[used]))
+    rowOfDriver = -np.ones(noDrivers, dtype=int)
+    rowOfDriver[used] = np.arange(len(used))
+
+    # short-term plasticity per driver
+    stp = chip.stpU[used] > 0
+    stpU = np.where(stp, chip.stpU[used], 1.0)
+    stpTauRec = np.maximum(chip.stpTauRec[used], 1e-9)
+    stpTauFacil = chip.stpTauFacil[used]
+    stpR = np.ones(len(used))
+    stpUse = stpU.copy()
+    stpLast = np.full(len(used), -np.inf)
+
+    # input spikes as sorted (step, driver row) events, arriving after the synaptic delay
+    delaySteps = max(int(round(_delay / timestep)), 1)
+    rows = rowOfDriver[chip.sourceRows[sourceIds]] if len(sourceIds) else np.zeros(0, dtype=int)
+    valid = rows >= 0
+    eventSteps = np.round(sourceTimes[valid] / timestep).astype(int) + delaySteps
+    eventRows = rows[valid]
+    order = np.argsort(eventSteps, kind='mergesort')
+    eventSteps = eventSteps[order]
+    eventRows = eventRows[order]
+    bounds = np.searchsorted(eventSteps, np.arange(steps + 1))
+    feedback = np.where(chip.feedbackRows >= 0, rowOfDriver[np.maximum(chip.feedbackRows, 0)], -1)
+    pending = [None] * delaySteps
+
+    n = noNeurons
+    eRevE = IF_facets_hardware1.e_rev_E
+    eRevI = p['e_rev_I']
+    gLeak = p['g_leak'] * chip.gLeakScale
+    leakDrive = gLeak * p['v_rest']
+    vThresh = p['v_thresh'] + chip.vThreshOffset
+    vReset = p['v_reset']
+    refracSteps = np.round(p['tau_refrac'] * chip.refracScale / timestep).astype(int)
+    factor = -timestep / (cm * 1e3)
+
+    v = p['v_rest'].copy()
+    refrac = np.zeros(n, dtype=int)
+    drive = np.zeros(len(used))
+    g = np.zeros(2 * n)
+    gExc = g[:n]
+    gInh = g[n:]
+    gTotal = np.zeros(n)
+    vInf = np.zeros(n)
+    spikeSteps = []
+    spikeCells = []
+    if recordV < 0:
+        membrane = np.zeros(0)
+    elif membrane is None:
+        membrane = np.zeros(steps)
+    chunkStart = 0
+    chunkEnd = chunkSize if chunkSize and recordV >= 0 else -1
+    for step in range(steps):
+        drive *= decay
+        active = eventRows[bounds[step]:bounds[step + 1]]
+        slot = step % delaySteps
+        if pending[slot] is not None:
+            active = np.concatenate((active, pending[slot]))
+            pending[slot] = None
+        if len(active):
+            now = step * timestep
+            efficacy = np.ones(len(active))
+            plastic = stp[active]
+            if np.any(plastic):
+                a = active[plastic]
+                elapsed = now - stpLast[a]
+                stpR[a] = 1.0 - (1.0 - stpR[a]) * np.exp(-elapsed / stpTauRec[a])
+                facil = stpTauFacil[a] > 0
+                stpUse[a] = np.where(facil, stpU[a] + stpUse[a] * (1.0 - stpU[a])
+                                     * np.exp(-elapsed / np.where(facil, stpTauFacil[a], 1.0)), stpU[a])
+                efficacy[plastic] = stpUse[a] * stpR[a] / stpU[a]
+                stpR[a] -= stpUse[a] * stpR[a]
+                stpLast[a] = now
+            np.add.at(drive, active, efficacy)
+        # exponential integration of the conductance-based membrane
+        np.dot(drive, matrix, out=g)
+        np.add(gLeak, gExc, out=gTotal)
+        gTotal += gInh
+        np.multiply(gInh, eRevI, out=vInf)
+        vInf += leakDrive
+        if eRevE != 0.0:
+            vInf += gExc * eRevE
+        vInf /= gTotal
+        v -= vInf
+        v *= np.exp(factor * gTotal)
+        v += vInf
+        refrac -= 1
+        np.putmask(v, refrac > 0, vReset)
+        fired = np.flatnonzero(v >= vThresh)
+        if len(fired):
+            v[fired] = vReset[fired]
+            refrac[fired] = refracSteps[fired]
+            spikeSteps.append(np.repeat(step, len(fired)))
+            spikeCells.append(fired)
+            recurrent = feedback[fired]
+            pending[slot] = recurrent[recurrent >= 0]
+        if recordV >= 0:
+            membrane[step] = v[recordV]
+            if step + 1 == chunkEnd:
+                yield chunkStart, chunkEnd
+                chunkStart = chunkEnd
+                chunkEnd += chunkSize
+
+    if spikeCells:
+        spikeCells = np.concatenate(spikeCells)
+        spikeTimes = np.concatenate(spikeSteps) * timestep
+    else:
+        spikeCells = np.zeros(0, dtype=int)
+        spikeTimes = np.zeros(0)
+    result.update(cells=spikeCells, times=spikeTimes, membrane=membrane)
+    if chunkSize and chunkStart < len(membrane):
+        yield chunkStart, len(membrane)
+
+####################################################################
+# PyNN interface
+####################################################################
+
+
+def _deriveMismatch():
+    '''Fixed-pattern variation of the neurons drawn from mismatchSeed.'''
+    variation = np.random.RandomState(mismatchSeed)
+    spread = 1.0 if mismatchSeed else 0.0
+    return {'gLeakScale': np.clip(1.0 + spread * _gLeakMismatch * variation.standard_normal(noNeurons), 0.5, 1.5),
+            'vThreshOffset': spread * _vThreshMismatch * variation.standard_normal(noNeurons)}
+
+
+def _loadMismatch(calibrationStore):
+    '''Mismatch of the emulated board from calibrationStore, derived if there is no store.'''
+    if calibrationStore is None:
+        return _deriveMismatch()
+    # the pattern depends on the model and its seed
+    version = 'mismatch-%d-%d' % (modelVersion, mismatchSeed)
+    return calibrationStore.getOrCreate(standinSerial, version, _deriveMismatch)
+
+
+class _State(object):
+    def __init__(self, mappingOffset=0, calibTauMem=True, calibSynDrivers=True, rng_seeds=None,
+                 resultCache=None, stimulusSeed=None, calibrationStore=None, **extra):
+        self.mappingOffset = mappingOffset
+        self.calibTauMem = calibTauMem
+        self.calibSynDrivers = calibSynDrivers
+        self.rng = np.random.RandomState(rng_seeds[0] if rng_seeds else None)
+        if resultCache is None and os.environ.get('SPIKEY_RESULT_CACHE'):
+            resultCache = os.environ['SPIKEY_RESULT_CACHE']
+        if isinstance(resultCache, str):
+            resultCache = ResultCache(resultCache)
+        self.resultCache = resultCache
+        if calibrationStore is None and os.environ.get('SPIKEY_CALIBRATION_STORE'):
+            calibrationStore = os.environ['SPIKEY_CALIBRATION_STORE']
+        if isinstance(calibrationStore, str):
+            calibrationStore = CalibrationStore(calibrationStore)
+        self.mismatch = _loadMismatch(calibrationStore)
+        self.stimulusSeed = stimulusSeed
+        self.extra = extra
+        self.populations = []
+        self.projections = []
+        self.noCells = 0
+        self.noSources = 0
+        self.occupancy = Occupancy(noDrivers, noNeurons)
+        self.placements = 0
+        self.recordV = None
+        self.recordVFile = ''
+        self.chip = None
+        self.spikes = np.zeros((0, 2))
+        self.weightLog = None
+        self.elapsed = 0.0
+
+
+_state = None
+membraneOutput = np.zeros(0)
+timeMembraneOutput = TimeAxis(0, timestep)
+membraneRecording = MembraneRecording(membraneOutput, timestep)
+lastRunInfo = {}
+
+
+def _checkSetup():
+    if _state is None:
+        raise RuntimeError('setup() has to be called first')
+
+
+def setup(timestep=timestep, min_delay=None, max_delay=None, **extra_params):
+    '''
+    Initialize the emulation.
+
+    Accepts the extra parameters of the hardware backend, e.g. mappingOffset,
+    calibTauMem and calibSynDrivers, rng_seeds for reproducible connectors
+    and Poisson sources, resultCache (a directory or
+    spikey_tools.cache.ResultCache) to reuse results of identical runs,
+    calibrationStore to load the mismatch of the emulated board from (see
+    spikey_tools.calibration), and stimulusSeed to emit the same Poisson
+    trains in each run, which are then generated only once (see
+    spikey_tools.stimulus).
+    '''
+    global _state, hardware
+    phases.mark('setup')
+    _state = _State(**extra_params)
+    hardware = _Hardware()
+    phases.mark('construction')
+    return 0
+
+
+def getRNG():
+    '''Generator of connectors without own rng, seeded by setup(rng_seeds=...).'''
+    _checkSetup()
+    return _state.rng
+
+
+def end():
+    global _state
+    phases.mark('analysis')
+    _state = None
+
+
+def minExcWeight():
+    return _minExcWeight
+
+
+def minInhWeight():
+    return _minInhWeight
+
+
+def minWeight(target):
+    return _minExcWeight if target == 'excitatory' else _minInhWeight
+
+
+def describe(runtime):
+    '''
+    Return a description of the next run that determines its results, used
+    as key of the result cache. Includes the state of the random number
+    generator, so that runs without rng_seeds are never taken from cache,
+    and the synapse array on chip, which STDP changes from run to run.
+    '''
+    _checkSetup()
+    populations = [(pop.cellclass.__name__, pop.size, pop.parameters, pop.recorded, pop.slots)
+                   for pop in _state.populations]
+    projections = []
+    for prj in _state.projections:
+        dynamics = prj.synapse_dynamics
+        projections.append((_state.populations.index(prj.pre), _state.populations.index(prj.post),
+                            prj.target, prj._pre, prj._post, prj._digital,
+                            prj.drvifallFactors, prj.drvioutFactors,
+                            dynamics.fast.parameters if dynamics and dynamics.fast else None,
+                            type(dynamics.slow).__name__ if dynamics and dynamics.slow else None))
+    rngState = _state.rng.get_state()
+    hwa = hardware.hwa
+    return {'modelVersion': modelVersion, 'mismatchSeed': mismatchSeed, 'runtime': runtime,
+            'setup': {'mappingOffset': _state.mappingOffset, 'calibTauMem': _state.calibTauMem,
+                      'calibSynDrivers': _state.calibSynDrivers, 'stimulusSeed': _state.stimulusSeed},
+            'hwa': {'icb': hwa.icb, 'lutCausal': hwa.lutCausal, 'lutAnticausal': hwa.lutAnticausal,
+                    'autoSTDPFrequency': hwa.autoSTDPFrequency},
+            'populations': populations, 'projections': projections,
+            'recordV': -1 if _state.recordV is None else int(_state.recordV),
+            'synapses': _state.chip.weights if _state.chip is not None else None,
+            'rng': (rngState[1], rngState[2], rngState[3], rngState[4])}
+
+
+def record_v(source, filename):
+    '''
+    Record membrane potential of a single neuron (there is only one ADC on chip).
+
+    If filename is not empty, the trace is written to a memory-mapped .npy
+    file during the run instead of being held in memory.
+    '''
+    _checkSetup()
+    if source.parent.isSource:
+        raise ValueError('membrane potential can only be recorded from neurons')
+    _state.recordV = source
+    _state.recordVFile = filename
+
+
+def getSynapseArray():
+    '''
+    Return digital weights of the whole synapse array as on chip after the
+    last run (as configured before the first run), uint8 of shape (noDrivers, noNeurons).
+    '''
+    _checkSetup()
+    if _state.chip is None:
+        return Chip(_state).weights
+    return _state.chip.weights.copy()
+
+
+def recordWeights(log):
+    '''Log the synapse array to log (a spikey_tools.weightlog.WeightLog) during the following runs.'''
+    _checkSetup()
+    _state.weightLog = log
+
+
+def run(runtime):
+    '''Emulate the network for runtime ms; spikes and membrane are available afterwards.'''
+    for _ in runStreaming(runtime):
+        pass
+    return runtime
+
+
+def runStreaming(runtime, chunkSize=None):
+    '''
+    Emulate the network like run(), but yield (t0, samples) of the recorded
+    membrane in chunks of chunkSize samples as soon as they are available.
+
+    Afterwards, spikes and membrane are available as after run(). The time
+    axis is not stored: membraneOutput[i] was sampled at timeMembraneOutput[i]
+    = t0 + i * dt, with timeMembraneOutput being a TimeAxis.
+    '''
+    global membraneOutput, timeMembraneOutput, membraneRecording, lastRunInfo
+    _checkSetup()
+    phases.mark('mapping')
+    start = _time.time()
+    chip = _state.chip
+    if chip is None or chip.layout != Chip.layoutOf(_state):
+        chip = Chip(_state)
+        _state.chip = chip
+        reconfigured = ['all']
+    else:
+        reconfigured = chip.update(_state)
+    log = _state.weightLog
+    if log is not None and (not len(log) or np.any(log.current != chip.weights)):
+        log.snapshot(_state.elapsed, chip.weights)
+    cache = _state.resultCache
+    cached = None
+    if cache is not None:
+        key = canonicalHash(describe(runtime))
+        cached = cache.get(key)
+
+    phases.mark('run')
+    steps = int(round(runtime / timestep))
+    recording = MembraneRecording(np.zeros(0), timestep)
+    if cached is not None:
+        if len(cached['membrane']):
+            recording = MembraneRecording(cached['membrane'], timestep)
+            if _state.recordVFile:
+                recording.save(_state.recordVFile)
+                recording = MembraneRecording.open(_state.recordVFile)
+        for first in range(0, len(recording), chunkSize or max(len(recording), 1)):
+            yield recording.t0 + first * timestep, recording.data[first:first + (chunkSize or len(recording))]
+        state = _state.rng.get_state()
+        _state.rng.set_state((state[0], cached['rngKeys'], int(cached['rngPos']),
+                              int(cached['rngGauss'][0]), float(cached['rngGauss'][1])))
+        _state.spikes = cached['spikes']
+        if log is not None:
+            _logReadouts(_state, chip, chip.weights.copy(), cached['stdpHistory'])
+        rows, columns = _plasticSynapses(_state, chip)
+        chip.weights[rows, columns] = cached['stdpWeights']
+        phases.mark('readout')
+    else:
+        sourceTimes, sourceIds = _sourceSpikes(_state, _state.rng, runtime)
+        recordV = -1
+        if _state.recordV is not None:
+            source = _state.recordV
+            recordV = int(source.parent.hwIndices[int(source) - source.parent.firstId])
+            if _state.recordVFile:
+                recording = MembraneRecording.create(_state.recordVFile, steps, timestep)
+            else:
+                recording = MembraneRecording(np.zeros(steps), timestep)
+        result = {}
+        for first, last in integrate(chip, runtime, sourceTimes, sourceIds, result, recordV, recording.data, chunkSize):
+            yield recording.t0 + first * timestep, recording.data[first:last]
+        phases.mark('readout')
+        if isinstance(recording.data, np.memmap):
+            recording.data.flush()
+
+        cells = result['cells']
+        ids = chip.cells[cells]
+        recorded = np.zeros(noNeurons, dtype=bool)
+        for pop in _state.populations:
+            if pop.recorded:
+                recorded[pop.hwIndices] = True
+        mask = recorded[cells]
+        _state.spikes = np.column_stack((ids[mask], result['times'][mask])).astype(float)
+        before = chip.weights.copy() if log is not None else None
+        learned, history = _applySTDP(_state, chip, runtime, sourceTimes, sourceIds, cells, result['times'])
+        if log is not None:
+            _logReadouts(_state, chip, before, history)
+        if cache is not None:
+            state = _state.rng.get_state()
+            cache.put(key, {'spikes': _state.spikes, 'membrane': np.asarray(recording.data),
+                            'stdpWeights': learned, 'stdpHistory': history,
+                            'rngKeys': state[1], 'rngPos': state[2], 'rngGauss': [state[3], state[4]]})
+    if _state.weightLog is not None:
+        _state.weightLog.snapshot(_state.elapsed + runtime, chip.weights)
+    _state.elapsed += runtime
+    membraneRecording = recording
+    membraneOutput = recording.data
+    timeMembraneOutput = recording.time
+    wallclock = _time.time() - start
+    lastRunInfo = {'runtime': runtime, 'wallclock': wallclock, 'reconfigured': reconfigured,
+                   'cached': cached is not None,
+                   'wallclockPerSecond': wallclock / (runtime / 1e3) if runtime > 0 else 0.0}
+
+
+instrumentFromEnvironment(sys.modules[__name__])
@@ -0,0 +1,143 @@
+'''
+Compact binary file format for spikes, loadable without parsing.
+
+A spike file consists of
+
+    magic 'SPKYSPK1', uint32 length of header, JSON header (padded to 8 bytes)
+    records: packed (uint16 neuron ID, uint32 tick), sorted by time
+    time index: uint64 record offsets, entry i is the first record with
+                tick >= i * indexInterval
+
+The header holds the tick in ms, the neuron ID ranges of the populations,
+the number of records and the layout of the index, and arbitrary metadata of
+the network. Records and index are opened as memory maps, so that loading a
+file costs only reading its header, and reading a time window only touches
+the pages of that window.
+
+Example:
+
+    write('run0001.spk', SpikeStore.fromPopulations(populations).asArray(),
+          populations=populationRanges(populations), metadata={'g_leak': 20.0})
+    spikes = SpikeFile('run0001.spk')
+    ids, times = spikes.window(100.0, 200.0)
+'''
+
+import json
+import numbers
+import struct
+
+import numpy as np
+
+magic = b'SPKYSPK1'
+recordType = np.dtype([('id', '<u2'), ('tick', '<u4')])
+defaultTick = 0.01          # ms
+defaultIndexInterval = 1000 # ticks per entry of the time index
+
+_length = struct.Struct('<I')
+
+
+def populationRanges(populations):
+    '''Return header entries of neuron ID ranges of PyNN populations.'''
+    return [{'label': getattr(pop, 'label', None), 'firstId': int(pop[0]), 'size': len(pop)}
+            for pop in populations if len(pop)]
+
+
+def write(filename, spikes, tick=defaultTick, populations=(), metadata=None,
+          indexInterval=defaultIndexInterval):
+    '''
+    Write array of (neuron ID, spike time in ms) rows to filename.
+
+    populations -- list of dicts with label, firstId and size, see populationRanges()
+    metadata    -- JSON-serializable description of the network or run
+    '''
+    spikes = np.asarray(spikes, dtype=float).reshape(-1, 2)
+    ticks = np.round(spikes[:, 1] / tick)
+    if len(spikes) and (spikes[:, 0].min() < 0 or spikes[:, 0].max() > np.iinfo(np.uint16).max
+                        or ticks.min() < 0 or ticks.max() > np.iinfo(np.uint32).max):
+        raise ValueError('neuron IDs or spike times out of range of the record format')
+    order = np.argsort(ticks, kind='mergesort')
+    records = np.empty(len(spikes), dtype=recordType)
+    records['id'] = spikes[order, 0]
+    records['tick'] = ticks[order]
+    noEntries = int(records['tick'][-1]) // indexInterval + 2 if len(records) else 1
+    index = np.searchsorted(records['tick'], np.arange(noEntries, dtype=np.uint64) * indexInterval).astype('<u8')
+
+    header = {'tick': tick, 'noRecords': len(records), 'indexInterval': indexInterval,
+              'indexLength': len(index), 'populations': list(populations), 'metadata': metadata or {}}
+    headerBytes = json.dumps(header, sort_keys=True).encode('utf-8')
+    headerBytes += b' ' * (-(len(magic) + _length.size + len(headerBytes)) % 8)
+    with open(filename, 'wb') as f:
+        f.write(magic)
+        f.write(_length.pack(len(headerBytes)))
+        f.write(headerBytes)
+        f.write(records.tobytes())
+        f.write(index.tobytes())
+
+
+class SpikeFile(object):
+    '''Memory-mapped spike file, see module documentation.'''
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            if f.read(len(magic)) != magic:
+                raise ValueError('%s is not a spike file' % filename)
+            headerLength = _length.unpack(f.read(_length.size))[0]
+            self.header = json.loads(f.read(headerLength).decode('utf-8'))
+        offset = len(magic) + _length.size + headerLength
+        noRecords = self.header['noRecords']
+        self.tick = self.header['tick']
+        self.indexInterval = self.header['indexInterval']
+        self.records = np.memmap(filename, dtype=recordType, mode='r', offset=offset, shape=(noRecords,)) \
+            if noRecords else np.zeros(0, dtype=recordType)
+        self.index = np.memmap(filename, dtype='<u8', mode='r', offset=offset + noRecords * recordType.itemsize,
+                               shape=(self.header['indexLength'],))
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def metadata(self):
+        return self.header['metadata']
+
+    @property
+    def populations(self):
+        return self.header['populations']
+
+    @property
+    def ids(self):
+        return self.records['id']
+
+    @property
+    def times(self):
+        '''Spike times in ms.'''
+        return self.records['tick'] * self.tick
+
+    def _recordRange(self, tStart, tStop):
+        '''First and last + 1 record within [tStart, tStop), using the index to narrow the search.'''
+        first, last = [int(np.ceil(t / self.tick - 0.5)) for t in (tStart, tStop)]
+        bounds = []
+        for t in (first, last):
+            entry = min(max(t, 0) // self.indexInterval, len(self.index) - 1)
+            lo = int(self.index[entry])
+            hi = int(self.index[entry + 1]) if entry + 1 < len(self.index) else len(self.records)
+            bounds.append(lo + int(np.searchsorted(self.records['tick'][lo:hi], max(t, 0))))
+        return bounds
+
+    def window(self, tStart, tStop, population=None):
+        '''
+        Return (ids, times) of spikes within [tStart, tStop) in ms, optionally
+        only of the population with given label or index.
+        '''
+        lo, hi = self._recordRange(tStart, tStop)
+        records = self.records[lo:hi]
+        if population is not None:
+            if not isinstance(population, numbers.Integral):
+                population = [pop['label'] for pop in self.populations].index(population)
+            pop = self.populations[population]
+            mask = (records['id'] >= pop['firstId']) & (records['id'] < pop['firstId'] + pop['size'])
+            records = records[mask]
+        return records['id'], records['tick'] * self.tick
+
+    def asArray(self):
+        '''Return float array of (neuron ID, spike time) as returned by getSpikes().'''
+        return np.column_stack((self.ids, self.times)).astype(float)
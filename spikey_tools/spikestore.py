@@ -0,0 +1,101 @@
+'''
+Columnar container for spikes of many populations.
+
+Spikes are stored in two preallocated columns with compact dtypes, neuron IDs
+as uint16 and spike times either as float32 in ms or as int32 multiples of a
+clock tick. Spikes of each population are stored contiguously and sorted by
+time, an index of per-population offsets gives O(1) access to the spikes of a
+population and a binary search those within a time window.
+
+Example:
+
+    store = SpikeStore.fromPopulations(populations)
+    ids, times = store.population(3)
+    ids, times = store.window(3, 100.0, 200.0)
+'''
+
+import numbers
+
+import numpy as np
+
+
+class SpikeStore(object):
+    '''
+    capacity -- number of spikes to preallocate, grows if exceeded
+    tick     -- if given, spike times are stored as int32 multiples of tick ms
+    '''
+    def __init__(self, capacity=0, tick=None):
+        self.tick = tick
+        self._ids = np.zeros(capacity, dtype=np.uint16)
+        self._times = np.zeros(capacity, dtype=np.float32 if tick is None else np.int32)
+        self.offsets = [0]
+        self.labels = []
+
+    @classmethod
+    def fromPopulations(cls, populations, labels=None, tick=None):
+        '''Collect spikes of all populations with a single allocation.'''
+        spikes = [pop.getSpikes() for pop in populations]
+        store = cls(sum(len(s) for s in spikes), tick)
+        if labels is None:
+            labels = [getattr(pop, 'label', None) for pop in populations]
+        for s, label in zip(spikes, labels):
+            store.add(s, label)
+        return store
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def _encode(self, times):
+        if self.tick is None:
+            return times
+        return np.round(np.asarray(times) / self.tick)
+
+    def _decode(self, times):
+        if self.tick is None:
+            return times
+        return times * self.tick
+
+    def add(self, spikes, label=None):
+        '''Append array of (neuron ID, spike time) as next population.'''
+        spikes = np.asarray(spikes).reshape(-1, 2)
+        start = self.offsets[-1]
+        stop = start + len(spikes)
+        if stop > len(self._ids):
+            capacity = max(stop, 2 * len(self._ids))
+            self._ids = np.resize(self._ids, capacity)
+            self._times = np.resize(self._times, capacity)
+        order = np.argsort(spikes[:, 1], kind='mergesort')
+        self._ids[start:stop] = spikes[order, 0]
+        self._times[start:stop] = self._encode(spikes[order, 1])
+        self.offsets.append(stop)
+        self.labels.append(label)
+        return len(self.offsets) - 2
+
+    @property
+    def ids(self):
+        return self._ids[:len(self)]
+
+    @property
+    def times(self):
+        '''Spike times in ms.'''
+        return self._decode(self._times[:len(self)])
+
+    def population(self, index):
+        '''Return (ids, times) of population with given index or label.'''
+        if not isinstance(index, numbers.Integral):
+            index = self.labels.index(index)
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        return self._ids[start:stop], self._decode(self._times[start:stop])
+
+    def window(self, index, tStart, tStop):
+        '''Return (ids, times) of a population within [tStart, tStop) in ms.'''
+        if not isinstance(index, numbers.Integral):
+            index = self.labels.index(index)
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        times = self._times[start:stop]
+        lo, hi = np.searchsorted(times, self._encode([tStart, tStop]))
+        return self._ids[start + lo:start + hi], self._decode(times[lo:hi])
+
+    def asArray(self):
+        '''Return float array of (neuron ID, spike time) as returned by getSpikes().'''
+        return np.column_stack((self.ids, self.times)).astype(float)
@@ -0,0 +1,133 @@
+'''
+Spike-triggered averaging of membrane traces in constant memory.
+
+The trace is fed in chunks (e.g. slices of a memory-mapped file), each window
+is aligned to the actual time of its trigger by linear interpolation between
+ADC samples, and mean and variance across windows are accumulated
+incrementally. Stimuli therefore do not need to lie on a uniform grid and the
+full trace never has to be held in memory.
+
+Example:
+
+    sta = SpikeTriggeredAverage(stimulusTimes, 200.0, dt, t0)
+    for chunk in chunks:
+        sta.feed(chunk)
+    mean, std = sta.mean, sta.std
+'''
+
+import numpy as np
+
+
+def windows(trace, triggers, length, dt, t0=0.0, offset=0.0):
+    '''
+    Return array of shape (len(triggers), length) with one window per trigger.
+
+    Window k starts at triggers[k] + offset and is sampled with interval dt,
+    trace[i] is the value at time t0 + i * dt. All windows have to lie within
+    the trace.
+    '''
+    position = (np.asarray(triggers, dtype=float) + offset - t0) / dt
+    start = np.floor(position).astype(int)
+    frac = (position - start)[:, np.newaxis]
+    index = start[:, np.newaxis] + np.arange(length)
+    trace = np.asarray(trace)
+    # the sample after a window ending on the last sample has weight 0
+    return trace[index] * (1.0 - frac) + trace[np.minimum(index + 1, len(trace) - 1)] * frac
+
+
+class SpikeTriggeredAverage(object):
+    '''
+    Incremental spike-triggered average of a trace fed in consecutive chunks.
+
+    triggers -- trigger times in ms
+    duration -- duration of each window in ms
+    dt       -- sampling interval of the trace in ms
+    t0       -- time of first sample in ms
+    offset   -- start of windows relative to triggers in ms, e.g. -10.0 to
+                include 10ms before each trigger
+    '''
+    def __init__(self, triggers, duration, dt, t0=0.0, offset=0.0):
+        self.dt = float(dt)
+        self.offset = float(offset)
+        self.length = int(round(duration / self.dt))
+        self.time = offset + np.arange(self.length) * self.dt
+        self.count = 0
+        self.skipped = 0
+        self._mean = np.zeros(self.length)
+        self._m2 = np.zeros(self.length)
+        self._pending = np.sort(np.asarray(triggers, dtype=float))
+        self._buffer = np.zeros(0)
+        self._bufferT0 = float(t0)
+
+    def feed(self, chunk):
+        '''Process the next chunk of the trace.'''
+        data = np.concatenate((self._buffer, np.asarray(chunk, dtype=float)))
+        position = (self._pending + self.offset - self._bufferT0) / self.dt
+        start = np.floor(position).astype(int)
+        # windows starting before the available data can not be completed any more
+        early = start < 0
+        self.skipped += int(np.count_nonzero(early))
+        # interpolation needs one sample after the window
+        complete = ~early & (start + self.length + 1 <= len(data))
+        if np.any(complete):
+            self.add(windows(data, self._pending[complete], self.length, self.dt, self._bufferT0, self.offset))
+        keep = ~early & ~complete
+        self._pending = self._pending[keep]
+        # keep data needed for pending windows only
+        first = start[keep].min() if len(self._pending) else len(data)
+        first = min(first, len(data))
+        self._buffer = data[first:]
+        self._bufferT0 += first * self.dt
+
+    def add(self, batch):
+        '''Merge a batch of aligned windows of shape (n, length) into the statistics.'''
+        batch = np.asarray(batch, dtype=float)
+        n = len(batch)
+        if n == 0:
+            return
+        batchMean = batch.mean(axis=0)
+        batchM2 = ((batch - batchMean) ** 2).sum(axis=0)
+        total = self.count + n
+        delta = batchMean - self._mean
+        self._mean += delta * n / total
+        self._m2 += batchM2 + delta ** 2 * (float(self.count) * n / total)
+        self.count = total
+
+    def finish(self):
+        '''Add windows ending on the last sample, discard triggers whose windows exceed the end of the trace.'''
+        position = (self._pending + self.offset - self._bufferT0) / self.dt
+        fits = position + self.length - 1 <= len(self._buffer) - 1 + 1e-9
+        if np.any(fits):
+            self.add(windows(self._buffer, self._pending[fits], self.length, self.dt, self._bufferT0, self.offset))
+        self.skipped += int(np.count_nonzero(~fits))
+        self._pending = self._pending[:0]
+        self._buffer = np.zeros(0)
+
+    @property
+    def mean(self):
+        return self._mean.copy()
+
+    @property
+    def variance(self):
+        '''Unbiased variance across windows.'''
+        if self.count < 2:
+            return np.zeros(self.length)
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+
+def average(trace, triggers, duration, dt, t0=0.0, offset=0.0, chunkSize=1 << 20):
+    '''
+    Spike-triggered average of a complete (possibly memory-mapped) trace.
+
+    The trace is read in chunks of chunkSize samples, returns the
+    SpikeTriggeredAverage with the accumulated statistics.
+    '''
+    sta = SpikeTriggeredAverage(triggers, duration, dt, t0, offset)
+    for start in range(0, len(trace), chunkSize):
+        sta.feed(trace[start:start + chunkSize])
+    sta.finish()
+    return sta
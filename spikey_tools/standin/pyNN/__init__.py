@@ -0,0 +1,7 @@
+'''
+Minimal pyNN package that maps pyNN.hardware.spikey onto the software
+stand-in in spikey_tools.software.
+
+Put the directory containing this package in front of PYTHONPATH to run the
+demo scripts without a chip attached, see README.md.
+'''
@@ -0,0 +1,11 @@
+'''
+Alias of spikey_tools.software under the module name of the hardware backend.
+'''
+
+import sys
+
+import spikey_tools.software
+
+# replace this module by the stand-in itself, otherwise module attributes
+# that are updated by run() (e.g. membraneOutput) would be stale copies
+sys.modules[__name__] = spikey_tools.software
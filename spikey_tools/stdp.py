@@ -0,0 +1,194 @@
+'''
+Vectorized model of the STDP synapses of the Spikey chip.
+
+Each synapse measures correlations between pre- and postsynaptic spikes on
+two capacitors, a causal one (pre before post) and an anticausal one (post
+before pre), using a reduced symmetric nearest-neighbour pairing with
+exponential time windows. The STDP controller periodically evaluates the
+capacitors of each synapse: two evaluation bits are computed from the charges,
+the thresholds a_thresh_th/a_thresh_tl and the configuration bits, and select
+the look-up table (causal, anticausal or a third one if both bits are set)
+that maps the 4-bit weight to its new value. Afterwards, capacitors are
+reset according to the reset pattern. This follows the NEST model
+stdp_facetshw_synapse_hom, look-up tables have the format of hwa.setLUT().
+
+The defaults of STDPRule are not those of the NEST model, but the
+configuration misc/hw_synapse_nest.py sets to make NEST behave like the chip:
+thresholds a_thresh_tl = 2 and a_thresh_th = 2 * a_thresh_tl, configuration
+bits (0, 0, 1, 1) and (1, 1, 0, 0), i.e. the causal table is applied if
+a_c - a_a > a_thresh_tl and the anticausal one if a_a - a_c > a_thresh_tl,
+and look-up tables that increase or decrease the weight by one step. Time
+constants default to those of SpikePairRule (20 ms) and readoutPeriod to the
+period of the STDP controller of the stand-in.
+
+All synapses are processed at once: correlation increments are computed for
+all spike pairs with a few array operations, and the evaluation loop runs
+over readout cycles only, each cycle handling all synapses.
+
+Example:
+
+    rule = STDPRule(readoutPeriod=100.0)
+    preTimes, preSyn = flattenTrains(preTrains)
+    postTimes, postSyn = flattenTrains(postTrains)
+    result = evolve(rule, weights, preTimes, preSyn, postTimes, postSyn, runtime)
+    result.weights
+'''
+
+import numpy as np
+
+
+class STDPRule(object):
+    '''
+    Parameters of the STDP synapses and the STDP controller.
+
+    configbit0/configbit1 are the bits (e_cc, e_ca, e_ac, e_aa) of the two
+    evaluation functions, resetPattern the six bits (a_c, a_a) to reset after
+    applying the causal, anticausal and third look-up table, respectively.
+    readoutPeriod is the time in ms between two evaluations of a synapse.
+    '''
+    def __init__(self, tauPlus=20.0, tauMinus=20.0, aThreshTh=4.0, aThreshTl=2.0,
+                 configbit0=(0, 0, 1, 1), configbit1=(1, 1, 0, 0),
+                 lutCausal=None, lutAnticausal=None, lut2=None,
+                 resetPattern=(1, 1, 1, 1, 1, 1), readoutPeriod=10.0):
+        self.tauPlus = tauPlus
+        self.tauMinus = tauMinus
+        self.aThreshTh = aThreshTh
+        self.aThreshTl = aThreshTl
+        self.configbit0 = configbit0
+        self.configbit1 = configbit1
+        self.lutCausal = _lut(lutCausal if lutCausal is not None else list(range(1, 16)) + [15])
+        self.lutAnticausal = _lut(lutAnticausal if lutAnticausal is not None else [0] + list(range(0, 15)))
+        self.lut2 = _lut(lut2 if lut2 is not None else range(16))
+        self.resetPattern = tuple(bool(bit) for bit in resetPattern)
+        self.readoutPeriod = readoutPeriod
+
+    def evaluate(self, aCausal, aAcausal, configbit):
+        '''Evaluation bit of all synapses for one set of configuration bits.'''
+        cc, ca, ac, aa = configbit
+        left = (self.aThreshTl + ac * aCausal + ca * aAcausal) / (1.0 + ac + ca)
+        right = (self.aThreshTh + cc * aCausal + aa * aAcausal) / (1.0 + cc + aa)
+        return left > right
+
+
+def _lut(table):
+    table = np.asarray(list(table), dtype=np.uint8)
+    if table.shape != (16,) or table.max() > 15:
+        raise ValueError('look-up tables need 16 entries in range(16)')
+    return table
+
+
+def flattenTrains(trains):
+    '''Convert list of spike trains (one per synapse) to flat arrays of (times, synapse index).'''
+    lengths = [len(train) for train in trains]
+    times = np.concatenate([np.asarray(train, dtype=float) for train in trains] + [np.zeros(0)])
+    return times, np.repeat(np.arange(len(trains)), lengths)
+
+
+def _sortedKeys(times, syn, t0, span):
+    order = np.lexsort((times, syn))
+    return (syn[order] * span + (times[order] - t0)), times[order], syn[order]
+
+
+def _nearest(keysA, timesA, synA, keysB, timesB, synB, tau):
+    '''
+    For each event of B, pair with the nearest preceding event of A at the
+    same synapse, if B is the first event after that A event (reduced
+    nearest-neighbour). Return (time, synapse, increment) of all pairs.
+    '''
+    index = np.searchsorted(keysA, keysB, side='left') - 1
+    valid = index >= 0
+    valid[valid] = synA[index[valid]] == synB[valid]
+    first = np.ones(len(index), dtype=bool)
+    first[1:] = index[1:] != index[:-1]
+    pair = valid & first
+    dt = timesB[pair] - timesA[index[pair]]
+    return timesB[pair], synB[pair], np.exp(-dt / tau)
+
+
+def correlations(preTimes, preSyn, postTimes, postSyn, tauPlus, tauMinus):
+    '''
+    Return (times, synapse, increment) of causal and anticausal capacitor
+    increments for all synapses.
+    '''
+    preTimes = np.asarray(preTimes, dtype=float)
+    postTimes = np.asarray(postTimes, dtype=float)
+    preSyn = np.asarray(preSyn, dtype=int)
+    postSyn = np.asarray(postSyn, dtype=int)
+    allTimes = np.concatenate((preTimes, postTimes))
+    if len(allTimes) == 0:
+        empty = (np.zeros(0), np.zeros(0, dtype=int), np.zeros(0))
+        return empty, empty
+    t0 = allTimes.min()
+    # separate synapses on one time axis, the gap guarantees no pairing across synapses
+    span = allTimes.max() - t0 + 1.0
+    pre = _sortedKeys(preTimes, preSyn, t0, span)
+    post = _sortedKeys(postTimes, postSyn, t0, span)
+    causal = _nearest(pre[0], pre[1], pre[2], post[0], post[1], post[2], tauPlus)
+    anticausal = _nearest(post[0], post[1], post[2], pre[0], pre[1], pre[2], tauMinus)
+    return causal, anticausal
+
+
+class STDPResult(object):
+    def __init__(self, weights, aCausal, aAcausal, readoutTimes, weightHistory):
+        self.weights = weights
+        self.aCausal = aCausal
+        self.aAcausal = aAcausal
+        self.readoutTimes = readoutTimes
+        self.weightHistory = weightHistory
+
+
+def evolve(rule, weights, preTimes, preSyn, postTimes, postSyn, runtime, readoutOffsets=None):
+    '''
+    Apply the STDP rule to all synapses for the given spike trains.
+
+    weights        -- initial digital weights (0..15), one per synapse
+    preTimes/Syn   -- presynaptic spike times in ms and synapse index of each spike
+    postTimes/Syn  -- postsynaptic spike times in ms and synapse index of each spike
+    runtime        -- duration of the experiment in ms
+    readoutOffsets -- time of first readout of each synapse is offset + readoutPeriod,
+                      defaults to 0 for all synapses
+
+    Returns an STDPResult with the final weights, the charges left on the
+    capacitors, the readout times (relative to the offset) and the weights
+    after each readout cycle (shape (cycles, synapses)).
+    '''
+    weights = np.array(weights, dtype=np.uint8)
+    noSyn = len(weights)
+    period = float(rule.readoutPeriod)
+    offsets = np.zeros(noSyn) if readoutOffsets is None else np.asarray(readoutOffsets, dtype=float)
+    cycles = int(np.floor((runtime - offsets.min()) / period)) if noSyn else 0
+    cycles = max(cycles, 0)
+    # number of readouts of each synapse within runtime
+    lastCycle = np.floor((runtime - offsets) / period).astype(int)
+
+    increments = []
+    for times, syn, inc in correlations(preTimes, preSyn, postTimes, postSyn, rule.tauPlus, rule.tauMinus):
+        # increment before readout k (at offset + k * period) belongs to cycle k, cycles + 1 collects the rest
+        cycle = np.maximum(np.ceil((times - offsets[syn]) / period).astype(int), 1)
+        cycle = np.where(cycle > lastCycle[syn], cycles + 1, cycle)
+        binned = np.bincount(syn * (cycles + 2) + cycle, weights=inc, minlength=noSyn * (cycles + 2))
+        increments.append(binned.reshape(noSyn, cycles + 2))
+    incCausal, incAcausal = increments
+
+    aCausal = np.zeros(noSyn)
+    aAcausal = np.zeros(noSyn)
+    history = np.zeros((cycles, noSyn), dtype=np.uint8)
+    reset = rule.resetPattern
+    for k in range(1, cycles + 1):
+        aCausal += incCausal[:, k]
+        aAcausal += incAcausal[:, k]
+        active = k <= lastCycle
+        eval0 = rule.evaluate(aCausal, aAcausal, rule.configbit0) & active
+        eval1 = rule.evaluate(aCausal, aAcausal, rule.configbit1) & active
+        for mask, lut, resetCausal, resetAcausal in ((eval0 & ~eval1, rule.lutCausal, reset[0], reset[1]),
+                                                     (~eval0 & eval1, rule.lutAnticausal, reset[2], reset[3]),
+                                                     (eval0 & eval1, rule.lut2, reset[4], reset[5])):
+            weights[mask] = lut[weights[mask]]
+            if resetCausal:
+                aCausal[mask] = 0.0
+            if resetAcausal:
+                aAcausal[mask] = 0.0
+        history[k - 1] = weights
+    aCausal += incCausal[:, cycles + 1]
+    aAcausal += incAcausal[:, cycles + 1]
+    return STDPResult(weights, aCausal, aAcausal, np.arange(1, cycles + 1) * period, history)
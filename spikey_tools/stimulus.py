@@ -0,0 +1,149 @@
+'''
+Bulk generation and caching of Poisson stimuli.
+
+The spike trains of all sources of a population are drawn at once, as
+matrices of inter-spike intervals of all sources. Each source has an
+independent random stream derived from (seed, source index): its random
+numbers are a counter-based hash (SplitMix64) of seed, source index and draw
+index, so the train of a source depends neither on the size of the
+population nor on the other sources. The trains are quantized to clock
+ticks and kept as a single int32 array of ticks sorted by source and time
+plus the offset of each source, which is the encoded form used for upload.
+
+StimulusCache keeps encoded trains keyed by (size, rate, start, duration,
+seed, tick), so that repeated runs and sweep points with the same frozen
+stimulus neither generate nor encode it again. The software stand-in uses it
+for all SpikeSourcePoisson populations if setup() gets stimulusSeed=...,
+with the hardware backend the trains can be used with SpikeSourceArray:
+
+    trains = defaultCache.poisson(64, 10.0, 0.0, runtime, seed=1234)
+    for i, spikeTimes in enumerate(trains.spikeTimes()):
+        ...
+'''
+
+import collections
+
+import numpy as np
+
+defaultTick = 0.1 # ms, the resolution of the software stand-in
+
+_golden = np.uint64(0x9E3779B97F4A7C15)
+_mix1 = np.uint64(0xBF58476D1CE4E5B9)
+_mix2 = np.uint64(0x94D049BB133111EB)
+
+
+class PoissonTrains(object):
+    '''
+    Encoded spike trains of size sources.
+
+    ticks   -- int32 spike times in units of tick, sorted by source and time
+    offsets -- spikes of source i are ticks[offsets[i]:offsets[i + 1]]
+    '''
+    def __init__(self, ticks, offsets, tick):
+        self.ticks = ticks
+        self.offsets = offsets
+        self.tick = tick
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        return self.ticks.nbytes + self.offsets.nbytes
+
+    def ids(self):
+        '''Source index of each spike.'''
+        return np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.offsets))
+
+    def times(self):
+        '''Spike times in ms of all spikes, in the order of ids().'''
+        return self.ticks * self.tick
+
+    def spikeTimes(self):
+        '''List of spike times in ms, one array per source.'''
+        times = self.times()
+        return [times[first:last] for first, last in zip(self.offsets[:-1], self.offsets[1:])]
+
+
+def _splitMix(z):
+    '''Finalizer of SplitMix64, maps uint64 arrays to uniformly distributed uint64.'''
+    z = (z ^ (z >> np.uint64(30))) * _mix1
+    z = (z ^ (z >> np.uint64(27))) * _mix2
+    return z ^ (z >> np.uint64(31))
+
+
+def sourceStreams(seed, size):
+    '''Key of the random stream of each of size sources, derived from (seed, source index).'''
+    with np.errstate(over='ignore'):
+        key = _splitMix(np.array([int(seed) % (1 << 64)], dtype=np.uint64) * _golden + _golden)
+        return _splitMix(key ^ (np.arange(size, dtype=np.uint64) * _golden))
+
+
+def uniforms(streams, first, count):
+    '''Random numbers first to first + count of each stream, in (0, 1], shape (len(streams), count).'''
+    with np.errstate(over='ignore'):
+        counter = (np.arange(first, first + count, dtype=np.uint64) + np.uint64(1)) * _golden
+        bits = _splitMix(streams[:, np.newaxis] + counter)
+    return ((bits >> np.uint64(11)).astype(float) + 1.0) / float(1 << 53)
+
+
+def generatePoisson(size, rate, start, duration, seed, tick=defaultTick):
+    '''Draw Poisson spike trains of size sources with rate in 1/s between start and start + duration ms.'''
+    streams = sourceStreams(seed, size)
+    expected = rate * duration / 1e3
+    # inter-spike intervals in blocks large enough for almost all sources, longer trains take more blocks
+    block = int(expected + 5.0 * np.sqrt(expected)) + 8
+    times = []
+    ids = []
+    pending = np.arange(size) if rate > 0 and duration > 0 else np.zeros(0, dtype=int)
+    last = np.zeros(size)
+    drawn = 0
+    while len(pending):
+        intervals = -np.log(uniforms(streams[pending], drawn, block)) * (1e3 / rate)
+        spikeTimes = last[pending, np.newaxis] + np.cumsum(intervals, axis=1)
+        inside = spikeTimes < duration
+        times.append(spikeTimes[inside])
+        ids.append(np.repeat(pending, inside.sum(axis=1)))
+        last[pending] = spikeTimes[:, -1]
+        pending = pending[inside[:, -1]]
+        drawn += block
+    times = np.concatenate(times + [np.zeros(0)])
+    ids = np.concatenate(ids + [np.zeros(0, dtype=int)])
+    ticks = np.round((start + times) / tick).astype(np.int32)
+    order = np.lexsort((ticks, ids))
+    ticks = ticks[order]
+    ids = ids[order]
+    # a source emits at most one spike per tick
+    keep = np.ones(len(ticks), dtype=bool)
+    keep[1:] = (ticks[1:] != ticks[:-1]) | (ids[1:] != ids[:-1])
+    ticks = ticks[keep]
+    offsets = np.searchsorted(ids[keep], np.arange(size + 1)).astype(np.int64)
+    return PoissonTrains(ticks, offsets, tick)
+
+
+class StimulusCache(object):
+    '''Least recently used encoded Poisson trains, at most maxEntries of them.'''
+    def __init__(self, maxEntries=64):
+        self.maxEntries = maxEntries
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def poisson(self, size, rate, start, duration, seed, tick=defaultTick):
+        key = (int(size), float(rate), float(start), float(duration), int(seed), float(tick))
+        trains = self.entries.pop(key, None)
+        if trains is None:
+            self.misses += 1
+            trains = generatePoisson(size, rate, start, duration, seed, tick)
+        else:
+            self.hits += 1
+        self.entries[key] = trains
+        while len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+        return trains
+
+    def clear(self):
+        self.entries.clear()
+
+
+defaultCache = StimulusCache()
@@ -0,0 +1,177 @@
+'''
+Fitting of Tsodyks-Markram short-term plasticity to PSP amplitudes.
+
+pspAmplitudes() extracts the amplitude of the PSP of each input spike from
+membrane traces, fitTsodyksMarkram() fits U, tau_rec and optionally
+tau_facil of TsodyksMarkramMechanism to the amplitudes. Both work on a batch
+of traces at once, e.g. one per synapse driver or trial, given as rows of 2D
+arrays. The amplitude of spike n is modelled as scale * u_n * R_n. For each
+candidate parameter set, the best scale follows in closed form from linear
+least squares, so only the STP parameters are searched: first on a coarse
+grid shared by all traces, then on finer grids around the best candidate of
+each trace. Every step evaluates all candidates of all traces in one
+vectorized computation.
+
+Example:
+
+    time = pynn.timeMembraneOutput
+    amplitudes = pspAmplitudes(pynn.membraneOutput, spikeTimes, time[1] - time[0], time[0])
+    fit = fitTsodyksMarkram(spikeTimes, amplitudes)
+    fit.U, fit.tauRec
+'''
+
+import numpy as np
+
+defaultU = np.linspace(0.05, 1.0, 20)
+defaultTau = np.logspace(0.0, 3.5, 24) # ms
+
+
+def efficacies(spikeTimes, U, tauRec, tauFacil=0.0):
+    '''
+    Return u_n * R_n for each spike n, with R_0 = 1 and u_0 = U as in
+    TsodyksMarkramMechanism, and without facilitation where tauFacil is 0.
+
+    spikeTimes has shape (..., N), the parameters broadcast against
+    spikeTimes[..., 0]. NaN spike times (padding) give NaN efficacies.
+    '''
+    spikeTimes = np.asarray(spikeTimes, dtype=float)
+    U, tauRec, tauFacil = [np.asarray(p, dtype=float) for p in (U, tauRec, tauFacil)]
+    shape = np.broadcast(spikeTimes[..., 0], U, tauRec, tauFacil).shape
+    result = np.empty(shape + spikeTimes.shape[-1:])
+    facil = tauFacil > 0
+    safeTauFacil = np.where(facil, tauFacil, 1.0)
+    R = np.ones(shape)
+    u = np.broadcast_to(U, shape)
+    for n in range(spikeTimes.shape[-1]):
+        if n:
+            elapsed = spikeTimes[..., n] - spikeTimes[..., n - 1]
+            R = 1.0 - (1.0 - R) * np.exp(-elapsed / tauRec)
+            u = np.where(facil, U + u * (1.0 - U) * np.exp(-elapsed / safeTauFacil), U)
+        result[..., n] = u * R
+        R = R - u * R
+    return result
+
+
+def pspAmplitudes(trace, spikeTimes, dt, t0=0.0, window=20.0):
+    '''
+    Return the amplitude of the excitatory PSP after each spike: the maximum
+    within window ms after the spike minus the value at the spike time.
+
+    trace      -- membrane of shape (samples,) or (traces, samples), trace[..., i]
+                  is the value at t0 + i * dt
+    spikeTimes -- input spike times of shape (N,) or (traces, N), NaN for padding
+    window     -- has to be shorter than the intervals between spikes
+
+    Amplitudes of padded spikes and of windows outside the trace are NaN.
+    '''
+    trace = np.asarray(trace, dtype=float)
+    spikeTimes = np.asarray(spikeTimes, dtype=float)
+    single = trace.ndim == 1 and spikeTimes.ndim == 1
+    trace = np.atleast_2d(trace)
+    spikeTimes = np.atleast_2d(spikeTimes)
+    noTraces = max(len(trace), len(spikeTimes))
+    spikeTimes = np.broadcast_to(spikeTimes, (noTraces, spikeTimes.shape[1]))
+    length = int(round(window / dt))
+    start = np.round((np.where(np.isfinite(spikeTimes), spikeTimes, t0) - t0) / dt).astype(int)
+    valid = np.isfinite(spikeTimes) & (start >= 0) & (start + length <= trace.shape[1])
+    index = np.where(valid, start, 0)[..., np.newaxis] + np.arange(length)
+    rows = np.arange(noTraces) if len(trace) > 1 else np.zeros(noTraces, dtype=int)
+    segments = trace[rows[:, np.newaxis, np.newaxis], index]
+    amplitudes = np.where(valid, segments.max(axis=-1) - segments[..., 0], np.nan)
+    return amplitudes[0] if single else amplitudes
+
+
+class TsodyksMarkramFit(object):
+    '''
+    Fitted parameters, arrays with one entry per trace (floats for a single trace).
+
+    scale -- amplitude of a PSP with efficacy u * R = 1
+    rms   -- root mean square deviation of the amplitudes from the fit
+    '''
+    def __init__(self, U, tauRec, tauFacil, scale, rms):
+        self.U = U
+        self.tauRec = tauRec
+        self.tauFacil = tauFacil
+        self.scale = scale
+        self.rms = rms
+
+    def predict(self, spikeTimes):
+        '''Return the amplitudes predicted by the fit for spikeTimes.'''
+        return np.asarray(self.scale)[..., np.newaxis] * efficacies(spikeTimes, self.U, self.tauRec, self.tauFacil)
+
+
+def _score(spikeTimes, amplitudes, valid, U, tauRec, tauFacil):
+    '''Return scale and residual sum of squares of candidates of shape (K, traces).'''
+    e = efficacies(spikeTimes, U, tauRec, tauFacil)
+    e = np.where(valid, e, 0.0)
+    ae = (amplitudes * e).sum(axis=-1)
+    ee = (e * e).sum(axis=-1)
+    scale = np.where(ee > 0, ae / np.where(ee > 0, ee, 1.0), 0.0)
+    residual = (amplitudes * amplitudes).sum(axis=-1) - scale * ae
+    return scale, residual
+
+
+def fitTsodyksMarkram(spikeTimes, amplitudes, facilitation=False, U=None, tauRec=None, tauFacil=None,
+                      refine=4, starts=4, chunkSize=1024):
+    '''
+    Fit Tsodyks-Markram parameters to PSP amplitudes and return a TsodyksMarkramFit.
+
+    spikeTimes   -- spike times of shape (N,) or (traces, N), NaN for padding
+    amplitudes   -- amplitudes of shape (N,) or (traces, N), NaN where missing
+    facilitation -- fit tau_facil, otherwise it is fixed to 0
+    U, tauRec, tauFacil -- coarse grids of the first search step
+    refine       -- number of refinement steps, each halves the grid spacing
+    starts       -- number of best coarse candidates of each trace that are refined
+    chunkSize    -- number of coarse grid candidates evaluated at once
+    '''
+    amplitudes = np.asarray(amplitudes, dtype=float)
+    single = amplitudes.ndim == 1
+    amplitudes = np.atleast_2d(amplitudes)
+    spikeTimes = np.broadcast_to(np.asarray(spikeTimes, dtype=float), amplitudes.shape)
+    valid = np.isfinite(amplitudes) & np.isfinite(spikeTimes)
+    amplitudes = np.where(valid, amplitudes, 0.0)
+    U = defaultU if U is None else np.asarray(U, dtype=float)
+    tauRec = defaultTau if tauRec is None else np.asarray(tauRec, dtype=float)
+    if tauFacil is None:
+        tauFacil = np.concatenate(([0.0], defaultTau[::2])) if facilitation else np.zeros(1)
+    tauFacil = np.asarray(tauFacil, dtype=float)
+
+    # coarse grid, the same candidates for all traces, keep the best starts of each trace
+    grid = [g.ravel() for g in np.meshgrid(U, tauRec, tauFacil, indexing='ij')]
+    noTraces = len(amplitudes)
+    traces = np.arange(noTraces)
+    best = np.zeros((3, 0, noTraces))
+    bestResidual = np.zeros((0, noTraces))
+    for first in range(0, len(grid[0]), chunkSize):
+        candidates = [g[first:first + chunkSize, np.newaxis] for g in grid]
+        _, residual = _score(spikeTimes, amplitudes, valid, *candidates)
+        residual = np.concatenate((bestResidual, residual))
+        params = np.concatenate((best, np.broadcast_to(candidates, (3,) + residual[len(bestResidual):].shape)), axis=1)
+        order = np.argsort(residual, axis=0)[:starts]
+        bestResidual = residual[order, traces]
+        best = params[:, order, traces]
+
+    # finer grids around each start, U linear and time constants logarithmic
+    steps = np.array([np.diff(U).min() if len(U) > 1 else 0.1,
+                      np.diff(np.log(tauRec)).min() if len(tauRec) > 1 else 0.5,
+                      np.diff(np.log(tauFacil[tauFacil > 0])).min() if np.sum(tauFacil > 0) > 1 else 0.5])
+    offsets = np.linspace(-1.5, 1.5, 7)
+    noStarts = best.shape[1]
+    for _ in range(refine):
+        grids = np.meshgrid(offsets * steps[0], offsets * steps[1], offsets * steps[2] if facilitation else [0.0],
+                            indexing='ij')
+        du, dRec, dFacil = [g.ravel()[:, np.newaxis, np.newaxis] for g in grids]
+        candidates = [np.clip(best[0] + du, 1e-3, 1.0), best[1] * np.exp(dRec), best[2] * np.exp(dFacil)]
+        _, residual = _score(spikeTimes, amplitudes, valid, *candidates)
+        k = residual.argmin(axis=0)
+        best = np.array([c[k, np.arange(noStarts)[:, np.newaxis], traces] for c in candidates])
+        steps /= 2.0
+
+    _, residual = _score(spikeTimes, amplitudes, valid, *best)
+    best = best[:, residual.argmin(axis=0), traces]
+    scale, residual = _score(spikeTimes, amplitudes, valid, *best)
+    rms = np.sqrt(np.maximum(residual, 0.0) / np.maximum(valid.sum(axis=-1), 1))
+    result = [best[0], best[1], best[2], scale, rms]
+    if single:
+        result = [float(r[0]) for r in result]
+    return TsodyksMarkramFit(*result)
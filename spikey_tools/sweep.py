@@ -0,0 +1,176 @@
+'''
+Parameter sweeps with incremental reconfiguration.
+
+A sweep is described by a function that builds the network once and a list of
+sweep points. Each sweep point maps names of populations or projections
+returned by the build function to the parameters that are changed, e.g.
+
+    points = [{'neurons': {'g_leak': value}} for value in gLeakList]
+
+Projections accept the special parameter 'weights' (in muS). Before each run
+only the parameters that differ from the previously applied sweep point are
+set, so that the backend reprograms only those on the chip.
+
+With the software stand-in (spikey_tools.software) independent sweep points
+can be distributed over a pool of processes. Each process builds the network
+once and runs a contiguous chunk of sweep points, so that neighbouring points
+still profit from incremental reconfiguration. Build and analysis functions
+have to be defined at module level to be usable in worker processes. All
+chunks are built with the same rng_seeds, so that random connectors draw the
+same network in every process: if setupParams has no rng_seeds, runSweep
+draws one seed for the whole sweep.
+
+With a results store (spikey_tools.results.ResultsStore), the result of each
+sweep point is stored under its flattened parameters, e.g. 'neurons.g_leak',
+together with the description of the store, the runtime ('sweep.runtime'),
+setupParams ('sweep.setup.*') and hashes of the source code of the build,
+readout and analysis functions. Points already in the store are not run
+again, so that an interrupted sweep resumes where it stopped. Without
+rng_seeds, the seed of a sweep with a store follows from these fixed
+parameters, so that resumed points are run on the same network.
+
+With a readout function, each sweep point is run through a Pipeline
+(spikey_tools.pipeline): readout(pynn, network) copies the results right
+after the run, and analyse(data) runs while the next point is already
+configured and emulated.
+'''
+
+import importlib
+import inspect
+import multiprocessing
+
+import numpy as np
+
+from spikey_tools import phases
+from spikey_tools.cache import canonicalHash
+from spikey_tools.pipeline import Pipeline
+from spikey_tools.results import flatten
+
+softwareBackend = 'spikey_tools.software'
+
+
+def _apply(network, point, applied):
+    '''Set parameters of point that differ from the applied ones, return their number.'''
+    noChanges = 0
+    for name, parameters in point.items():
+        obj = network[name]
+        for param, value in parameters.items():
+            key = (name, param)
+            if key in applied and np.array_equal(applied[key], value):
+                continue
+            if param == 'weights':
+                obj.setWeights(value)
+            else:
+                obj.set({param: value})
+            applied[key] = value
+            noChanges += 1
+    return noChanges
+
+
+def _sourceHash(function):
+    '''Hash of the source code of function, of its name if the source is not available.'''
+    if function is None:
+        return None
+    try:
+        source = inspect.getsource(function)
+    except (IOError, TypeError):
+        source = '%s.%s' % (function.__module__, function.__name__)
+    return canonicalHash(source)[:16]
+
+
+def _runChunk(args):
+    backendName, build, points, runtime, analyse, setupParams, readout = args
+    pynn = importlib.import_module(backendName)
+    pynn.setup(**setupParams)
+    network = build(pynn)
+    applied = {}
+    if readout is None:
+        results = []
+        for point in points:
+            _apply(network, point, applied)
+            pynn.run(runtime)
+            results.append(analyse(pynn, network))
+    else:
+        with Pipeline(pynn) as pipeline:
+            futures = [pipeline.submit(runtime, lambda pynn: readout(pynn, network),
+                                       lambda point=point: _apply(network, point, applied), analyse)
+                       for point in points]
+        results = [future.result() for future in futures]
+    pynn.end()
+    return results
+
+
+def runSweep(pynn, build, points, runtime, analyse, setupParams=None, processes=1, store=None, readout=None):
+    '''
+    Run network for each sweep point and return the list of analysis results.
+
+    pynn        -- backend module, e.g. pyNN.hardware.spikey
+    build       -- function(pynn) that creates the network and returns a dict
+                   of its named populations and projections
+    points      -- list of sweep points, see module documentation
+    runtime     -- runtime of each emulation in ms
+    analyse     -- function(pynn, network) called after each run, or
+                   function(data) with the data returned by readout
+    setupParams -- keyword arguments of pynn.setup(), rng_seeds is chosen once
+                   for all chunks if not given
+    processes   -- number of worker processes, only for the software stand-in
+    store       -- ResultsStore to save results to and to resume from, analysis
+                   results have to be numbers or dicts of numbers and arrays
+    readout     -- function(pynn, network) that returns the results of a run,
+                   enables pipelined analysis
+    '''
+    setupParams = dict(setupParams or {})
+    fixed = flatten({'sweep': {'runtime': runtime, 'setup': setupParams, 'build': _sourceHash(build),
+                               'readout': _sourceHash(readout), 'analyse': _sourceHash(analyse)}})
+    if not setupParams.get('rng_seeds'):
+        # each chunk builds the network anew, it has to be the same in all of them
+        seed = int(canonicalHash(store._complete(fixed))[:7], 16) if store is not None \
+            else int(np.random.RandomState().randint(2 ** 28))
+        setupParams['rng_seeds'] = [seed]
+    points = list(points)
+    parameters = []
+    for point in points:
+        parameters.append(dict(fixed))
+        parameters[-1].update(flatten(point))
+    results = [None] * len(points)
+    todo = list(range(len(points)))
+    if store is not None:
+        records = [store.get(p) for p in parameters]
+        results = [record.result() if record is not None else None for record in records]
+        todo = [i for i, record in enumerate(records) if record is None]
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if pynn.__name__ != softwareBackend or processes <= 1 or len(todo) <= 1:
+        # run in chunks of the store, so that finished points are saved
+        step = store.chunkSize if store is not None else max(len(todo), 1)
+        chunks = [todo[start:start + step] for start in range(0, len(todo), step)]
+        _collect(chunks, (_runChunk((pynn.__name__, build, [points[i] for i in chunk], runtime, analyse, setupParams, readout))
+                          for chunk in chunks), parameters, results, store)
+        return results
+
+    processes = min(processes, len(todo))
+    bounds = [len(todo) * i // processes for i in range(processes + 1)]
+    chunks = [todo[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+    # phases of worker processes are not recorded, account the whole sweep to run
+    phases.mark('run')
+    pool = multiprocessing.Pool(processes)
+    try:
+        _collect(chunks, pool.imap(_runChunk, [(pynn.__name__, build, [points[i] for i in chunk], runtime,
+                                                analyse, setupParams, readout) for chunk in chunks]),
+                 parameters, results, store)
+    finally:
+        pool.close()
+        pool.join()
+    phases.mark('analysis')
+    return results
+
+
+def _collect(chunks, chunkResults, parameters, results, store):
+    '''Put results of each chunk of point indices in place and save them as soon as a chunk is done.'''
+    for chunk, chunkResult in zip(chunks, chunkResults):
+        for i, result in zip(chunk, chunkResult):
+            results[i] = result
+            if store is not None:
+                store.append(parameters[i], result)
+        if store is not None:
+            store.flush()
@@ -0,0 +1,85 @@
+'''
+Bulk recording of the state of plastic synapses in NEST.
+
+The state of synapses of type stdp_facetshw_synapse_hom (the NEST model of the
+STDP synapses on Spikey), i.e. weight and charge on the correlation
+capacitors, is not recordable by NEST devices. Reading it with one GetStatus
+call per connection and time step does not scale beyond a few synapses.
+SynapseStateRecorder selects the connections of the plastic synapse model
+once and reads the state of all of them with a single GetStatus call per
+sample into preallocated NumPy arrays.
+
+Example:
+
+    recorder = SynapseStateRecorder(pynn.nest, pynn.nest.FindConnections(measure))
+    recordOnGrid(pynn, recorder, np.arange(0, runtime + timeStep / 2.0, timeStep))
+    weights = recorder['weight']  # shape (number of samples, number of synapses)
+'''
+
+import numpy as np
+
+defaultKeys = ('weight', 'a_causal', 'a_acausal')
+
+
+class SynapseStateRecorder(object):
+    '''
+    nest         -- the NEST module, e.g. pynn.nest
+    connections  -- connections to record from, only those of synapseModel are kept
+    synapseModel -- name of the synapse model
+    keys         -- state variables to record
+    capacity     -- number of samples to preallocate, grows if exceeded
+    '''
+    def __init__(self, nest, connections, synapseModel='stdp_facetshw_synapse_hom',
+                 keys=defaultKeys, capacity=0):
+        self.nest = nest
+        self.keys = list(keys)
+        connections = list(connections)
+        models = nest.GetStatus(connections, 'synapse_model') if connections else []
+        self.connections = [c for c, model in zip(connections, models) if str(model).find(synapseModel) > -1]
+        self.noSamples = 0
+        self._times = np.zeros(capacity)
+        self._data = np.zeros((len(self.keys), capacity, len(self.connections)))
+
+    def __len__(self):
+        return self.noSamples
+
+    def reserve(self, capacity):
+        '''Make sure that capacity samples fit without reallocation.'''
+        if capacity <= len(self._times):
+            return
+        self._times = np.resize(self._times, capacity)
+        data = np.zeros((len(self.keys), capacity, len(self.connections)))
+        data[:, :self.noSamples] = self._data[:, :self.noSamples]
+        self._data = data
+
+    def sample(self, time):
+        '''Read state of all synapses with a single GetStatus call.'''
+        if self.noSamples == len(self._times):
+            self.reserve(max(1, 2 * self.noSamples))
+        if self.connections:
+            # shape (connections, keys) -> (keys, connections)
+            status = np.asarray(self.nest.GetStatus(self.connections, self.keys), dtype=float)
+            self._data[:, self.noSamples] = status.reshape(len(self.connections), len(self.keys)).T
+        self._times[self.noSamples] = time
+        self.noSamples += 1
+
+    @property
+    def times(self):
+        return self._times[:self.noSamples]
+
+    def __getitem__(self, key):
+        '''Recorded values of state variable key, shape (samples, synapses).'''
+        return self._data[self.keys.index(key), :self.noSamples]
+
+
+def recordOnGrid(pynn, recorder, timeGrid):
+    '''
+    Run the simulation along timeGrid (in ms, starting at the current time)
+    and sample the recorder at each grid point.
+    '''
+    timeGrid = np.asarray(timeGrid, dtype=float)
+    recorder.reserve(len(recorder) + len(timeGrid))
+    for i, timeNow in enumerate(timeGrid):
+        recorder.sample(timeNow)
+        if i < len(timeGrid) - 1:
+            pynn.run(timeGrid[i + 1] - timeNow)
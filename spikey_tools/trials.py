@@ -0,0 +1,148 @@
+'''
+Multiplexing of independent trials into a single emulation.
+
+Setting up a run and reading out its results costs much more than a short
+trial itself. TrialLayout places trials back to back in one run, each in a
+slot of the trial duration followed by a guard interval that lets the
+activity of the previous trial decay. Stimuli of each trial are given
+relative to the start of its slot, and spikes and membrane traces are split
+into per-trial arrays afterwards, again relative to the start of the slot.
+Membrane windows of the trials are aligned to the exact start of each slot
+by interpolation between ADC samples, and averaged across trials in
+constant memory, with spikey_tools.sta.
+
+Example:
+
+    stimuli = [{stimulus: [10.0]} for trial in range(100)]
+    result = runTrials(pynn, stimuli, duration=100.0, guard=50.0, recordV=True)
+    meanEPSP = result.average.mean
+'''
+
+import numpy as np
+
+from spikey_tools import sta
+from spikey_tools.recording import TimeAxis
+
+
+class TrialLayout(object):
+    '''
+    noTrials -- number of trials
+    duration -- duration of each trial in ms, stimuli lie in [0, duration)
+    guard    -- interval in ms after each trial
+    start    -- start of the first trial in ms, default guard
+    '''
+    def __init__(self, noTrials, duration, guard=50.0, start=None):
+        self.noTrials = int(noTrials)
+        self.duration = float(duration)
+        self.guard = float(guard)
+        self.start = self.guard if start is None else float(start)
+
+    @property
+    def period(self):
+        return self.duration + self.guard
+
+    @property
+    def offsets(self):
+        '''Start of each trial in ms.'''
+        return self.start + np.arange(self.noTrials) * self.period
+
+    @property
+    def runtime(self):
+        return self.start + self.noTrials * self.period
+
+    def concatenate(self, trialTimes):
+        '''Return spike times of one source for all trials, given as one list of times per trial.'''
+        if len(trialTimes) != self.noTrials:
+            raise ValueError('expected spike times of %d trials, got %d' % (self.noTrials, len(trialTimes)))
+        times = []
+        for offset, trial in zip(self.offsets, trialTimes):
+            trial = np.asarray(trial, dtype=float)
+            if len(trial) and (trial.min() < 0 or trial.max() >= self.duration):
+                raise ValueError('spike times of a trial have to lie in [0, %g)' % self.duration)
+            times.append(trial + offset)
+        return np.sort(np.concatenate(times + [np.zeros(0)]))
+
+    def splitSpikes(self, spikes):
+        '''Split array of (neuron ID, spike time) into one array per trial with times relative to the trial.'''
+        spikes = np.asarray(spikes, dtype=float).reshape(-1, 2)
+        trial = np.floor((spikes[:, 1] - self.start) / self.period).astype(int)
+        valid = (trial >= 0) & (trial < self.noTrials)
+        spikes = spikes[valid]
+        trial = trial[valid]
+        order = np.argsort(trial, kind='mergesort')
+        spikes = spikes[order]
+        trial = trial[order]
+        relative = np.column_stack((spikes[:, 0], spikes[:, 1] - self.offsets[trial]))
+        bounds = np.searchsorted(trial, np.arange(self.noTrials + 1))
+        return [relative[first:last] for first, last in zip(bounds[:-1], bounds[1:])]
+
+    def _sampling(self, membrane, timeMembrane):
+        '''Return t0, dt and the number of samples per trial, check that membrane covers all trials.'''
+        t0 = timeMembrane[0]
+        dt = timeMembrane[1] - timeMembrane[0]
+        length = int(round(self.period / dt))
+        if self.noTrials:
+            first = (self.offsets[0] - t0) / dt
+            last = (self.offsets[-1] - t0) / dt + length - 1
+            if first < 0 or last > len(membrane) - 1 + 1e-9:
+                raise ValueError('membrane recording does not cover all trials')
+        return t0, dt, length
+
+    def splitMembrane(self, membrane, timeMembrane):
+        '''
+        Return membrane of shape (noTrials, samples per trial) and its time
+        axis relative to the start of the trials. The samples of each row are
+        interpolated at the start of the trial plus multiples of the sampling
+        interval, see spikey_tools.sta.windows.
+        '''
+        t0, dt, length = self._sampling(membrane, timeMembrane)
+        return sta.windows(membrane, self.offsets, length, dt, t0), TimeAxis(length, dt)
+
+    def averageMembrane(self, membrane, timeMembrane, chunkSize=1 << 20):
+        '''
+        Return the SpikeTriggeredAverage of the membrane across trials,
+        aligned like splitMembrane, reading membrane in chunks of chunkSize samples.
+        '''
+        t0, dt, length = self._sampling(membrane, timeMembrane)
+        return sta.average(membrane, self.offsets, length * dt, dt, t0, chunkSize=chunkSize)
+
+
+class TrialResult(object):
+    '''
+    spikes       -- dict of population -> list of spike arrays, one per trial
+    membrane     -- membrane of shape (noTrials, samples per trial), if recorded
+    timeMembrane -- time axis of each row of membrane, relative to the trial
+    average      -- SpikeTriggeredAverage of the membrane across trials, if recorded
+    '''
+    def __init__(self, layout, spikes, membrane=None, timeMembrane=None, average=None):
+        self.layout = layout
+        self.spikes = spikes
+        self.membrane = membrane
+        self.timeMembrane = timeMembrane
+        self.average = average
+
+
+def runTrials(pynn, stimuli, duration, guard=50.0, populations=(), recordV=False):
+    '''
+    Run all trials in one emulation and demultiplex the results.
+
+    stimuli     -- list with one dict per trial, mapping spike source
+                   populations (SpikeSourceArray) to spike times in [0, duration)
+    duration    -- duration of each trial in ms
+    guard       -- interval between trials in ms
+    populations -- recorded populations whose spikes are split into trials
+    recordV     -- split the membrane recorded with pynn.record_v() into trials
+    '''
+    layout = TrialLayout(len(stimuli), duration, guard)
+    sources = []
+    for trial in stimuli:
+        sources.extend(source for source in trial if source not in sources)
+    for source in sources:
+        source.set('spike_times', layout.concatenate([trial.get(source, []) for trial in stimuli]).tolist())
+    pynn.run(layout.runtime)
+    spikes = dict((pop, layout.splitSpikes(pop.getSpikes())) for pop in populations)
+    membrane = timeMembrane = average = None
+    if recordV:
+        membrane, timeMembrane = layout.splitMembrane(pynn.membraneOutput, pynn.timeMembraneOutput)
+        average = layout.averageMembrane(pynn.membraneOutput, pynn.timeMembraneOutput)
+    return TrialResult(layout, spikes, membrane, timeMembrane, average)
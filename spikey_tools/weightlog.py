@@ -0,0 +1,115 @@
+'''
+Whole-chip synapse weight snapshots stored as a log of changes.
+
+The synapse array is a uint8 matrix of noDrivers x noNeurons (256 x 384)
+digital weights. WeightLog keeps the first snapshot completely and of each
+later one only the synapses that changed since the previous snapshot, as
+flat indices (uint32) and new weights (uint8). Plastic synapses change
+rarely compared to the size of the array, so the weight evolution of the
+whole chip fits into little memory, and any snapshot or the trace of
+single synapses is reconstructed by replaying the changes.
+
+The software stand-in reads the whole array with getSynapseArray() and
+logs a snapshot before the run, after each readout cycle of the STDP
+controller and at the end of the run if recordWeights(log) was called:
+
+    log = WeightLog()
+    pynn.recordWeights(log)
+    pynn.run(runtime)
+    weights = log.history(rows, columns) # shape (snapshots, synapses)
+    log.save('weights.npz')
+'''
+
+import numpy as np
+
+defaultShape = (256, 384)
+
+
+class WeightLog(object):
+    def __init__(self, shape=defaultShape):
+        self.shape = tuple(shape)
+        self.base = None
+        self.current = None
+        self._times = []
+        self._indices = []
+        self._values = []
+
+    def __len__(self):
+        return len(self._times)
+
+    @property
+    def times(self):
+        return np.array(self._times)
+
+    @property
+    def nbytes(self):
+        return (0 if self.base is None else self.base.nbytes) + \
+            sum(indices.nbytes + values.nbytes for indices, values in zip(self._indices, self._values))
+
+    def snapshot(self, time, weights):
+        '''Log weights at time (ms), return the flat indices of the synapses that changed.'''
+        weights = np.asarray(weights, dtype=np.uint8)
+        if weights.shape != self.shape:
+            raise ValueError('expected weights of shape %s, got %s' % (self.shape, weights.shape))
+        if self.current is None:
+            self.base = weights.copy()
+            self.current = weights.copy()
+            changed = np.zeros(0, dtype=np.uint32)
+        else:
+            changed = np.flatnonzero(weights != self.current).astype(np.uint32)
+        values = weights.ravel()[changed]
+        self.current.ravel()[changed] = values
+        self._times.append(float(time))
+        self._indices.append(changed)
+        self._values.append(values)
+        return changed
+
+    def changes(self, index):
+        '''Flat indices and new weights of the synapses changed at snapshot index.'''
+        return self._indices[index], self._values[index]
+
+    def at(self, index):
+        '''Return the weight matrix of snapshot index.'''
+        if index < 0:
+            index += len(self)
+        weights = self.base.copy()
+        flat = weights.ravel()
+        for indices, values in zip(self._indices[:index + 1], self._values[:index + 1]):
+            flat[indices] = values
+        return weights
+
+    def history(self, rows, columns):
+        '''Weights of the synapses at (rows, columns) in all snapshots, shape (snapshots, synapses).'''
+        flat = np.ravel_multi_index((np.atleast_1d(rows), np.atleast_1d(columns)), self.shape)
+        result = np.zeros((len(self), len(flat)), dtype=np.uint8)
+        if not len(self):
+            return result
+        weights = self.base.ravel()[flat]
+        for k, (indices, values) in enumerate(zip(self._indices, self._values)):
+            # changed indices are sorted, find the requested synapses among them
+            position = np.minimum(np.searchsorted(indices, flat), max(len(indices) - 1, 0))
+            hit = indices[position] == flat if len(indices) else np.zeros(len(flat), dtype=bool)
+            weights[hit] = values[position[hit]]
+            result[k] = weights
+        return result
+
+    def save(self, filename):
+        lengths = [len(indices) for indices in self._indices]
+        np.savez_compressed(filename, shape=np.array(self.shape), times=self.times,
+                            base=self.base if self.base is not None else np.zeros(self.shape, dtype=np.uint8),
+                            indices=np.concatenate(self._indices + [np.zeros(0, dtype=np.uint32)]),
+                            values=np.concatenate(self._values + [np.zeros(0, dtype=np.uint8)]),
+                            offsets=np.concatenate(([0], np.cumsum(lengths))).astype(np.int64))
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            log = cls(tuple(data['shape']))
+            offsets = data['offsets']
+            if len(data['times']):
+                log.base = data['base']
+                log._times = list(data['times'])
+                log._indices = [data['indices'][first:last] for first, last in zip(offsets[:-1], offsets[1:])]
+                log._values = [data['values'][first:last] for first, last in zip(offsets[:-1], offsets[1:])]
+                log.current = log.at(-1)
+        return log
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+'''
+Benchmark of the demo networks against the software stand-in.
+
+Each script in networks/ is run in a fresh process with the software stand-in
+in place of pyNN.hardware.spikey. The wall-clock time is split into the
+phases import, setup, construction, mapping, run, readout and analysis (see
+spikey_tools/phases.py), the minimum over repetitions is appended to a
+history file with one JSON record per line, together with the current commit.
+Each phase is compared to the previous record of the same script to make
+regressions visible.
+
+Usage:
+
+    $ python test/benchmark.py [--repeat 3] [--history benchmark_history.jsonl] [example.py ...]
+'''
+
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+repoPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repoPath)
+
+from spikey_tools.phases import phaseNames
+from spikey_tools.scheduler import standinEnvironment
+
+
+def currentCommit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=repoPath).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timeScript(script, workDir):
+    '''Run script once and return dict of phase times in seconds.'''
+    phaseFile = os.path.join(workDir, 'phases.json')
+    env = standinEnvironment()
+    env['SPIKEY_PHASE_FILE'] = phaseFile
+    env['SPIKEY_PHASE_T0'] = repr(time.time())
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call([sys.executable, script], cwd=workDir, env=env, stdout=devnull)
+    with open(phaseFile) as f:
+        return json.load(f)
+
+
+def lastRecords(history):
+    records = {}
+    if os.path.exists(history):
+        with open(history) as f:
+            for line in f:
+                record = json.loads(line)
+                records[record['script']] = record
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('scripts', nargs='*', help='scripts in networks/, default: all')
+    parser.add_argument('--repeat', type=int, default=3, help='number of repetitions per script')
+    parser.add_argument('--history', default='benchmark_history.jsonl', help='history file')
+    parser.add_argument('--threshold', type=float, default=1.2, help='ratio to previous record reported as regression')
+    args = parser.parse_args()
+
+    scripts = args.scripts or sorted(os.path.basename(s) for s in glob.glob(os.path.join(repoPath, 'networks', '*.py')))
+    previous = lastRecords(args.history)
+    commit = currentCommit()
+    regressions = 0
+    for script in scripts:
+        workDir = tempfile.mkdtemp()
+        try:
+            runs = [timeScript(os.path.join(repoPath, 'networks', script), workDir) for _ in range(args.repeat)]
+        finally:
+            shutil.rmtree(workDir)
+        phases = dict((name, min(r[name] for r in runs)) for name in phaseNames)
+        record = {'script': script, 'commit': commit, 'time': time.time(), 'repeat': args.repeat,
+                  'host': platform.node(), 'python': platform.python_version(),
+                  'phases': phases, 'total': min(sum(r.values()) for r in runs)}
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+
+        print(script)
+        for name in phaseNames + ['total']:
+            value = record['total'] if name == 'total' else phases[name]
+            line = '  %-12s %8.3f s' % (name, value)
+            if script in previous:
+                before = previous[script]['total'] if name == 'total' else previous[script]['phases'][name]
+                if before > 0:
+                    ratio = value / before
+                    line += '  x%.2f' % ratio
+                    if ratio > args.threshold and value - before > 0.01:
+                        line += '  REGRESSION'
+                        regressions += 1
+            print(line)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
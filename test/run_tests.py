@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+'''
+Run the system tests and smoke tests of the demo networks in parallel.
+
+Replaces the serial test/run_spikey_tests.sh. Tests are collected in groups:
+tests of a group run one after the other, groups run concurrently in a pool
+of worker threads, each test in its own process with a timeout. The
+hardware stages of run_spikey_tests.sh (test_empty_exp.py as workaround for
+issue #1718, ADC readout, gtest binary, nose suites run_test_system.sh and
+run_test_plasticity.sh) use the same board and form one group, which is
+only collected if PYNN_HW_PATH and SPIKEYHALPATH are set and a station is
+found. Every script in networks/ is a smoke test of its own against the
+software stand-in, run in a separate working directory, as are self-checks
+of spikey_tools. The duration and outcome of each test are written to a
+JUnit XML report, merged with the report of the gtest binary.
+
+Usage:
+
+    $ python test/run_tests.py [--jobs 4] [--timeout 600] [--junit report.xml] [--standin-only] [example ...]
+'''
+
+import argparse
+import glob
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+repoPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repoPath)
+
+from spikey_tools.scheduler import hardwareStations, standinEnvironment
+
+
+class Test(object):
+    '''
+    A command that passes if it exits with 0.
+
+    suite     -- name of the test suite in the report
+    cwd       -- working directory, default the own directory of the test
+    junitFile -- JUnit XML file written by the command, merged into the report
+    mayFail   -- failures are reported, but do not stop the group
+    critical  -- a failure skips the remaining tests of the group
+    '''
+    def __init__(self, name, suite, command, cwd=None, env=None, timeout=None, junitFile=None,
+                 mayFail=False, critical=False):
+        self.name = name
+        self.suite = suite
+        self.command = command
+        self.cwd = cwd
+        self.env = env
+        self.timeout = timeout
+        self.junitFile = junitFile
+        self.mayFail = mayFail
+        self.critical = critical
+
+
+class TestResult(object):
+    '''status is one of passed, failed, timeout, error (could not be started) and skipped.'''
+    def __init__(self, test, status, duration=0.0, output='', returncode=None, message=''):
+        self.test = test
+        self.status = status
+        self.duration = duration
+        self.output = output
+        self.returncode = returncode
+        self.message = message
+
+    @property
+    def ok(self):
+        return self.status in ('passed', 'skipped') or self.test.mayFail
+
+
+def runTest(test, workDir):
+    '''Run test with output to a log file in workDir, kill its process group on timeout.'''
+    if not os.path.isdir(workDir):
+        os.makedirs(workDir)
+    logFile = os.path.join(workDir, 'output.log')
+    start = time.time()
+    with open(logFile, 'wb') as log:
+        try:
+            process = subprocess.Popen(test.command, cwd=test.cwd or workDir, env=test.env, stdout=log,
+                                       stderr=subprocess.STDOUT, preexec_fn=os.setsid)
+        except OSError as e:
+            return TestResult(test, 'error', message=str(e))
+        timedOut = False
+        while process.poll() is None:
+            if test.timeout is not None and time.time() - start > test.timeout:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+                timedOut = True
+                break
+            time.sleep(0.05)
+    duration = time.time() - start
+    with open(logFile, 'rb') as log:
+        output = log.read().decode('utf-8', 'replace')
+    if timedOut:
+        return TestResult(test, 'timeout', duration, output, message='timeout after %g s' % test.timeout)
+    status = 'passed' if process.returncode == 0 else 'failed'
+    return TestResult(test, status, duration, output, process.returncode,
+                      '' if status == 'passed' else 'exit code %d' % process.returncode)
+
+
+def smokeTests(names=None, timeout=None):
+    '''One test per script in networks/, run against the software stand-in.'''
+    scripts = sorted(glob.glob(os.path.join(repoPath, 'networks', '*.py')))
+    if names:
+        scripts = [s for s in scripts if os.path.splitext(os.path.basename(s))[0] in names
+                   or os.path.basename(s) in names]
+    env = standinEnvironment()
+    return [[Test(os.path.splitext(os.path.basename(script))[0], 'networks', [sys.executable, script],
+                  env=env, timeout=timeout)] for script in scripts]
+
+
+def toolTests(timeout=None):
+    '''Self-checks of spikey_tools against the software stand-in.'''
+    return [[Test('session_reuse', 'tools', [sys.executable, '-m', 'spikey_tools.session', '--check'],
+                  repoPath, standinEnvironment(), timeout)]]
+
+
+def hardwareTests(timeout=None):
+    '''The stages of run_spikey_tests.sh as one group, empty if no hardware is available.'''
+    if not os.environ.get('PYNN_HW_PATH') or not os.environ.get('SPIKEYHALPATH'):
+        return []
+    stations = hardwareStations()
+    if not stations:
+        return []
+    station = stations[0]
+    env = station.environment()
+    projectPath = os.path.dirname(os.path.realpath(os.environ['SPIKEYHALPATH']))
+    testPath = os.environ.get('PYNN_HW_PATH_TEST') or \
+        os.path.realpath(os.path.join(os.environ['PYNN_HW_PATH'], '..', '..', '..', 'test', 'spikey'))
+    binPath = os.path.join(projectPath, 'bin')
+    systemPath = os.path.join(testPath, 'system')
+    gtestReport = os.path.join(tempfile.mkdtemp(prefix='spikey_gtest_'), 'report-spikeyHAL.xml')
+    adc = [os.path.join(binPath, 'readout_adc_spikey'), str(station.board), str(station.serial)]
+    return [[
+        # the ADC test fails unless an experiment was run before, see issue #1718
+        Test('empty_exp', 'hardware', ['nosetests', 'test_empty_exp.py'], systemPath, env, timeout, mayFail=True),
+        Test('adc_4', 'hardware', adc + ['4'], binPath, env, timeout, critical=True),
+        Test('adc_0_8', 'hardware', adc + ['0', '8'], binPath, env, timeout, critical=True),
+        # failures are only reported, like '|| true' in run_spikey_tests.sh
+        Test('gtest', 'hardware', [os.path.join(binPath, 'tests', 'test-main'),
+                                   '--gtest_filter=-*runDecorrNetworkInf', '--gtest_output=xml:' + gtestReport],
+             os.path.join(binPath, 'tests'), env, timeout, junitFile=gtestReport, mayFail=True),
+        Test('system', 'hardware', ['sh', 'run_test_system.sh'], systemPath, env, timeout),
+        Test('plasticity', 'hardware', ['sh', 'run_test_plasticity.sh'], systemPath, env, timeout),
+    ]]
+
+
+def runGroups(groups, jobs, workDir, callback=None):
+    '''Run groups concurrently with jobs workers, return TestResults in order of the tests.'''
+    pending = queue.Queue()
+    for index, group in enumerate(groups):
+        pending.put((index, group))
+    results = [None] * len(groups)
+
+    def worker():
+        while True:
+            try:
+                index, group = pending.get_nowait()
+            except queue.Empty:
+                return
+            groupResults = []
+            for test in group:
+                if any(r.test.critical and not r.ok for r in groupResults):
+                    result = TestResult(test, 'skipped', message='skipped after failure of a critical test')
+                else:
+                    result = runTest(test, os.path.join(workDir, '%s-%s' % (test.suite, test.name)))
+                groupResults.append(result)
+                if callback is not None:
+                    callback(result)
+            results[index] = groupResults
+
+    workers = [threading.Thread(target=worker) for _ in range(max(1, min(jobs, len(groups))))]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return [result for groupResults in results for result in groupResults]
+
+
+def junitReport(results, filename):
+    '''Write results as JUnit XML, one testsuite per suite, with the reports written by tests appended.'''
+    root = ET.Element('testsuites')
+    suites = {}
+    for result in results:
+        test = result.test
+        if test.suite not in suites:
+            suites[test.suite] = ET.SubElement(root, 'testsuite', name=test.suite)
+        case = ET.SubElement(suites[test.suite], 'testcase', name=test.name, classname=test.suite,
+                             time='%.3f' % result.duration)
+        if result.status == 'skipped':
+            ET.SubElement(case, 'skipped', message=result.message)
+        elif result.status in ('failed', 'timeout'):
+            ET.SubElement(case, 'failure', message=result.message).text = result.output[-10000:]
+        elif result.status == 'error':
+            ET.SubElement(case, 'error', message=result.message)
+        if result.output:
+            ET.SubElement(case, 'system-out').text = result.output[-10000:]
+        if test.junitFile and os.path.exists(test.junitFile):
+            try:
+                report = ET.parse(test.junitFile).getroot()
+            except ET.ParseError:
+                continue
+            for suite in (list(report) if report.tag == 'testsuites' else [report]):
+                root.append(suite)
+    for suite in root.findall('testsuite'):
+        cases = suite.findall('testcase')
+        if 'tests' not in suite.attrib:
+            suite.set('tests', str(len(cases)))
+            suite.set('failures', str(sum(1 for c in cases if c.find('failure') is not None)))
+            suite.set('errors', str(sum(1 for c in cases if c.find('error') is not None)))
+            suite.set('skipped', str(sum(1 for c in cases if c.find('skipped') is not None)))
+            suite.set('time', '%.3f' % sum(float(c.get('time', 0)) for c in cases))
+    ET.ElementTree(root).write(filename, encoding='utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('networks', nargs='*', help='scripts in networks/ to smoke test, default: all')
+    parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count(), help='number of concurrent groups')
+    parser.add_argument('--timeout', type=float, default=600.0, help='timeout per test in s')
+    parser.add_argument('--junit', default='report-tests.xml', help='JUnit XML report')
+    parser.add_argument('--workdir', default=None, help='directory for the output of tests')
+    parser.add_argument('--standin-only', action='store_true', help='skip the hardware stages')
+    args = parser.parse_args()
+
+    groups = [] if args.standin_only else hardwareTests(args.timeout)
+    if not args.standin_only and not groups:
+        print('no hardware available, running smoke tests against the software stand-in only')
+    groups += smokeTests(args.networks, args.timeout)
+    if not args.networks:
+        groups += toolTests(args.timeout)
+    workDir = args.workdir or tempfile.mkdtemp(prefix='spikey_tests_')
+
+    lock = threading.Lock()
+
+    def report(result):
+        with lock:
+            print('%-10s %-20s %7.2f s  %s' % (result.test.suite, result.test.name, result.duration,
+                                               result.status + (' (ignored)' if result.test.mayFail
+                                                                and result.status != 'passed' else '')))
+            sys.stdout.flush()
+    start = time.time()
+    results = runGroups(groups, args.jobs, workDir, report)
+    junitReport(results, args.junit)
+    failed = [result for result in results if not result.ok]
+    print('%d tests, %d failed in %.2f s (%.2f s in sum), output in %s, report in %s'
+          % (len(results), len(failed), time.time() - start, sum(r.duration for r in results), workDir, args.junit))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())